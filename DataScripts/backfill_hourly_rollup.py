@@ -0,0 +1,49 @@
+import os
+import sys
+import psycopg2
+from dotenv import load_dotenv
+from datetime import datetime, timedelta
+
+load_dotenv()
+
+# 数据库连接与应用相同（DB_HOST / DB_PORT / DB_USER / DB_PASS / DB_NAME，见 app/database.py）
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST"),
+    "port": os.getenv("DB_PORT"),
+    "dbname": os.getenv("DB_NAME"),
+    "user": os.getenv("DB_USER"),
+    "password": os.getenv("DB_PASS")
+}
+
+# 新写入的数据由 station_status 上的触发器维护 station_status_hourly，
+# 这个脚本只用于一次性回填历史数据（按天分段，可重复执行）
+# usage: python backfill_hourly_rollup.py [start_date] [end_date]   日期格式 YYYY-MM-DD
+
+conn = psycopg2.connect(**DB_CONFIG)
+cur = conn.cursor()
+
+if len(sys.argv) > 1:
+    start = datetime.strptime(sys.argv[1], "%Y-%m-%d")
+else:
+    cur.execute("SELECT date_trunc('day', min(timestamp)) FROM station_status")
+    start = cur.fetchone()[0]
+
+if len(sys.argv) > 2:
+    end = datetime.strptime(sys.argv[2], "%Y-%m-%d")
+else:
+    end = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+
+if start is None:
+    print("station_status is empty, nothing to backfill")
+    sys.exit(0)
+
+day = start
+while day < end:
+    next_day = min(day + timedelta(days=1), end)
+    cur.execute("SELECT station_status_hourly_upsert(%s, %s, NULL)", (day, next_day))
+    conn.commit()
+    print(f"[{datetime.utcnow()}] rollup: {day.date()} done")
+    day = next_day
+
+cur.close()
+conn.close()
@@ -0,0 +1,52 @@
+import argparse
+import os
+import psycopg2
+from dotenv import load_dotenv
+from datetime import datetime
+
+load_dotenv()
+
+# 数据库连接与应用相同（DB_HOST / DB_PORT / DB_USER / DB_PASS / DB_NAME，见 app/database.py）
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST"),
+    "port": os.getenv("DB_PORT"),
+    "dbname": os.getenv("DB_NAME"),
+    "user": os.getenv("DB_USER"),
+    "password": os.getenv("DB_PASS")
+}
+
+# station_status 按月分区，清理旧数据只需要把整月的分区摘下来，不用 DELETE
+# station_status_hourly 中的小时汇总不受影响，历史图表仍然可用
+# usage: python detach_old_partitions.py --before 2025-01 [--drop]
+
+parser = argparse.ArgumentParser(description="detach station_status partitions older than a month")
+parser.add_argument("--before", required=True, help="first month to keep, YYYY-MM")
+parser.add_argument("--drop", action="store_true", help="drop the detached partitions")
+args = parser.parse_args()
+
+cutoff = datetime.strptime(args.before, "%Y-%m").strftime("station_status_%Y_%m")
+
+conn = psycopg2.connect(**DB_CONFIG)
+cur = conn.cursor()
+cur.execute("""
+    SELECT c.relname
+      FROM pg_inherits i
+      JOIN pg_class c ON c.oid = i.inhrelid
+     WHERE i.inhparent = 'station_status'::regclass
+     ORDER BY c.relname
+""")
+# 分区名为 station_status_YYYY_MM，按名字排序即按月份排序
+partitions = [name for (name,) in cur.fetchall() if name < cutoff]
+
+for name in partitions:
+    cur.execute(f'ALTER TABLE station_status DETACH PARTITION "{name}"')
+    if args.drop:
+        cur.execute(f'DROP TABLE "{name}"')
+    conn.commit()
+    print(f"[{datetime.utcnow()}] {'dropped' if args.drop else 'detached'}: {name}")
+
+if not partitions:
+    print(f"no partitions before {args.before}")
+
+cur.close()
+conn.close()
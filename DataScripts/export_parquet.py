@@ -0,0 +1,93 @@
+import argparse
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+import duckdb
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 数据库连接与应用相同（DB_HOST / DB_PORT / DB_USER / DB_PASS / DB_NAME，见 app/database.py）
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST"),
+    "port": os.getenv("DB_PORT"),
+    "dbname": os.getenv("DB_NAME"),
+    "user": os.getenv("DB_USER"),
+    "password": os.getenv("DB_PASS")
+}
+
+# 把已结束的整天导出为按天分区的 Parquet：<root>/<表名>/date=YYYY-MM-DD/data.parquet
+# 应用在 PARQUET_ROOT 指向同一目录时，早于 PARQUET_HORIZON_DAYS 的窗口改用 DuckDB 查询这些文件
+# 导出的是图表实际读取的表：小时汇总（利用率）、充电会话（会话数、用电量）和电网数据，与数据库中的口径一致；
+# 原始的 station_status 轮询记录没有接口读取，不导出
+# usage: python export_parquet.py --root /data/parquet [--since 2025-01-01] [--until 2025-07-01] [--overwrite]
+
+# 表名 -> (导出查询, DuckDB 列类型)
+DATASETS = {
+    "station_status_hourly": (
+        "SELECT station_id, hour_start, total_polls, occupied_polls"
+        " FROM station_status_hourly WHERE hour_start >= %s AND hour_start < %s ORDER BY station_id, hour_start",
+        {"station_id": "VARCHAR", "hour_start": "TIMESTAMP", "total_polls": "INTEGER", "occupied_polls": "INTEGER"},
+    ),
+    # 每天的文件包含与该天重叠的所有会话（跨天的会话在每一天都出现），按区间重叠查询时只需读窗口内的日期
+    "charging_sessions": (
+        "SELECT station_id, start_time, end_time FROM charging_sessions"
+        " WHERE end_time >= %s AND start_time < %s ORDER BY station_id, start_time",
+        {"station_id": "VARCHAR", "start_time": "TIMESTAMP", "end_time": "TIMESTAMP"},
+    ),
+    "grid_metrics": (
+        "SELECT timestamp, metric_type, value_mw FROM grid_metrics"
+        " WHERE timestamp >= %s AND timestamp < %s ORDER BY timestamp, metric_type",
+        {"timestamp": "TIMESTAMP", "metric_type": "VARCHAR", "value_mw": "DOUBLE"},
+    ),
+}
+
+parser = argparse.ArgumentParser(description="export closed days of the hourly rollup, charging sessions and grid_metrics to Parquet")
+parser.add_argument("--root", required=True, help="output directory")
+parser.add_argument("--since", help="first day to export, YYYY-MM-DD (default: first day in station_status)")
+parser.add_argument("--until", help="first day NOT to export, YYYY-MM-DD (default: today, UTC)")
+parser.add_argument("--overwrite", action="store_true", help="re-export days that already have a file")
+args = parser.parse_args()
+
+conn = psycopg2.connect(**DB_CONFIG)
+cur = conn.cursor()
+
+if args.since:
+    start = datetime.strptime(args.since, "%Y-%m-%d")
+else:
+    cur.execute("SELECT date_trunc('day', min(timestamp)) FROM station_status")
+    start = cur.fetchone()[0]
+# 当天还在写入，只导出到昨天
+end = (datetime.strptime(args.until, "%Y-%m-%d") if args.until
+       else datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0))
+
+duck = duckdb.connect()
+day = start
+while start is not None and day < end:
+    next_day = day + timedelta(days=1)
+    for name, (query, columns) in DATASETS.items():
+        directory = os.path.join(args.root, name, f"date={day:%Y-%m-%d}")
+        path = os.path.join(directory, "data.parquet")
+        if os.path.exists(path) and not args.overwrite:
+            continue
+        os.makedirs(directory, exist_ok=True)
+
+        # 经 CSV 中转，避免逐行经过 Python；先写临时文件再改名，读取方不会看到写了一半的文件
+        with tempfile.NamedTemporaryFile(suffix=".csv", dir=directory) as csv_file:
+            cur.copy_expert(f"COPY ({cur.mogrify(query, (day, next_day)).decode()}) TO STDOUT WITH CSV", csv_file)
+            csv_file.flush()
+            tmp_path = path + ".tmp"
+            duck.execute(
+                f"COPY (SELECT * FROM read_csv(?, header = false, columns = {columns!r})) "
+                f"TO '{tmp_path}' (FORMAT parquet, COMPRESSION zstd)",
+                [csv_file.name]
+            )
+            os.replace(tmp_path, path)
+    conn.rollback()
+    print(f"[{datetime.utcnow()}] parquet: {day.date()} done")
+    day = next_day
+
+duck.close()
+conn.close()
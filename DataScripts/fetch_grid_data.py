@@ -1,57 +1,126 @@
+import argparse
+import os
 import requests
 import psycopg2
-from datetime import datetime
-
-today = datetime.utcnow().strftime('%d-%b-%Y')
-
-url = (
-    "https://www.smartgriddashboard.com/api/chart/"
-    f"?region=ALL&chartType=generation&dateRange=day"
-    f"&dateFrom={today}&dateTo={today}"
-    f"&areas=generationactual&compareData=demandactual"
-)
-
-r = requests.get(url)
-rows = r.json()["Rows"]
-
-conn = psycopg2.connect(
-    host="35.240.85.116",
-    port=5432,
-    dbname="ev_data",
-    user="postgres",
-    password="000000."
-)
-cur = conn.cursor()
-
-inserted = 0
-
-for row in rows:
-    if row["Value"] is None:
-        continue
-
-    ts = datetime.strptime(row["EffectiveTime"], "%d-%b-%Y %H:%M:%S")
-    field = row["FieldName"]
-    value = float(row["Value"])
-    kind = "generation" if field == "GEN_EXP" else "load" if field == "SYSTEM_DEMAND" else None
-
-    if not kind:
-        continue
-
-    cur.execute(
-        "SELECT 1 FROM grid_metrics WHERE timestamp = %s AND metric_type = %s LIMIT 1;",
-        (ts, kind)
+from psycopg2.extras import execute_values
+from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+load_dotenv()
+
+# 数据库连接与应用相同（DB_HOST / DB_PORT / DB_USER / DB_PASS / DB_NAME，见 app/database.py）
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST"),
+    "port": os.getenv("DB_PORT"),
+    "dbname": os.getenv("DB_NAME"),
+    "user": os.getenv("DB_USER"),
+    "password": os.getenv("DB_PASS")
+}
+
+BASE_URL = "https://www.smartgriddashboard.com"
+
+
+def grid_chart_url(base_url, day):
+    day_str = day.strftime('%d-%b-%Y')
+    return (
+        f"{base_url}/api/chart/"
+        f"?region=ALL&chartType=generation&dateRange=day"
+        f"&dateFrom={day_str}&dateTo={day_str}"
+        f"&areas=generationactual&compareData=demandactual"
     )
-    if cur.fetchone():
-        continue
 
-    cur.execute(
-        "INSERT INTO grid_metrics (timestamp, metric_type, value_mw) VALUES (%s, %s, %s);",
-        (ts, kind, value)
+
+def parse_grid_rows(data):
+    """chart 接口的返回转为 [(timestamp, metric_type, value_mw)]；ingest_daemon.py 也使用"""
+    # 同一批次内 (timestamp, metric_type) 去重，后出现的值覆盖前面的
+    values = {}
+    for row in data["Rows"]:
+        if row["Value"] is None:
+            continue
+
+        field = row["FieldName"]
+        kind = "generation" if field == "GEN_EXP" else "load" if field == "SYSTEM_DEMAND" else None
+        if not kind:
+            continue
+
+        ts = datetime.strptime(row["EffectiveTime"], "%d-%b-%Y %H:%M:%S")
+        values[(ts, kind)] = float(row["Value"])
+
+    return [(ts, kind, value) for (ts, kind), value in values.items()]
+
+
+def fetch_day(base_url, day):
+    """拉取某一天的 generation / load 数据，返回 [(timestamp, metric_type, value_mw)]"""
+    r = requests.get(grid_chart_url(base_url, day), timeout=30)
+    r.raise_for_status()
+    return parse_grid_rows(r.json())
+
+
+def upsert_rows(cur, rows):
+    if not rows:
+        return 0
+    execute_values(
+        cur,
+        """
+        INSERT INTO grid_metrics (timestamp, metric_type, value_mw)
+        VALUES %s
+        ON CONFLICT (timestamp, metric_type) DO UPDATE SET value_mw = EXCLUDED.value_mw
+        """,
+        rows,
+        page_size=len(rows)
     )
-    inserted += 1
+    return len(rows)
+
+
+# 日常轮询由 ingest_daemon.py 完成，这里用于按日期范围回填
+def main():
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    parser = argparse.ArgumentParser(description="Fetch grid generation / load into grid_metrics")
+    parser.add_argument("--start", help="backfill start date YYYY-MM-DD (default: today)")
+    parser.add_argument("--end", help="backfill end date YYYY-MM-DD, inclusive (default: start)")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent day fetches")
+    parser.add_argument("--base-url", default=BASE_URL, help="smartgriddashboard base url")
+    args = parser.parse_args()
+
+    start = datetime.strptime(args.start, "%Y-%m-%d") if args.start else today
+    end = datetime.strptime(args.end, "%Y-%m-%d") if args.end else start
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    cur = conn.cursor()
+
+    # 唯一索引由迁移 0010 建立；应用还没有升级数据库时这里补上
+    cur.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS ix_grid_metrics_timestamp_metric_type
+        ON grid_metrics (timestamp, metric_type)
+    """)
+    conn.commit()
+
+    upserted = 0
+    failed = []
+    # 并发拉取，按天分块写入，每块一次批量 upsert
+    with ThreadPoolExecutor(max_workers=max(args.workers, 1)) as pool:
+        futures = {pool.submit(fetch_day, args.base_url.rstrip("/"), day): day for day in days}
+        for future in as_completed(futures):
+            day = futures[future]
+            try:
+                rows = future.result()
+            except (requests.RequestException, ValueError, KeyError) as e:
+                failed.append(day)
+                print(f"[{datetime.utcnow()}] {day.date()} failed: {e}")
+                continue
+            upserted += upsert_rows(cur, rows)
+            conn.commit()
+
+    cur.close()
+    conn.close()
+
+    print(f"[{datetime.utcnow()}] upsert {upserted} notes, {len(days) - len(failed)}/{len(days)} days")
+    if failed:
+        raise SystemExit(1)
 
-conn.commit()
-cur.close()
-conn.close()
 
-print(f"[{datetime.utcnow()}] insert {inserted} notes")
+if __name__ == "__main__":
+    main()
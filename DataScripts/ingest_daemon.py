@@ -0,0 +1,280 @@
+"""常驻的采集服务：按各自的间隔轮询 ESB 充电桩状态和 smartgriddashboard 电网数据，替代 cron 定时跑脚本
+
+usage: python DataScripts/ingest_daemon.py [--once] [--sources status,grid] [--metrics-port 9101]
+                                           [--esb-url URL] [--grid-url URL]
+
+数据库连接与应用相同（DB_HOST / DB_PORT / DB_USER / DB_PASS / DB_NAME，连接池参数同 app/database.py），
+所有轮询共用一个 HTTP 连接池和一个数据库连接池。每个数据源一个循环，互不阻塞：
+单次采集超过 timeout 会被取消并计为失败，下一次按原定时间执行，不补跑错过的轮次。
+--esb-url / --grid-url 可以指向本地的假接口做测试。历史电网数据的回填仍用 fetch_grid_data.py。
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import signal
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+
+import httpx
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+from sqlalchemy import text
+
+from database import engine
+from models.station_status import ENSURE_FUTURE_PARTITIONS
+from fetch_grid_data import BASE_URL as GRID_URL, grid_chart_url, parse_grid_rows
+
+logger = logging.getLogger("ingest_daemon")
+
+# 轮询间隔（秒）；电网数据 15 分钟一个点，不需要和状态一样频繁
+STATUS_POLL_SECONDS = float(os.getenv("STATUS_POLL_SECONDS", "60"))
+GRID_POLL_SECONDS = float(os.getenv("GRID_POLL_SECONDS", "300"))
+# 单次 HTTP 请求超时；单次采集（含重试和写库）最长为轮询间隔，避免同一数据源的两次采集重叠
+INGEST_HTTP_TIMEOUT = float(os.getenv("INGEST_HTTP_TIMEOUT", "20"))
+# 网络错误、429 和 5xx 最多尝试的次数，两次尝试之间按指数退避并加随机抖动
+INGEST_ATTEMPTS = int(os.getenv("INGEST_ATTEMPTS", "3"))
+INGEST_BACKOFF_SECONDS = float(os.getenv("INGEST_BACKOFF_SECONDS", "2"))
+INGEST_METRICS_PORT = int(os.getenv("INGEST_METRICS_PORT", "9101"))
+# 电网数据会在之后几个小时内修正，每次重新拉取覆盖该时长的所有日期
+GRID_LOOKBACK = timedelta(hours=float(os.getenv("GRID_LOOKBACK_HOURS", "3")))
+
+ESB_URL = "https://myaccount.esbecars.com/stationFacade/findSitesInBounds"
+ESB_HEADERS = {
+    "Content-Type": "application/json",
+    "Origin": "https://esb.ie",
+    "Referer": "https://esb.ie/",
+    "User-Agent": "Mozilla/5.0"
+}
+ESB_PAYLOAD = {
+    "filterByBounds": {
+        "northEastLat": 55.4,
+        "northEastLng": -5.2,
+        "southWestLat": 51.3,
+        "southWestLng": -10.6
+    }
+}
+
+INGEST_ROWS = Histogram(
+    "ingest_rows_per_cycle", "Rows written per ingest cycle", ["source"],
+    buckets=(0, 1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000),
+)
+INGEST_CYCLE_SECONDS = Histogram(
+    "ingest_cycle_duration_seconds", "Duration of an ingest cycle including retries", ["source"],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+INGEST_CYCLES = Counter("ingest_cycles_total", "Ingest cycles by result (ok / failed / timeout)", ["source", "result"])
+INGEST_RETRIES = Counter("ingest_http_retries_total", "HTTP requests retried after a transient error", ["source"])
+INGEST_LAG = Gauge("ingest_lag_seconds", "Seconds since the newest data point written by the daemon", ["source"])
+INGEST_LAST_SUCCESS = Gauge("ingest_last_success_timestamp_seconds", "Unix time of the last successful cycle",
+                            ["source"])
+
+# 数据源 -> 已写入的最新数据时间（UTC epoch 秒），INGEST_LAG 由此计算
+newest_data = {}
+
+STATUS_INSERT = text("""
+WITH polled AS (
+    SELECT p.station_id, p.status
+      FROM unnest(CAST(:station_ids AS text[]), CAST(:statuses AS text[])) AS p(station_id, status)
+      JOIN charging_stations c ON c.station_id = p.station_id
+),
+inserted AS (
+    INSERT INTO station_status (station_id, timestamp, status, last_updated)
+    SELECT station_id, CAST(:ts AS timestamp), status, CAST(:ts AS timestamp) FROM polled
+    ON CONFLICT (station_id, timestamp) DO NOTHING
+    RETURNING 1
+)
+SELECT (SELECT count(*) FROM polled), (SELECT count(*) FROM inserted)
+""")
+
+# 只挑出与库中不同的值；没有变化时不执行写入，避免触发器无谓地更新水位（ETag）
+GRID_CHANGED = text("""
+SELECT f.timestamp, f.metric_type, f.value_mw
+  FROM unnest(CAST(:timestamps AS timestamp[]), CAST(:metric_types AS text[]),
+              CAST(:values AS double precision[])) AS f(timestamp, metric_type, value_mw)
+  LEFT JOIN grid_metrics g ON g.timestamp = f.timestamp AND g.metric_type = f.metric_type
+ WHERE g.value_mw IS DISTINCT FROM f.value_mw
+""")
+
+GRID_UPSERT = text("""
+INSERT INTO grid_metrics (timestamp, metric_type, value_mw)
+SELECT * FROM unnest(CAST(:timestamps AS timestamp[]), CAST(:metric_types AS text[]),
+                     CAST(:values AS double precision[]))
+ON CONFLICT (timestamp, metric_type) DO UPDATE SET value_mw = EXCLUDED.value_mw
+""")
+
+
+def map_status(raw_status):
+    raw_status = raw_status.upper()
+    if raw_status == "AVAILABLE":
+        return "AVAILABLE"
+    elif raw_status in {"CHARGING", "FINISHING", "OCCUPIED", "PAUSED", "PREPARING"}:
+        return "OCCUPIED"
+    else:
+        return "OFFLINE"
+
+
+def retryable(error: Exception) -> bool:
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status == 429 or status >= 500
+    return isinstance(error, httpx.TransportError)
+
+
+async def request_json(client: httpx.AsyncClient, source: str, method: str, url: str, **kwargs):
+    """发送请求并解析 JSON；临时性错误按 full jitter 指数退避重试，其余错误直接抛出"""
+    for attempt in range(1, INGEST_ATTEMPTS + 1):
+        try:
+            response = await client.request(method, url, **kwargs)
+            response.raise_for_status()
+            return response.json()
+        except (httpx.HTTPStatusError, httpx.TransportError) as e:
+            if attempt == INGEST_ATTEMPTS or not retryable(e):
+                raise
+            delay = random.uniform(0, INGEST_BACKOFF_SECONDS * 2 ** (attempt - 1))
+            logger.warning(f"[{source}] attempt {attempt} failed: {e!r}, retrying in {delay:.1f}s")
+            INGEST_RETRIES.labels(source).inc()
+            await asyncio.sleep(delay)
+
+
+async def poll_station_status(client: httpx.AsyncClient, base_url: str, tick: datetime):
+    """一次状态轮询，返回 (写入行数, 数据时间)"""
+    data = await request_json(client, "status", "POST", base_url, json=ESB_PAYLOAD, headers=ESB_HEADERS)
+    stations = data["data"]
+    # 同一分钟内重跑视为同一次轮询，配合 (station_id, timestamp) 唯一索引保证幂等；重试也沿用本轮的时间
+    now = tick.replace(second=0, microsecond=0, tzinfo=None)
+
+    async with engine.begin() as conn:
+        await conn.execute(text(ENSURE_FUTURE_PARTITIONS))
+        # 一条语句写入本轮所有状态，语句级触发器（会话、当前状态、水位）只执行一次
+        known, inserted = (await conn.execute(STATUS_INSERT, {
+            "station_ids": [str(s["id"]) for s in stations],
+            "statuses": [map_status(s["ss"]) for s in stations],
+            "ts": now,
+        })).one()
+
+    logger.info(f"[status] {now} insert: {inserted} records, duplicate: {known - inserted}, "
+                f"unknown station: {len(stations) - known}")
+    return inserted, now
+
+
+async def poll_grid(client: httpx.AsyncClient, base_url: str, tick: datetime):
+    """拉取 tick 往前 GRID_LOOKBACK 覆盖到的日期，只写入新增或修正过的值，返回 (写入行数, 最新数据时间)"""
+    days = sorted({(tick - GRID_LOOKBACK).date(), tick.date()})
+    responses = await asyncio.gather(*(
+        request_json(client, "grid", "GET", grid_chart_url(base_url, day)) for day in days
+    ))
+    rows = [row for data in responses for row in parse_grid_rows(data)]
+    if not rows:
+        return 0, None
+
+    timestamps, metric_types, values = (list(column) for column in zip(*rows))
+    async with engine.begin() as conn:
+        changed = (await conn.execute(GRID_CHANGED, {
+            "timestamps": timestamps, "metric_types": metric_types, "values": values,
+        })).all()
+        if changed:
+            timestamps, metric_types, values = (list(column) for column in zip(*changed))
+            await conn.execute(GRID_UPSERT, {
+                "timestamps": timestamps, "metric_types": metric_types, "values": values,
+            })
+
+    logger.info(f"[grid] {', '.join(str(day) for day in days)} upsert: {len(changed)} of {len(rows)} values")
+    return len(changed), max(ts for ts, _, _ in rows)
+
+
+async def run_source(source: str, interval: float, poll, client: httpx.AsyncClient, base_url: str,
+                     once: bool = False) -> bool:
+    """按固定间隔执行 poll；单次失败或超时只记录，不影响下一轮和其他数据源。once 时返回本轮是否成功"""
+    INGEST_LAG.labels(source).set_function(
+        lambda: time.time() - newest_data[source] if source in newest_data else float("nan"))
+    next_run = time.monotonic()
+    while True:
+        tick = datetime.now(timezone.utc)
+        started = time.perf_counter()
+        ok = False
+        try:
+            rows, data_time = await asyncio.wait_for(poll(client, base_url, tick), timeout=interval)
+        except asyncio.TimeoutError:
+            INGEST_CYCLES.labels(source, "timeout").inc()
+            logger.error(f"[{source}] cycle exceeded {interval:g}s, skipped")
+        except Exception as e:
+            INGEST_CYCLES.labels(source, "failed").inc()
+            logger.error(f"[{source}] cycle failed: {e!r}")
+        else:
+            ok = True
+            INGEST_CYCLES.labels(source, "ok").inc()
+            INGEST_ROWS.labels(source).observe(rows)
+            INGEST_LAST_SUCCESS.labels(source).set(time.time())
+            if data_time is not None:
+                # 数据时间均为 naive UTC
+                newest_data[source] = max(newest_data.get(source, 0.0),
+                                          data_time.replace(tzinfo=timezone.utc).timestamp())
+        INGEST_CYCLE_SECONDS.labels(source).observe(time.perf_counter() - started)
+        if once:
+            return ok
+
+        # 按原定时间对齐，跳过执行超时时错过的轮次
+        next_run += interval
+        now = time.monotonic()
+        if next_run < now:
+            next_run += (now - next_run) // interval * interval + interval
+        await asyncio.sleep(next_run - now)
+
+
+async def run(args):
+    sources = {
+        "status": (STATUS_POLL_SECONDS, poll_station_status, args.esb_url),
+        "grid": (GRID_POLL_SECONDS, poll_grid, args.grid_url.rstrip("/")),
+    }
+    selected = [name.strip() for name in args.sources.split(",") if name.strip()]
+    unknown = set(selected) - set(sources)
+    if unknown:
+        raise SystemExit(f"unknown sources: {', '.join(sorted(unknown))}")
+
+    timeout = httpx.Timeout(INGEST_HTTP_TIMEOUT, connect=min(INGEST_HTTP_TIMEOUT, 10.0))
+    async with httpx.AsyncClient(timeout=timeout) as client:
+        tasks = [
+            asyncio.create_task(run_source(name, sources[name][0], sources[name][1], client, sources[name][2],
+                                           once=args.once))
+            for name in selected
+        ]
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, lambda: [task.cancel() for task in tasks])
+            except NotImplementedError:
+                # Windows 上没有 add_signal_handler，Ctrl+C 仍由 asyncio.run 处理
+                pass
+        try:
+            results = await asyncio.gather(*tasks)
+        except asyncio.CancelledError:
+            logger.info("shutting down")
+            return
+        finally:
+            await engine.dispose()
+    if not all(results):
+        raise SystemExit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Poll station status and grid data into the database")
+    parser.add_argument("--once", action="store_true", help="run one cycle of each source and exit")
+    parser.add_argument("--sources", default="status,grid", help="comma separated: status, grid")
+    parser.add_argument("--metrics-port", type=int, default=INGEST_METRICS_PORT,
+                        help="port for Prometheus /metrics, 0 to disable")
+    parser.add_argument("--esb-url", default=ESB_URL, help="ESB findSitesInBounds url")
+    parser.add_argument("--grid-url", default=GRID_URL, help="smartgriddashboard base url")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="[%(asctime)s] %(levelname)s %(message)s")
+    if args.metrics_port and not args.once:
+        start_http_server(args.metrics_port)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
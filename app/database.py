@@ -1,6 +1,12 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import declarative_base
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import text
 from dotenv import load_dotenv
+from middleware.instrumentation import TimedQueuePool
 import os
 
 load_dotenv()
@@ -11,14 +17,60 @@ DB_USER = os.getenv("DB_USER")
 DB_PASS = os.getenv("DB_PASS")
 DB_NAME = os.getenv("DB_NAME")
 
-SQLALCHEMY_DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# 连接池配置，可通过环境变量调整
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+SQLALCHEMY_DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+engine = create_async_engine(
+    SQLALCHEMY_DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    pool_recycle=DB_POOL_RECYCLE,
+    poolclass=TimedQueuePool,
+)
+SessionLocal = async_sessionmaker(bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")
+
+
+# 需要停止采集、在维护窗口中手动执行的版本（在 app 目录运行 alembic upgrade head）；
+# 已有 station_status 数据时应用启动不会执行这些版本，没有数据的新库照常自动执行
+MANUAL_REVISIONS = ("0002",)
+
+
+def pending_manual_revisions(connection, config: Config) -> list:
+    """还没有执行、且需要手动执行的版本；station_status 为空或不存在时返回空列表"""
+    current = MigrationContext.configure(connection).get_current_revision()
+    pending = [script.revision for script in ScriptDirectory.from_config(config).iterate_revisions("head", current)
+               if script.revision in MANUAL_REVISIONS]
+    if not pending or connection.execute(text("SELECT to_regclass('station_status')")).scalar() is None:
+        return []
+    if not connection.execute(text("SELECT EXISTS (SELECT 1 FROM station_status)")).scalar():
+        return []
+    return pending
+
+
+def upgrade_database(connection):
+    """在给定的同步连接上执行 alembic upgrade head（应用启动时通过 run_sync 调用）
+
+    有需要手动执行的版本时不升级，直接报错退出
+    """
+    config = Config(ALEMBIC_INI)
+    config.attributes["connection"] = connection
+    manual = pending_manual_revisions(connection, config)
+    if manual:
+        raise RuntimeError(
+            f"migration {', '.join(manual)} must be applied manually with ingest stopped: "
+            f"stop the ingest service, then run `alembic upgrade head` in app/"
+        )
+    command.upgrade(config, "head")
+
+
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
@@ -1,14 +1,36 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from middleware.error_handlers import register_error_handlers
-from database import engine, Base
+from middleware.conditional_get import register_conditional_get
+from middleware.instrumentation import register_instrumentation
+from middleware.profiling import register_profiling
+from sqlalchemy import text
+from database import engine, upgrade_database
+from models.station_status import ENSURE_FUTURE_PARTITIONS
+from server.live_status import listen_status_changes, LIVE_STATUS_ENABLED
 
-from routers import city, charging_stations, station_status, maps, graph
+from routers import city, charging_stations, station_status, maps, graph, admin
 
 from fastapi.middleware.cors import CORSMiddleware
 
-Base.metadata.create_all(bind=engine)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with engine.begin() as conn:
+        await conn.run_sync(upgrade_database)
+        await conn.execute(text(ENSURE_FUTURE_PARTITIONS))
+    # /map/live 的状态推送：整个进程共用一个 LISTEN 连接
+    listener = asyncio.create_task(listen_status_changes(engine)) if LIVE_STATUS_ENABLED else None
+    yield
+    if listener is not None:
+        listener.cancel()
+        await asyncio.gather(listener, return_exceptions=True)
+    await engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
 
 ROUTERS = [
     (city.router,           "/cities",           ["cities"]),
@@ -17,11 +39,15 @@ ROUTERS = [
     (graph.router, "/graph", ["graph"]),
     (maps.router,   "/map",   ["map"]),
     (graph.router,   "/graph",   ["graph"]),
+    (admin.router,   "/admin",   ["admin"]),
 ]
 for router, prefix, tags in ROUTERS:
     app.include_router(router, prefix=prefix, tags=tags)
 
 register_error_handlers(app)
+register_conditional_get(app)
+register_profiling(app, engine)
+register_instrumentation(app, engine)
 
 app.add_middleware(
     CORSMiddleware,
@@ -0,0 +1,110 @@
+import hashlib
+import os
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Depends, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.responses import Response as StarletteResponse
+
+from database import get_db
+from server.ingest_watermark import get_watermark
+from server.metadata_cache import metadata_cache
+from util.response import cache_headers
+from util.time_process import parse_datetime
+
+# 结束时间早于当前时间这么多秒的窗口视为不再变化，允许客户端长期缓存
+CACHE_IMMUTABLE_AFTER_SECONDS = int(os.getenv("CACHE_IMMUTABLE_AFTER_SECONDS", "86400"))
+CACHE_IMMUTABLE_MAX_AGE = int(os.getenv("CACHE_IMMUTABLE_MAX_AGE", "86400"))
+
+# 请求参数中表示窗口结束时间的字段
+WINDOW_END_PARAMS = ("end_time", "datetime")
+
+
+class NotModified(Exception):
+    def __init__(self, headers: dict):
+        self.headers = headers
+
+
+def conditional_get(source: str):
+    """接口依赖：按请求参数 + source 表的写入水位生成 ETag，客户端缓存仍然有效时直接返回 304
+
+    ETag 中同时包含元数据缓存的版本号，充电桩目录更新后也会失效
+    """
+    async def dependency(request: Request, db: AsyncSession = Depends(get_db)):
+        version, updated_at = await get_watermark(source, db)
+
+        params = "&".join(f"{key}={value}" for key, value in sorted(request.query_params.multi_items()))
+        # 同一 URL 按 Accept 协商出不同格式，Accept 也要计入 ETag
+        accept = request.headers.get("accept", "")
+        metadata_version = await metadata_cache.get_version(db)
+        key = f"{request.url.path}?{params}|accept:{accept}|{source}:{version}|metadata:{metadata_version}"
+        headers = {
+            "ETag": '"' + hashlib.sha1(key.encode()).hexdigest() + '"',
+            "Cache-Control": get_cache_control(request),
+            "Vary": "Accept",
+        }
+        if updated_at is not None:
+            headers["Last-Modified"] = format_datetime(updated_at.replace(tzinfo=timezone.utc), usegmt=True)
+
+        if is_not_modified(request, headers):
+            raise NotModified(headers)
+        # 接口正常返回后由中间件加到响应头上；接口返回错误信封时由 build_response 清空
+        request.state.cache_headers = headers
+        cache_headers.set(headers)
+
+    return dependency
+
+
+def get_cache_control(request: Request) -> str:
+    for name in WINDOW_END_PARAMS:
+        value = request.query_params.get(name)
+        if value is None:
+            continue
+        try:
+            end = parse_datetime(value)
+        except ValueError:
+            break
+        if end.tzinfo is None:
+            end = end.replace(tzinfo=timezone.utc)
+        if end <= datetime.now(timezone.utc) - timedelta(seconds=CACHE_IMMUTABLE_AFTER_SECONDS):
+            return f"public, max-age={CACHE_IMMUTABLE_MAX_AGE}"
+        break
+    # 其余情况每次都要带 ETag 回源确认
+    return "no-cache"
+
+
+def is_not_modified(request: Request, headers: dict) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or headers["ETag"] in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+
+    # 没有 If-None-Match 时才看 If-Modified-Since
+    if_modified_since = parse_http_date(request.headers.get("if-modified-since"))
+    last_modified = parse_http_date(headers.get("Last-Modified"))
+    return if_modified_since is not None and last_modified is not None and last_modified <= if_modified_since
+
+
+def parse_http_date(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def register_conditional_get(app):
+    @app.exception_handler(NotModified)
+    async def not_modified_handler(request: Request, exc: NotModified):
+        return StarletteResponse(status_code=304, headers=exc.headers)
+
+    @app.middleware("http")
+    async def cache_headers_middleware(request: Request, call_next):
+        response = await call_next(request)
+        headers = getattr(request.state, "cache_headers", None)
+        if headers and response.status_code == 200:
+            response.headers.update(headers)
+        return response
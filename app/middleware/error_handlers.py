@@ -1,48 +1,36 @@
 import logging
 from fastapi import Request
-from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
-from util.response import Response
+from util.response import Response, to_json_response
 
 logger = logging.getLogger(__name__)
 
+
+def error_response(request: Request, response):
+    # 错误响应不带 ETag / Cache-Control
+    request.state.cache_headers = None
+    return to_json_response(response)
+
+
 def register_error_handlers(app):
     @app.exception_handler(StarletteHTTPException)
     async def http_exception_handler(request: Request, exc: StarletteHTTPException):
         code = exc.status_code
         if code == 404:
-            return JSONResponse(
-                status_code=200,
-                content=Response.not_found().dict()
-            )
+            return error_response(request, Response.not_found())
         elif code == 403:
-            return JSONResponse(
-                status_code=200,
-                content=Response.forbidden().dict()
-            )
+            return error_response(request, Response.forbidden())
         elif code == 400:
-            return JSONResponse(
-                status_code=200,
-                content=Response.bad_request().dict()
-            )
+            return error_response(request, Response.bad_request())
         else:
-            return JSONResponse(
-                status_code=200,
-                content=Response.server_error(f"HTTP error {code}").dict()
-            )
+            return error_response(request, Response.server_error(f"HTTP error {code}"))
 
     @app.exception_handler(RequestValidationError)
     async def validation_exception_handler(request: Request, exc: RequestValidationError):
-        return JSONResponse(
-            status_code=200,
-            content=Response.bad_request("Request validation failed").dict()
-        )
+        return error_response(request, Response.bad_request("Request validation failed"))
 
     @app.exception_handler(Exception)
     async def global_exception_handler(request: Request, exc: Exception):
         logger.error(f"[Unhandled Exception] {request.url} - {exc}")
-        return JSONResponse(
-            status_code=200,
-            content=Response.server_error("Internal Server Error").dict()
-        )
+        return error_response(request, Response.server_error("Internal Server Error"))
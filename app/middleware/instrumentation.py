@@ -0,0 +1,141 @@
+import logging
+import os
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi import Request
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.responses import Response as StarletteResponse
+
+logger = logging.getLogger(__name__)
+
+# 单个请求执行的 SQL 条数超过该值时记一条警告（通常是 N+1 查询）
+QUERY_COUNT_WARN = int(os.getenv("QUERY_COUNT_WARN", "50"))
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+REQUEST_QUERIES = Histogram(
+    "db_queries_per_request", "SQL statements executed per request", ["route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 200),
+)
+REQUEST_SQL_SECONDS = Histogram(
+    "db_sql_seconds_per_request", "Time spent in SQL per request", ["route"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+ROWS_FETCHED = Counter("db_rows_fetched_total", "Rows returned by SELECT statements", ["route"])
+QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds", "Latency of individual SQL statements",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+)
+POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Time to obtain a pooled connection (includes opening new connections)",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections currently checked out of the pool")
+POOL_SIZE = Gauge("db_pool_size", "Configured pool size (without overflow)")
+
+
+class RequestStats:
+    __slots__ = ("queries", "sql_seconds", "rows", "pool_wait_seconds", "slow_query_seconds", "slow_statements")
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.rows = 0
+        self.pool_wait_seconds = 0.0
+        # 不为 None 时（profiling 模式）记录耗时超过该值的语句 (statement, parameters, 耗时)
+        self.slow_query_seconds: Optional[float] = None
+        self.slow_statements = []
+
+
+# 当前请求的统计；SQLAlchemy 的事件在同一个 context 中执行，可以直接累加
+request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """记录每次取连接等待时间的连接池，用于观察连接池是否打满"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            elapsed = time.perf_counter() - started
+            POOL_CHECKOUT_WAIT.observe(elapsed)
+            stats = request_stats.get()
+            if stats is not None:
+                stats.pool_wait_seconds += elapsed
+
+
+def instrument_engine(engine):
+    sync_engine = engine.sync_engine
+    POOL_SIZE.set(sync_engine.pool.size())
+    POOL_CHECKED_OUT.set_function(sync_engine.pool.checkedout)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        QUERY_LATENCY.observe(elapsed)
+        stats = request_stats.get()
+        if stats is None:
+            return
+        stats.queries += 1
+        stats.sql_seconds += elapsed
+        # asyncpg 的 rowcount 来自 "SELECT n" 状态，只统计返回结果的语句
+        if cursor.description is not None and cursor.rowcount > 0:
+            stats.rows += cursor.rowcount
+        if stats.slow_query_seconds is not None and elapsed >= stats.slow_query_seconds:
+            stats.slow_statements.append((statement, parameters, elapsed))
+
+
+def server_timing(stats: RequestStats, total_seconds: float) -> str:
+    app_seconds = max(0.0, total_seconds - stats.sql_seconds - stats.pool_wait_seconds)
+    return (
+        f'sql;dur={stats.sql_seconds * 1000:.1f};desc="{stats.queries} queries, {stats.rows} rows", '
+        f"pool;dur={stats.pool_wait_seconds * 1000:.1f}, "
+        f"app;dur={app_seconds * 1000:.1f}, "
+        f"total;dur={total_seconds * 1000:.1f}"
+    )
+
+
+def register_instrumentation(app, engine):
+    """SQL 统计写入 Server-Timing 响应头，并汇总到 /metrics（Prometheus 格式）"""
+    instrument_engine(engine)
+
+    @app.middleware("http")
+    async def instrumentation_middleware(request: Request, call_next):
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await call_next(request)
+        finally:
+            request_stats.reset(token)
+        total_seconds = time.perf_counter() - started
+
+        # 用路由模板作为标签，避免路径参数或 404 路径产生大量时间序列
+        route = request.scope.get("route")
+        route_label = route.path if route is not None else "unmatched"
+        REQUEST_LATENCY.labels(request.method, route_label, str(response.status_code)).observe(total_seconds)
+        REQUEST_QUERIES.labels(route_label).observe(stats.queries)
+        REQUEST_SQL_SECONDS.labels(route_label).observe(stats.sql_seconds)
+        ROWS_FETCHED.labels(route_label).inc(stats.rows)
+        if stats.queries > QUERY_COUNT_WARN:
+            logger.warning(f"[Query Count] {request.url} executed {stats.queries} statements")
+
+        response.headers["Server-Timing"] = server_timing(stats, total_seconds)
+        return response
+
+    async def metrics_endpoint(request: Request):
+        return StarletteResponse(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+    app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
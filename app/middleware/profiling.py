@@ -0,0 +1,135 @@
+import asyncio
+import hmac
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from typing import Optional
+
+import orjson
+from fastapi import Request
+from pyinstrument import Profiler
+
+from middleware.instrumentation import request_stats
+
+logger = logging.getLogger(__name__)
+
+# 对所有请求开启 profiling；未开启时只有带 X-Profile-Token（值为 ADMIN_TOKEN）的请求会被 profile
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+PROFILE_HEADER = "x-profile-token"
+# 调用栈采样间隔（秒）
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.001"))
+# 超过该耗时的 SQL 会再执行一次 EXPLAIN (ANALYZE, BUFFERS)
+SLOW_QUERY_SECONDS = float(os.getenv("SLOW_QUERY_SECONDS", "0.5"))
+# 超过该耗时的请求写入慢请求日志；带 header 的请求总是写入
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "1.0"))
+SLOW_REQUEST_LOG = os.getenv("SLOW_REQUEST_LOG", "slow_requests.log")
+SLOW_REQUEST_LOG_MAX_BYTES = int(os.getenv("SLOW_REQUEST_LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+SLOW_REQUEST_LOG_BACKUPS = int(os.getenv("SLOW_REQUEST_LOG_BACKUPS", "5"))
+
+# EXPLAIN ANALYZE 会真正执行语句，只对只读查询执行
+EXPLAIN_PREFIXES = ("select", "with")
+
+# 后台写日志的任务，保留引用避免被回收
+pending_reports = set()
+
+
+def slow_request_logger() -> logging.Logger:
+    """每行一个 JSON 对象，按大小滚动"""
+    slow_logger = logging.getLogger("slow_requests")
+    if not slow_logger.handlers:
+        handler = RotatingFileHandler(SLOW_REQUEST_LOG, maxBytes=SLOW_REQUEST_LOG_MAX_BYTES,
+                                      backupCount=SLOW_REQUEST_LOG_BACKUPS, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        slow_logger.addHandler(handler)
+        slow_logger.setLevel(logging.INFO)
+        slow_logger.propagate = False
+    return slow_logger
+
+
+def has_profile_token(request: Request) -> bool:
+    token = request.headers.get(PROFILE_HEADER)
+    if not ADMIN_TOKEN or token is None:
+        return False
+    return hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+
+def profiling_requested(request: Request) -> bool:
+    return PROFILING_ENABLED or has_profile_token(request)
+
+
+async def explain(engine, statement: str, parameters) -> Optional[str]:
+    if not statement.lstrip().lower().startswith(EXPLAIN_PREFIXES):
+        return None
+    # 单独的连接，事务回滚；不计入当前请求的 SQL 统计
+    token = request_stats.set(None)
+    try:
+        async with engine.connect() as conn:
+            result = await conn.exec_driver_sql(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters)
+            plan = "\n".join(row[0] for row in result)
+            await conn.rollback()
+        return plan
+    except Exception as e:
+        return f"EXPLAIN failed: {e!r}"
+    finally:
+        request_stats.reset(token)
+
+
+async def write_report(engine, record: dict, slow_statements: list):
+    statements = []
+    for statement, parameters, elapsed in slow_statements:
+        statements.append({
+            "statement": statement,
+            "parameters": parameters,
+            "seconds": round(elapsed, 4),
+            "plan": await explain(engine, statement, parameters),
+        })
+    record["slow_statements"] = statements
+    slow_request_logger().info(orjson.dumps(record, default=str).decode())
+
+
+def register_profiling(app, engine):
+    """profiling 模式：采样请求的 Python 调用栈，对慢 SQL 执行 EXPLAIN，一起写入慢请求日志
+
+    需要在 register_instrumentation 之前注册（位于其内层），慢 SQL 由 instrumentation 的统计收集
+    """
+    @app.middleware("http")
+    async def profiling_middleware(request: Request, call_next):
+        stats = request_stats.get()
+        # 只有令牌正确的请求才总是写入日志，否则任何客户端都能刷满慢请求日志
+        forced = has_profile_token(request)
+        if stats is None or not profiling_requested(request):
+            return await call_next(request)
+
+        stats.slow_query_seconds = SLOW_QUERY_SECONDS
+        profiler = Profiler(interval=PROFILE_INTERVAL, async_mode="enabled")
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            response = await call_next(request)
+        finally:
+            profiler.stop()
+        total_seconds = time.perf_counter() - started
+
+        # 流式响应在这里返回时还没有执行完查询，只记录到目前为止的部分
+        if forced or stats.slow_statements or total_seconds >= SLOW_REQUEST_SECONDS:
+            record = {
+                "time": datetime.now(timezone.utc).isoformat(),
+                "method": request.method,
+                "path": request.url.path,
+                "params": dict(request.query_params.multi_items()),
+                "status": response.status_code,
+                "seconds": round(total_seconds, 4),
+                "queries": stats.queries,
+                "sql_seconds": round(stats.sql_seconds, 4),
+                "rows": stats.rows,
+                "pool_wait_seconds": round(stats.pool_wait_seconds, 4),
+                "profile": profiler.output_text(unicode=False, color=False, show_all=False),
+            }
+            # EXPLAIN ANALYZE 会把慢查询再执行一遍，放到后台，不拖慢当前响应
+            task = asyncio.create_task(write_report(engine, record, list(stats.slow_statements)))
+            pending_reports.add(task)
+            task.add_done_callback(pending_reports.discard)
+        return response
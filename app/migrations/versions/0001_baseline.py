@@ -0,0 +1,260 @@
+"""baseline schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+
+迁移体系引入之前由 Base.metadata.create_all 建出的表结构。
+建表使用 checkfirst，已有数据库执行这一版本不会改动已有表，只补齐缺失的表和函数。
+"""
+from alembic import op
+import sqlalchemy as sa
+from geoalchemy2 import Geometry
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# 以下 SQL 固定为编写这一版本时 models 中的内容，之后 models 的改动写在新的版本里
+
+# 从原始数据计算 [lo, hi) 内每个充电桩每小时的汇总，ids 为 NULL 时计算全部充电桩
+HOURLY_COMPUTE_FUNCTION = """
+CREATE OR REPLACE FUNCTION station_status_hourly_compute(lo timestamp, hi timestamp, ids text[])
+RETURNS TABLE (
+    station_id varchar,
+    hour_start timestamp,
+    total_polls integer,
+    occupied_polls integer,
+    occupied_transitions integer,
+    occupied_seconds double precision
+)
+LANGUAGE sql STABLE AS $$
+WITH polls AS (
+    -- 每个充电桩在 lo 之后的第一条记录，取 lo 之前最近的一条状态作为 prev_status
+    SELECT s.station_id, s.timestamp, s.status,
+           coalesce(
+               lag(s.status) OVER (PARTITION BY s.station_id ORDER BY s.timestamp),
+               (SELECT p.status FROM station_status p
+                 WHERE p.station_id = s.station_id AND p.timestamp < lo
+                 ORDER BY p.timestamp DESC LIMIT 1)
+           ) AS prev_status
+    FROM station_status s
+    WHERE (ids IS NULL OR s.station_id = ANY(ids))
+      AND s.timestamp >= lo
+      AND s.timestamp < hi
+),
+counts AS (
+    SELECT p.station_id,
+           date_trunc('hour', p.timestamp) AS hour_start,
+           count(*) AS total_polls,
+           count(*) FILTER (WHERE p.status = 'OCCUPIED') AS occupied_polls,
+           count(*) FILTER (WHERE p.status = 'OCCUPIED' AND p.prev_status <> 'OCCUPIED') AS occupied_transitions
+    FROM polls p
+    GROUP BY 1, 2
+),
+occupied AS (
+    SELECT s.station_id, s.timestamp AS ts,
+           lead(s.timestamp) OVER (PARTITION BY s.station_id ORDER BY s.timestamp) AS next_ts
+    FROM station_status s
+    WHERE (ids IS NULL OR s.station_id = ANY(ids))
+      AND s.status = 'OCCUPIED'
+      AND s.timestamp >= lo - interval '1 hour'
+      AND s.timestamp < hi + interval '1 hour'
+),
+spans AS (
+    SELECT o.station_id,
+           h.hour_start,
+           sum(extract(epoch FROM least(o.next_ts, h.hour_start + interval '1 hour')
+                                  - greatest(o.ts, h.hour_start))) AS occupied_seconds
+    FROM occupied o
+    CROSS JOIN LATERAL generate_series(
+        date_trunc('hour', o.ts), date_trunc('hour', o.next_ts), interval '1 hour'
+    ) AS h(hour_start)
+    WHERE o.next_ts - o.ts <= interval '1 hour'
+      AND h.hour_start >= lo
+      AND h.hour_start < hi
+    GROUP BY 1, 2
+)
+SELECT coalesce(c.station_id, sp.station_id)::varchar,
+       coalesce(c.hour_start, sp.hour_start),
+       coalesce(c.total_polls, 0)::integer,
+       coalesce(c.occupied_polls, 0)::integer,
+       coalesce(c.occupied_transitions, 0)::integer,
+       coalesce(sp.occupied_seconds, 0)::double precision
+FROM counts c
+FULL JOIN spans sp ON sp.station_id = c.station_id AND sp.hour_start = c.hour_start
+$$
+"""
+
+# 将 [lo, hi) 的汇总结果写回 station_status_hourly（幂等，可重复执行）
+HOURLY_UPSERT_FUNCTION = """
+CREATE OR REPLACE FUNCTION station_status_hourly_upsert(lo timestamp, hi timestamp, ids text[])
+RETURNS void
+LANGUAGE sql AS $$
+INSERT INTO station_status_hourly AS h
+    (station_id, hour_start, total_polls, occupied_polls, occupied_transitions, occupied_seconds)
+SELECT * FROM station_status_hourly_compute(lo, hi, ids)
+ON CONFLICT (station_id, hour_start) DO UPDATE SET
+    total_polls = EXCLUDED.total_polls,
+    occupied_polls = EXCLUDED.occupied_polls,
+    occupied_transitions = EXCLUDED.occupied_transitions,
+    occupied_seconds = EXCLUDED.occupied_seconds
+$$
+"""
+
+# 每次写入 station_status 后，重新计算本批数据涉及的小时及其前一个小时（跨整点的占用区间）
+HOURLY_TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION station_status_hourly_refresh()
+RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    lo timestamp;
+    hi timestamp;
+    ids text[];
+BEGIN
+    SELECT date_trunc('hour', min(n.timestamp)) - interval '1 hour',
+           date_trunc('hour', max(n.timestamp)) + interval '1 hour',
+           array_agg(DISTINCT n.station_id)::text[]
+      INTO lo, hi, ids
+      FROM new_rows n;
+    IF ids IS NOT NULL THEN
+        PERFORM station_status_hourly_upsert(lo, hi, ids);
+    END IF;
+    RETURN NULL;
+END
+$$
+"""
+
+HOURLY_TRIGGER_DROP = "DROP TRIGGER IF EXISTS station_status_hourly_refresh ON station_status"
+
+HOURLY_TRIGGER = """
+CREATE TRIGGER station_status_hourly_refresh
+AFTER INSERT ON station_status
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION station_status_hourly_refresh()
+"""
+
+# 按顺序执行（均可重复执行）
+HOURLY_DDL = (
+    HOURLY_COMPUTE_FUNCTION,
+    HOURLY_UPSERT_FUNCTION,
+    HOURLY_TRIGGER_FUNCTION,
+    HOURLY_TRIGGER_DROP,
+    HOURLY_TRIGGER,
+)
+
+# 只在新数据比已有记录更新时覆盖，补写历史数据不会回退当前状态
+CURRENT_STATUS_TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION station_current_status_refresh()
+RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO station_current_status AS c (station_id, timestamp, status, last_updated)
+    SELECT DISTINCT ON (n.station_id) n.station_id, n.timestamp, n.status, n.last_updated
+      FROM new_rows n
+     ORDER BY n.station_id, n.timestamp DESC
+    ON CONFLICT (station_id) DO UPDATE SET
+        timestamp = EXCLUDED.timestamp,
+        status = EXCLUDED.status,
+        last_updated = EXCLUDED.last_updated
+    WHERE c.timestamp <= EXCLUDED.timestamp;
+    RETURN NULL;
+END
+$$
+"""
+
+CURRENT_STATUS_TRIGGER_DROP = "DROP TRIGGER IF EXISTS station_current_status_refresh ON station_status"
+
+CURRENT_STATUS_TRIGGER = """
+CREATE TRIGGER station_current_status_refresh
+AFTER INSERT ON station_status
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION station_current_status_refresh()
+"""
+
+# 表为空时（新建表）用已有历史数据初始化一次
+CURRENT_STATUS_BACKFILL = """
+INSERT INTO station_current_status (station_id, timestamp, status, last_updated)
+SELECT DISTINCT ON (s.station_id) s.station_id, s.timestamp, s.status, s.last_updated
+  FROM station_status s
+ WHERE NOT EXISTS (SELECT 1 FROM station_current_status)
+ ORDER BY s.station_id, s.timestamp DESC
+ON CONFLICT (station_id) DO NOTHING
+"""
+
+# 按顺序执行（均可重复执行）
+CURRENT_STATUS_DDL = (
+    CURRENT_STATUS_BACKFILL,
+    CURRENT_STATUS_TRIGGER_FUNCTION,
+    CURRENT_STATUS_TRIGGER_DROP,
+    CURRENT_STATUS_TRIGGER,
+)
+
+# 这里固定当时的表结构，之后的改动写在新的版本里，不随 models 变化
+metadata = sa.MetaData()
+
+sa.Table(
+    "charging_stations", metadata,
+    sa.Column("station_id", sa.String, primary_key=True, index=True),
+    sa.Column("name", sa.Text, nullable=True),
+    sa.Column("description", sa.Text, nullable=True),
+    sa.Column("location", Geometry("POINT", srid=4326), nullable=True),
+    sa.Column("city_id", sa.String, nullable=True),
+    sa.Column("connector_type", sa.String, nullable=True),
+    sa.Column("rated_power_kw", sa.Float, nullable=True),
+)
+
+sa.Table(
+    "cities", metadata,
+    sa.Column("city_id", sa.String, primary_key=True),
+    sa.Column("label", sa.String, nullable=False),
+    sa.Column("center", Geometry("POINT", srid=4326)),
+)
+
+sa.Table(
+    "station_status", metadata,
+    sa.Column("id", sa.Integer, primary_key=True, index=True, autoincrement=True),
+    sa.Column("station_id", sa.String, sa.ForeignKey("charging_stations.station_id"), nullable=False),
+    sa.Column("timestamp", sa.TIMESTAMP, nullable=False),
+    sa.Column("status", sa.String, nullable=True),
+    sa.Column("last_updated", sa.TIMESTAMP, nullable=True),
+    sa.Index("ix_station_status_station_id_timestamp", "station_id", "timestamp", unique=True),
+)
+
+sa.Table(
+    "station_status_hourly", metadata,
+    sa.Column("station_id", sa.String, primary_key=True),
+    sa.Column("hour_start", sa.TIMESTAMP, primary_key=True, index=True),
+    sa.Column("total_polls", sa.Integer, nullable=False),
+    sa.Column("occupied_polls", sa.Integer, nullable=False),
+    sa.Column("occupied_transitions", sa.Integer, nullable=False),
+    sa.Column("occupied_seconds", sa.Float, nullable=False),
+)
+
+sa.Table(
+    "station_current_status", metadata,
+    sa.Column("station_id", sa.String, sa.ForeignKey("charging_stations.station_id"), primary_key=True),
+    sa.Column("timestamp", sa.TIMESTAMP, nullable=False),
+    sa.Column("status", sa.String, nullable=True),
+    sa.Column("last_updated", sa.TIMESTAMP, nullable=True),
+)
+
+sa.Table(
+    "grid_metrics", metadata,
+    sa.Column("id", sa.Integer, primary_key=True, index=True),
+    sa.Column("timestamp", sa.DateTime, index=True, nullable=False),
+    sa.Column("metric_type", sa.String, index=True, nullable=False),
+    sa.Column("value_mw", sa.Float, nullable=False),
+    sa.Index("ix_grid_metrics_timestamp_metric_type", "timestamp", "metric_type", unique=True),
+)
+
+
+def upgrade():
+    metadata.create_all(op.get_bind(), checkfirst=True)
+    for statement in HOURLY_DDL + CURRENT_STATUS_DDL:
+        op.execute(statement)
+
+
+def downgrade():
+    raise NotImplementedError("baseline 不支持降级")
@@ -0,0 +1,151 @@
+"""partition station_status by month
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+
+把 station_status 改为按 timestamp 按月的范围分区表：
+旧表改名为 station_status_legacy，新建同名分区表并按已有数据的月份建分区，
+整表复制后删除旧表，再把两个汇总触发器装到新表上（复制过程不触发汇总，汇总表已是最新）。
+数据量大时整个过程在一个事务里完成，需要在停止采集的窗口执行：
+已有数据时应用启动不会执行这一版本（见 database.MANUAL_REVISIONS），停止采集后在 app 目录运行 alembic upgrade head。
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+# 以下 SQL 固定为编写这一版本时 models 中的内容，之后 models 的改动写在新的版本里
+
+# 提前创建的分区月数；应用启动和每次采集时都会检查一遍
+PARTITION_MONTHS_AHEAD = 3
+
+# 为 [lo, hi) 覆盖到的每个月创建 station_status_YYYY_MM 分区（已存在则跳过），返回新建的分区数
+PARTITION_FUNCTION = """
+CREATE OR REPLACE FUNCTION station_status_ensure_partitions(lo timestamp, hi timestamp)
+RETURNS integer
+LANGUAGE plpgsql AS $$
+DECLARE
+    month_start timestamp := date_trunc('month', lo);
+    partition_name text;
+    created integer := 0;
+BEGIN
+    WHILE month_start < hi LOOP
+        partition_name := 'station_status_' || to_char(month_start, 'YYYY_MM');
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE 'CREATE TABLE ' || quote_ident(partition_name)
+                 || ' PARTITION OF station_status FOR VALUES FROM ('
+                 || quote_literal(month_start) || ') TO ('
+                 || quote_literal(month_start + interval '1 month') || ')';
+            created := created + 1;
+        END IF;
+        month_start := month_start + interval '1 month';
+    END LOOP;
+    RETURN created;
+END
+$$
+"""
+
+# 当前月及之后 PARTITION_MONTHS_AHEAD 个月
+ENSURE_FUTURE_PARTITIONS = f"""
+SELECT station_status_ensure_partitions(
+    date_trunc('month', now() AT TIME ZONE 'UTC'),
+    date_trunc('month', now() AT TIME ZONE 'UTC') + interval '{PARTITION_MONTHS_AHEAD + 1} months'
+)
+"""
+
+HOURLY_TRIGGER_DROP = "DROP TRIGGER IF EXISTS station_status_hourly_refresh ON station_status"
+
+HOURLY_TRIGGER = """
+CREATE TRIGGER station_status_hourly_refresh
+AFTER INSERT ON station_status
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION station_status_hourly_refresh()
+"""
+
+CURRENT_STATUS_TRIGGER_DROP = "DROP TRIGGER IF EXISTS station_current_status_refresh ON station_status"
+
+CURRENT_STATUS_TRIGGER = """
+CREATE TRIGGER station_current_status_refresh
+AFTER INSERT ON station_status
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION station_current_status_refresh()
+"""
+
+
+def upgrade():
+    op.execute(PARTITION_FUNCTION)
+
+    op.execute("ALTER TABLE station_status RENAME TO station_status_legacy")
+    op.execute("ALTER TABLE station_status_legacy RENAME CONSTRAINT station_status_pkey TO station_status_legacy_pkey")
+    op.execute("DROP INDEX IF EXISTS ix_station_status_id")
+    op.execute("DROP INDEX IF EXISTS ix_station_status_station_id_timestamp")
+
+    # id 继续使用原来的序列；分区表的主键和唯一索引都必须包含分区键
+    op.execute("""
+        CREATE TABLE station_status (
+            id integer NOT NULL DEFAULT nextval('station_status_id_seq'),
+            station_id varchar NOT NULL REFERENCES charging_stations (station_id),
+            timestamp timestamp NOT NULL,
+            status varchar,
+            last_updated timestamp,
+            CONSTRAINT station_status_pkey PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+    """)
+    op.execute("ALTER SEQUENCE station_status_id_seq OWNED BY station_status.id")
+    # 建在父表上的索引会在每个分区上各建一份
+    op.execute("CREATE INDEX ix_station_status_id ON station_status (id)")
+    op.execute(
+        "CREATE UNIQUE INDEX ix_station_status_station_id_timestamp "
+        "ON station_status (station_id, timestamp)"
+    )
+
+    # 从最早的数据一直建到当前月，中间没有数据的月份也建上，避免之后补写历史数据时缺分区
+    op.execute("""
+        SELECT station_status_ensure_partitions(min(timestamp), now() AT TIME ZONE 'UTC')
+          FROM station_status_legacy
+    """)
+    op.execute(ENSURE_FUTURE_PARTITIONS)
+    op.execute("""
+        INSERT INTO station_status (id, station_id, timestamp, status, last_updated)
+        SELECT id, station_id, timestamp, status, last_updated FROM station_status_legacy
+    """)
+    op.execute("DROP TABLE station_status_legacy")
+
+    for statement in (HOURLY_TRIGGER_DROP, HOURLY_TRIGGER, CURRENT_STATUS_TRIGGER_DROP, CURRENT_STATUS_TRIGGER):
+        op.execute(statement)
+    op.execute("ANALYZE station_status")
+
+
+def downgrade():
+    op.execute("ALTER TABLE station_status RENAME TO station_status_partitioned")
+    op.execute("ALTER TABLE station_status_partitioned RENAME CONSTRAINT station_status_pkey TO station_status_partitioned_pkey")
+    op.execute("DROP INDEX IF EXISTS ix_station_status_id")
+    op.execute("DROP INDEX IF EXISTS ix_station_status_station_id_timestamp")
+    op.execute("""
+        CREATE TABLE station_status (
+            id integer NOT NULL DEFAULT nextval('station_status_id_seq'),
+            station_id varchar NOT NULL REFERENCES charging_stations (station_id),
+            timestamp timestamp NOT NULL,
+            status varchar,
+            last_updated timestamp,
+            CONSTRAINT station_status_pkey PRIMARY KEY (id)
+        )
+    """)
+    op.execute("ALTER SEQUENCE station_status_id_seq OWNED BY station_status.id")
+    op.execute("CREATE INDEX ix_station_status_id ON station_status (id)")
+    op.execute(
+        "CREATE UNIQUE INDEX ix_station_status_station_id_timestamp "
+        "ON station_status (station_id, timestamp)"
+    )
+    op.execute("""
+        INSERT INTO station_status (id, station_id, timestamp, status, last_updated)
+        SELECT id, station_id, timestamp, status, last_updated FROM station_status_partitioned
+    """)
+    op.execute("DROP TABLE station_status_partitioned")
+    op.execute("DROP FUNCTION IF EXISTS station_status_ensure_partitions(timestamp, timestamp)")
+
+    for statement in (HOURLY_TRIGGER_DROP, HOURLY_TRIGGER, CURRENT_STATUS_TRIGGER_DROP, CURRENT_STATUS_TRIGGER):
+        op.execute(statement)
@@ -0,0 +1,27 @@
+"""gist index on charging_stations.location
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+
+/map/cus_map 用 location && ST_MakeEnvelope(...) 过滤矩形，依赖 location 上的 GiST 索引。
+geoalchemy2 建表时会自动建这个索引，这里补上不是由 create_all 建出的表。
+"""
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_charging_stations_location "
+        "ON charging_stations USING gist (location)"
+    )
+
+
+def downgrade():
+    # 与 geoalchemy2 自动建的索引同名，降级时保留
+    pass
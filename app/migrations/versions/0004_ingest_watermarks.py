@@ -0,0 +1,71 @@
+"""ingest watermarks for conditional GET
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+
+station_status / grid_metrics 每次写入后更新 ingest_watermarks 中对应的版本号，
+接口用它生成 ETag，数据没有变化时直接返回 304。
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+# 以下 SQL 固定为编写这一版本时 models 中的内容，之后 models 的改动写在新的版本里
+
+# 语句级触发器，一次批量写入只更新一次水位
+WATERMARK_TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION ingest_watermark_bump()
+RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO ingest_watermarks AS w (source, version, updated_at)
+    VALUES (TG_TABLE_NAME, 1, now() AT TIME ZONE 'UTC')
+    ON CONFLICT (source) DO UPDATE SET
+        version = w.version + 1,
+        updated_at = EXCLUDED.updated_at;
+    RETURN NULL;
+END
+$$
+"""
+
+WATERMARK_SOURCES = ("station_status", "grid_metrics")
+
+
+def watermark_trigger_ddl(table: str):
+    return (
+        f"DROP TRIGGER IF EXISTS ingest_watermark_bump ON {table}",
+        f"""
+        CREATE TRIGGER ingest_watermark_bump
+        AFTER INSERT OR UPDATE OR DELETE ON {table}
+        FOR EACH STATEMENT EXECUTE FUNCTION ingest_watermark_bump()
+        """,
+    )
+
+
+# 按顺序执行（均可重复执行）
+WATERMARK_DDL = (WATERMARK_TRIGGER_FUNCTION,) + tuple(
+    statement for table in WATERMARK_SOURCES for statement in watermark_trigger_ddl(table)
+)
+
+
+def upgrade():
+    op.create_table(
+        "ingest_watermarks",
+        sa.Column("source", sa.String, primary_key=True),
+        sa.Column("version", sa.BigInteger, nullable=False),
+        sa.Column("updated_at", sa.TIMESTAMP, nullable=False),
+    )
+    for statement in WATERMARK_DDL:
+        op.execute(statement)
+
+
+def downgrade():
+    for table in WATERMARK_SOURCES:
+        op.execute(f"DROP TRIGGER IF EXISTS ingest_watermark_bump ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS ingest_watermark_bump()")
+    op.drop_table("ingest_watermarks")
@@ -0,0 +1,95 @@
+"""station_status_bucket_compute for sub-hour resolutions
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+
+/graph 接口的 resolution=15min 需要比小时汇总表更细的分桶，直接从 station_status 计算。
+"""
+from alembic import op
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+# 以下 SQL 固定为编写这一版本时 models 中的内容，之后 models 的改动写在新的版本里
+
+# 与 station_status_hourly_compute 口径相同，但按任意步长 step 分桶（桶从 lo 开始对齐），
+# 用于比小时更细的 resolution；占用时长截断到 hi
+BUCKET_COMPUTE_FUNCTION = """
+CREATE OR REPLACE FUNCTION station_status_bucket_compute(lo timestamp, hi timestamp, ids text[], step interval)
+RETURNS TABLE (
+    station_id varchar,
+    bucket_start timestamp,
+    total_polls integer,
+    occupied_polls integer,
+    occupied_transitions integer,
+    occupied_seconds double precision
+)
+LANGUAGE sql STABLE AS $$
+WITH polls AS (
+    SELECT s.station_id, s.timestamp, s.status,
+           coalesce(
+               lag(s.status) OVER (PARTITION BY s.station_id ORDER BY s.timestamp),
+               (SELECT p.status FROM station_status p
+                 WHERE p.station_id = s.station_id AND p.timestamp < lo
+                 ORDER BY p.timestamp DESC LIMIT 1)
+           ) AS prev_status
+    FROM station_status s
+    WHERE (ids IS NULL OR s.station_id = ANY(ids))
+      AND s.timestamp >= lo
+      AND s.timestamp < hi
+),
+counts AS (
+    SELECT p.station_id,
+           date_bin(step, p.timestamp, lo) AS bucket_start,
+           count(*) AS total_polls,
+           count(*) FILTER (WHERE p.status = 'OCCUPIED') AS occupied_polls,
+           count(*) FILTER (WHERE p.status = 'OCCUPIED' AND p.prev_status <> 'OCCUPIED') AS occupied_transitions
+    FROM polls p
+    GROUP BY 1, 2
+),
+occupied AS (
+    SELECT s.station_id, s.timestamp AS ts,
+           lead(s.timestamp) OVER (PARTITION BY s.station_id ORDER BY s.timestamp) AS next_ts
+    FROM station_status s
+    WHERE (ids IS NULL OR s.station_id = ANY(ids))
+      AND s.status = 'OCCUPIED'
+      AND s.timestamp >= lo - interval '1 hour'
+      AND s.timestamp < hi + interval '1 hour'
+),
+spans AS (
+    SELECT o.station_id,
+           b.bucket_start,
+           sum(extract(epoch FROM least(o.next_ts, b.bucket_start + step, hi)
+                                  - greatest(o.ts, b.bucket_start))) AS occupied_seconds
+    FROM occupied o
+    CROSS JOIN LATERAL generate_series(
+        date_bin(step, o.ts, lo), date_bin(step, o.next_ts, lo), step
+    ) AS b(bucket_start)
+    WHERE o.next_ts - o.ts <= interval '1 hour'
+      AND b.bucket_start >= lo
+      AND b.bucket_start < hi
+      AND o.next_ts > b.bucket_start
+      AND o.ts < hi
+    GROUP BY 1, 2
+)
+SELECT coalesce(c.station_id, sp.station_id)::varchar,
+       coalesce(c.bucket_start, sp.bucket_start),
+       coalesce(c.total_polls, 0)::integer,
+       coalesce(c.occupied_polls, 0)::integer,
+       coalesce(c.occupied_transitions, 0)::integer,
+       coalesce(sp.occupied_seconds, 0)::double precision
+FROM counts c
+FULL JOIN spans sp ON sp.station_id = c.station_id AND sp.bucket_start = c.bucket_start
+$$
+"""
+
+
+def upgrade():
+    op.execute(BUCKET_COMPUTE_FUNCTION)
+
+
+def downgrade():
+    op.execute("DROP FUNCTION IF EXISTS station_status_bucket_compute(timestamp, timestamp, text[], interval)")
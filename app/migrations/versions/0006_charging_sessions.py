@@ -0,0 +1,169 @@
+"""charging_sessions maintained at ingest
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+
+charging_sessions_counts 和 city_energy 改为查询会话表，不再每次请求从轮询记录重建会话。
+新建表时用已有的 station_status 初始化，之后由触发器增量维护。
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+# 以下 SQL 固定为编写这一版本时 models 中的内容，之后 models 的改动写在新的版本里
+
+# 从 [lo, hi] 内的记录计算会话，ids 为 NULL 时计算全部充电桩；
+# 调用方保证 lo 之前和 hi 之后的第一条记录都是会话的断点
+SESSIONS_COMPUTE_FUNCTION = """
+CREATE OR REPLACE FUNCTION charging_sessions_compute(lo timestamp, hi timestamp, ids text[])
+RETURNS TABLE (
+    station_id varchar,
+    start_time timestamp,
+    end_time timestamp,
+    duration_seconds double precision,
+    energy_kwh double precision,
+    closed boolean
+)
+LANGUAGE sql STABLE AS $$
+WITH polls AS (
+    SELECT s.station_id, s.timestamp, s.status,
+           lag(s.status) OVER w AS prev_status,
+           lag(s.timestamp) OVER w AS prev_timestamp
+    FROM station_status s
+    WHERE (ids IS NULL OR s.station_id = ANY(ids))
+      AND s.timestamp >= lo
+      AND s.timestamp <= hi
+    WINDOW w AS (PARTITION BY s.station_id ORDER BY s.timestamp)
+),
+occupied AS (
+    -- 前一条记录不是 OCCUPIED 或间隔超过 1 小时时开始新会话，累计计数即会话编号
+    SELECT p.station_id, p.timestamp,
+           count(*) FILTER (
+               WHERE p.prev_status IS DISTINCT FROM 'OCCUPIED'
+                  OR p.timestamp - p.prev_timestamp > interval '1 hour'
+           ) OVER (PARTITION BY p.station_id ORDER BY p.timestamp) AS session_no
+    FROM polls p
+    WHERE p.status = 'OCCUPIED'
+),
+sessions AS (
+    SELECT o.station_id, min(o.timestamp) AS start_time, max(o.timestamp) AS end_time
+    FROM occupied o
+    GROUP BY o.station_id, o.session_no
+)
+SELECT se.station_id::varchar,
+       se.start_time,
+       se.end_time,
+       extract(epoch FROM se.end_time - se.start_time)::double precision,
+       (extract(epoch FROM se.end_time - se.start_time) * c.rated_power_kw / 3600.0)::double precision,
+       EXISTS (SELECT 1 FROM station_status n WHERE n.station_id = se.station_id AND n.timestamp > se.end_time)
+FROM sessions se
+LEFT JOIN charging_stations c ON c.station_id = se.station_id
+$$
+"""
+
+# 每次写入 station_status 后，按充电桩确定可能受影响的会话范围，删除后重新计算：
+# 起点为包含（或 1 小时内紧接）最早新记录的会话的开始时间，终点为包含（或 1 小时内紧接）最晚新记录的会话的结束时间
+SESSIONS_TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION charging_sessions_refresh()
+RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    ids text[];
+    los timestamp[];
+    his timestamp[];
+    latest timestamp[];
+BEGIN
+    SELECT array_agg(b.station_id),
+           array_agg(coalesce(
+               (SELECT min(c.start_time) FROM charging_sessions c
+                 WHERE c.station_id = b.station_id
+                   AND c.start_time <= b.first_ts
+                   AND c.end_time >= b.first_ts - interval '1 hour'),
+               b.first_ts)),
+           array_agg(greatest(
+               (SELECT max(c.end_time) FROM charging_sessions c
+                 WHERE c.station_id = b.station_id
+                   AND c.start_time <= b.last_ts + interval '1 hour'
+                   AND c.end_time >= b.last_ts),
+               b.last_ts)),
+           array_agg(b.last_ts)
+      INTO ids, los, his, latest
+      FROM (
+          SELECT n.station_id::text AS station_id, min(n.timestamp) AS first_ts, max(n.timestamp) AS last_ts
+            FROM new_rows n
+           GROUP BY n.station_id
+      ) b;
+    IF ids IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    -- 新记录之前的会话不会再延长
+    UPDATE charging_sessions c SET closed = true
+      FROM unnest(ids, latest) AS r(station_id, last_ts)
+     WHERE c.station_id = r.station_id AND NOT c.closed AND c.end_time < r.last_ts;
+
+    DELETE FROM charging_sessions c
+     USING unnest(ids, los, his) AS r(station_id, lo, hi)
+     WHERE c.station_id = r.station_id AND c.start_time >= r.lo AND c.start_time <= r.hi;
+
+    INSERT INTO charging_sessions (station_id, start_time, end_time, duration_seconds, energy_kwh, closed)
+    SELECT s.*
+      FROM unnest(ids, los, his) AS r(station_id, lo, hi)
+     CROSS JOIN LATERAL charging_sessions_compute(r.lo, r.hi, ARRAY[r.station_id]) s;
+    RETURN NULL;
+END
+$$
+"""
+
+SESSIONS_TRIGGER_DROP = "DROP TRIGGER IF EXISTS charging_sessions_refresh ON station_status"
+
+SESSIONS_TRIGGER = """
+CREATE TRIGGER charging_sessions_refresh
+AFTER INSERT ON station_status
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION charging_sessions_refresh()
+"""
+
+# 表为空时（新建表）用已有历史数据初始化一次
+SESSIONS_BACKFILL = """
+INSERT INTO charging_sessions (station_id, start_time, end_time, duration_seconds, energy_kwh, closed)
+SELECT * FROM charging_sessions_compute('-infinity', 'infinity', NULL)
+ WHERE NOT EXISTS (SELECT 1 FROM charging_sessions)
+"""
+
+# 按顺序执行（均可重复执行）
+SESSIONS_DDL = (
+    SESSIONS_COMPUTE_FUNCTION,
+    SESSIONS_BACKFILL,
+    SESSIONS_TRIGGER_FUNCTION,
+    SESSIONS_TRIGGER_DROP,
+    SESSIONS_TRIGGER,
+)
+
+
+def upgrade():
+    op.create_table(
+        "charging_sessions",
+        sa.Column("station_id", sa.String, primary_key=True),
+        sa.Column("start_time", sa.TIMESTAMP, primary_key=True),
+        sa.Column("end_time", sa.TIMESTAMP, nullable=False),
+        sa.Column("duration_seconds", sa.Float, nullable=False),
+        sa.Column("energy_kwh", sa.Float, nullable=True),
+        sa.Column("closed", sa.Boolean, nullable=False),
+    )
+    op.execute("CREATE INDEX ix_charging_sessions_period ON charging_sessions "
+               "USING gist (tsrange(start_time, end_time, '[]'))")
+    for statement in SESSIONS_DDL:
+        op.execute(statement)
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS charging_sessions_refresh ON station_status")
+    op.execute("DROP FUNCTION IF EXISTS charging_sessions_refresh()")
+    op.execute("DROP FUNCTION IF EXISTS charging_sessions_compute(timestamp, timestamp, text[])")
+    op.drop_table("charging_sessions")
@@ -0,0 +1,81 @@
+"""NOTIFY on station status changes
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+
+station_current_status 中的状态变化通过 pg_notify 发出，/map/live 的 WebSocket 订阅者只收到变化，
+不再轮询 get_map_by_city_and_time。
+"""
+from alembic import op
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+# 以下 SQL 固定为编写这一版本时 models 中的内容，之后 models 的改动写在新的版本里
+
+# station_current_status 中状态发生变化时，每个充电桩发一条 NOTIFY（payload 为 JSON），
+# 应用用一个 LISTEN 连接接收后推送给订阅了对应城市的客户端
+STATUS_NOTIFY_CHANNEL = "station_status_changed"
+
+STATUS_NOTIFY_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION station_status_notify()
+RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM pg_notify('{STATUS_NOTIFY_CHANNEL}', json_build_object(
+                    'station_id', n.station_id, 'city_id', s.city_id,
+                    'status', n.status, 'timestamp', n.timestamp)::text)
+           FROM new_rows n
+           LEFT JOIN charging_stations s ON s.station_id = n.station_id;
+    ELSE
+        PERFORM pg_notify('{STATUS_NOTIFY_CHANNEL}', json_build_object(
+                    'station_id', n.station_id, 'city_id', s.city_id,
+                    'status', n.status, 'timestamp', n.timestamp)::text)
+           FROM new_rows n
+           JOIN old_rows o ON o.station_id = n.station_id
+           LEFT JOIN charging_stations s ON s.station_id = n.station_id
+          WHERE n.status IS DISTINCT FROM o.status;
+    END IF;
+    RETURN NULL;
+END
+$$
+"""
+
+STATUS_NOTIFY_TRIGGER_DROP = (
+    "DROP TRIGGER IF EXISTS station_status_notify_insert ON station_current_status",
+    "DROP TRIGGER IF EXISTS station_status_notify_update ON station_current_status",
+)
+
+# 带 transition table 的触发器只能对应一种事件，INSERT 和 UPDATE 各建一个
+STATUS_NOTIFY_TRIGGERS = (
+    """
+    CREATE TRIGGER station_status_notify_insert
+    AFTER INSERT ON station_current_status
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION station_status_notify()
+    """,
+    """
+    CREATE TRIGGER station_status_notify_update
+    AFTER UPDATE ON station_current_status
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION station_status_notify()
+    """,
+)
+
+# 按顺序执行（均可重复执行）
+STATUS_NOTIFY_DDL = (STATUS_NOTIFY_FUNCTION, *STATUS_NOTIFY_TRIGGER_DROP, *STATUS_NOTIFY_TRIGGERS)
+
+
+def upgrade():
+    for statement in STATUS_NOTIFY_DDL:
+        op.execute(statement)
+
+
+def downgrade():
+    for statement in STATUS_NOTIFY_TRIGGER_DROP:
+        op.execute(statement)
+    op.execute("DROP FUNCTION IF EXISTS station_status_notify()")
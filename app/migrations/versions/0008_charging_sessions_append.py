@@ -0,0 +1,121 @@
+"""charging_sessions: update sessions in place on normal polls
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18
+
+正常轮询（每个充电桩一条晚于已有记录的新记录）直接延长、关闭或新建会话，
+不再从会话开始时间起重新扫描轮询记录；补写历史和乱序写入仍然删除后重新计算。
+"""
+from alembic import op
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+# 以下 SQL 固定为编写这一版本时 models 中的内容，之后 models 的改动写在新的版本里
+
+# 每次写入 station_status 后更新受影响的会话：
+# 1. 正常轮询（该充电桩本次只有一条新记录，且晚于已有的所有记录）原地处理：OCCUPIED 且距未关闭会话的
+#    结束时间不超过 1 小时时延长该会话，否则关闭它，新记录为 OCCUPIED 时开始新会话；
+#    未关闭的会话（closed = false）的 end_time 就是该充电桩最新的一条记录，因此不需要再读轮询记录
+# 2. 其余情况（补写历史、乱序、一次多条）按充电桩确定可能受影响的会话范围，删除后重新计算：
+#    起点为包含（或 1 小时内紧接）最早新记录的会话的开始时间，终点为包含（或 1 小时内紧接）最晚新记录的会话的结束时间
+SESSIONS_TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION charging_sessions_refresh()
+RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    appended_ids text[];
+    ids text[];
+    los timestamp[];
+    his timestamp[];
+    latest timestamp[];
+BEGIN
+    WITH appended AS (
+        SELECT b.station_id, b.ts, b.status, o.start_time AS open_start,
+               coalesce(b.status = 'OCCUPIED' AND o.end_time >= b.ts - interval '1 hour', false) AS extends
+          FROM (
+              SELECT n.station_id::text AS station_id, max(n.timestamp) AS ts, max(n.status) AS status
+                FROM new_rows n
+               GROUP BY n.station_id
+              HAVING count(*) = 1
+          ) b
+          LEFT JOIN charging_sessions o ON o.station_id = b.station_id AND NOT o.closed
+         WHERE NOT EXISTS (SELECT 1 FROM station_status s WHERE s.station_id = b.station_id AND s.timestamp > b.ts)
+    ),
+    extended AS (
+        UPDATE charging_sessions c
+           SET end_time = a.ts,
+               duration_seconds = extract(epoch FROM a.ts - c.start_time)::double precision,
+               energy_kwh = (extract(epoch FROM a.ts - c.start_time) * p.rated_power_kw / 3600.0)::double precision
+          FROM appended a
+          LEFT JOIN charging_stations p ON p.station_id = a.station_id
+         WHERE a.extends AND c.station_id = a.station_id AND c.start_time = a.open_start
+    ),
+    finished AS (
+        UPDATE charging_sessions c SET closed = true
+          FROM appended a
+         WHERE NOT a.extends AND c.station_id = a.station_id AND c.start_time = a.open_start
+    ),
+    opened AS (
+        INSERT INTO charging_sessions (station_id, start_time, end_time, duration_seconds, energy_kwh, closed)
+        SELECT a.station_id, a.ts, a.ts, 0, (0 * p.rated_power_kw)::double precision, false
+          FROM appended a
+          LEFT JOIN charging_stations p ON p.station_id = a.station_id
+         WHERE a.status = 'OCCUPIED' AND NOT a.extends
+    )
+    SELECT coalesce(array_agg(a.station_id), '{}') INTO appended_ids FROM appended a;
+
+    SELECT array_agg(b.station_id),
+           array_agg(coalesce(
+               (SELECT min(c.start_time) FROM charging_sessions c
+                 WHERE c.station_id = b.station_id
+                   AND c.start_time <= b.first_ts
+                   AND c.end_time >= b.first_ts - interval '1 hour'),
+               b.first_ts)),
+           array_agg(greatest(
+               (SELECT max(c.end_time) FROM charging_sessions c
+                 WHERE c.station_id = b.station_id
+                   AND c.start_time <= b.last_ts + interval '1 hour'
+                   AND c.end_time >= b.last_ts),
+               b.last_ts)),
+           array_agg(b.last_ts)
+      INTO ids, los, his, latest
+      FROM (
+          SELECT n.station_id::text AS station_id, min(n.timestamp) AS first_ts, max(n.timestamp) AS last_ts
+            FROM new_rows n
+           WHERE n.station_id::text <> ALL(appended_ids)
+           GROUP BY n.station_id
+      ) b;
+    IF ids IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    -- 新记录之前的会话不会再延长
+    UPDATE charging_sessions c SET closed = true
+      FROM unnest(ids, latest) AS r(station_id, last_ts)
+     WHERE c.station_id = r.station_id AND NOT c.closed AND c.end_time < r.last_ts;
+
+    DELETE FROM charging_sessions c
+     USING unnest(ids, los, his) AS r(station_id, lo, hi)
+     WHERE c.station_id = r.station_id AND c.start_time >= r.lo AND c.start_time <= r.hi;
+
+    INSERT INTO charging_sessions (station_id, start_time, end_time, duration_seconds, energy_kwh, closed)
+    SELECT s.*
+      FROM unnest(ids, los, his) AS r(station_id, lo, hi)
+     CROSS JOIN LATERAL charging_sessions_compute(r.lo, r.hi, ARRAY[r.station_id]) s;
+    RETURN NULL;
+END
+$$
+"""
+
+
+def upgrade():
+    op.execute(SESSIONS_TRIGGER_FUNCTION)
+
+
+def downgrade():
+    # 两种处理方式得到的会话相同，降级时保留新的函数即可
+    pass
@@ -0,0 +1,309 @@
+"""station_status_hourly: keep only poll counts
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18
+
+会话数和用电量改由 charging_sessions 计算后，小时汇总中的 occupied_transitions 和 occupied_seconds 不再有接口读取；
+删除这两列，汇总函数只统计轮询次数，触发器也不再重新计算前一个小时。
+降级时重新加上这两列（默认 0）并恢复原来的函数；已有小时的这两列需要用 backfill_hourly_rollup.py 重新计算。
+"""
+from alembic import op
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+# 以下 SQL 固定为编写这一版本时 models 中的内容，之后 models 的改动写在新的版本里
+
+# 从原始数据计算 [lo, hi) 内每个充电桩每小时的汇总，ids 为 NULL 时计算全部充电桩
+HOURLY_COMPUTE_FUNCTION = """
+CREATE OR REPLACE FUNCTION station_status_hourly_compute(lo timestamp, hi timestamp, ids text[])
+RETURNS TABLE (
+    station_id varchar,
+    hour_start timestamp,
+    total_polls integer,
+    occupied_polls integer
+)
+LANGUAGE sql STABLE AS $$
+SELECT s.station_id::varchar,
+       date_trunc('hour', s.timestamp),
+       count(*)::integer,
+       (count(*) FILTER (WHERE s.status = 'OCCUPIED'))::integer
+FROM station_status s
+WHERE (ids IS NULL OR s.station_id = ANY(ids))
+  AND s.timestamp >= lo
+  AND s.timestamp < hi
+GROUP BY 1, 2
+$$
+"""
+
+# 与 station_status_hourly_compute 口径相同，但按任意步长 step 分桶（桶从 lo 开始对齐），
+# 用于比小时更细的 resolution
+BUCKET_COMPUTE_FUNCTION = """
+CREATE OR REPLACE FUNCTION station_status_bucket_compute(lo timestamp, hi timestamp, ids text[], step interval)
+RETURNS TABLE (
+    station_id varchar,
+    bucket_start timestamp,
+    total_polls integer,
+    occupied_polls integer
+)
+LANGUAGE sql STABLE AS $$
+SELECT s.station_id::varchar,
+       date_bin(step, s.timestamp, lo),
+       count(*)::integer,
+       (count(*) FILTER (WHERE s.status = 'OCCUPIED'))::integer
+FROM station_status s
+WHERE (ids IS NULL OR s.station_id = ANY(ids))
+  AND s.timestamp >= lo
+  AND s.timestamp < hi
+GROUP BY 1, 2
+$$
+"""
+
+# 将 [lo, hi) 的汇总结果写回 station_status_hourly（幂等，可重复执行）
+HOURLY_UPSERT_FUNCTION = """
+CREATE OR REPLACE FUNCTION station_status_hourly_upsert(lo timestamp, hi timestamp, ids text[])
+RETURNS void
+LANGUAGE sql AS $$
+INSERT INTO station_status_hourly AS h
+    (station_id, hour_start, total_polls, occupied_polls)
+SELECT * FROM station_status_hourly_compute(lo, hi, ids)
+ON CONFLICT (station_id, hour_start) DO UPDATE SET
+    total_polls = EXCLUDED.total_polls,
+    occupied_polls = EXCLUDED.occupied_polls
+$$
+"""
+
+# 每次写入 station_status 后，重新计算本批数据涉及的小时
+HOURLY_TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION station_status_hourly_refresh()
+RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    lo timestamp;
+    hi timestamp;
+    ids text[];
+BEGIN
+    SELECT date_trunc('hour', min(n.timestamp)),
+           date_trunc('hour', max(n.timestamp)) + interval '1 hour',
+           array_agg(DISTINCT n.station_id)::text[]
+      INTO lo, hi, ids
+      FROM new_rows n;
+    IF ids IS NOT NULL THEN
+        PERFORM station_status_hourly_upsert(lo, hi, ids);
+    END IF;
+    RETURN NULL;
+END
+$$
+"""
+
+# 降级时恢复的 0001 / 0005 中的函数
+
+# 从原始数据计算 [lo, hi) 内每个充电桩每小时的汇总，ids 为 NULL 时计算全部充电桩
+PREVIOUS_HOURLY_COMPUTE_FUNCTION = """
+CREATE OR REPLACE FUNCTION station_status_hourly_compute(lo timestamp, hi timestamp, ids text[])
+RETURNS TABLE (
+    station_id varchar,
+    hour_start timestamp,
+    total_polls integer,
+    occupied_polls integer,
+    occupied_transitions integer,
+    occupied_seconds double precision
+)
+LANGUAGE sql STABLE AS $$
+WITH polls AS (
+    -- 每个充电桩在 lo 之后的第一条记录，取 lo 之前最近的一条状态作为 prev_status
+    SELECT s.station_id, s.timestamp, s.status,
+           coalesce(
+               lag(s.status) OVER (PARTITION BY s.station_id ORDER BY s.timestamp),
+               (SELECT p.status FROM station_status p
+                 WHERE p.station_id = s.station_id AND p.timestamp < lo
+                 ORDER BY p.timestamp DESC LIMIT 1)
+           ) AS prev_status
+    FROM station_status s
+    WHERE (ids IS NULL OR s.station_id = ANY(ids))
+      AND s.timestamp >= lo
+      AND s.timestamp < hi
+),
+counts AS (
+    SELECT p.station_id,
+           date_trunc('hour', p.timestamp) AS hour_start,
+           count(*) AS total_polls,
+           count(*) FILTER (WHERE p.status = 'OCCUPIED') AS occupied_polls,
+           count(*) FILTER (WHERE p.status = 'OCCUPIED' AND p.prev_status <> 'OCCUPIED') AS occupied_transitions
+    FROM polls p
+    GROUP BY 1, 2
+),
+occupied AS (
+    SELECT s.station_id, s.timestamp AS ts,
+           lead(s.timestamp) OVER (PARTITION BY s.station_id ORDER BY s.timestamp) AS next_ts
+    FROM station_status s
+    WHERE (ids IS NULL OR s.station_id = ANY(ids))
+      AND s.status = 'OCCUPIED'
+      AND s.timestamp >= lo - interval '1 hour'
+      AND s.timestamp < hi + interval '1 hour'
+),
+spans AS (
+    SELECT o.station_id,
+           h.hour_start,
+           sum(extract(epoch FROM least(o.next_ts, h.hour_start + interval '1 hour')
+                                  - greatest(o.ts, h.hour_start))) AS occupied_seconds
+    FROM occupied o
+    CROSS JOIN LATERAL generate_series(
+        date_trunc('hour', o.ts), date_trunc('hour', o.next_ts), interval '1 hour'
+    ) AS h(hour_start)
+    WHERE o.next_ts - o.ts <= interval '1 hour'
+      AND h.hour_start >= lo
+      AND h.hour_start < hi
+    GROUP BY 1, 2
+)
+SELECT coalesce(c.station_id, sp.station_id)::varchar,
+       coalesce(c.hour_start, sp.hour_start),
+       coalesce(c.total_polls, 0)::integer,
+       coalesce(c.occupied_polls, 0)::integer,
+       coalesce(c.occupied_transitions, 0)::integer,
+       coalesce(sp.occupied_seconds, 0)::double precision
+FROM counts c
+FULL JOIN spans sp ON sp.station_id = c.station_id AND sp.hour_start = c.hour_start
+$$
+"""
+
+# 与 station_status_hourly_compute 口径相同，但按任意步长 step 分桶（桶从 lo 开始对齐），
+# 用于比小时更细的 resolution；占用时长截断到 hi
+PREVIOUS_BUCKET_COMPUTE_FUNCTION = """
+CREATE OR REPLACE FUNCTION station_status_bucket_compute(lo timestamp, hi timestamp, ids text[], step interval)
+RETURNS TABLE (
+    station_id varchar,
+    bucket_start timestamp,
+    total_polls integer,
+    occupied_polls integer,
+    occupied_transitions integer,
+    occupied_seconds double precision
+)
+LANGUAGE sql STABLE AS $$
+WITH polls AS (
+    SELECT s.station_id, s.timestamp, s.status,
+           coalesce(
+               lag(s.status) OVER (PARTITION BY s.station_id ORDER BY s.timestamp),
+               (SELECT p.status FROM station_status p
+                 WHERE p.station_id = s.station_id AND p.timestamp < lo
+                 ORDER BY p.timestamp DESC LIMIT 1)
+           ) AS prev_status
+    FROM station_status s
+    WHERE (ids IS NULL OR s.station_id = ANY(ids))
+      AND s.timestamp >= lo
+      AND s.timestamp < hi
+),
+counts AS (
+    SELECT p.station_id,
+           date_bin(step, p.timestamp, lo) AS bucket_start,
+           count(*) AS total_polls,
+           count(*) FILTER (WHERE p.status = 'OCCUPIED') AS occupied_polls,
+           count(*) FILTER (WHERE p.status = 'OCCUPIED' AND p.prev_status <> 'OCCUPIED') AS occupied_transitions
+    FROM polls p
+    GROUP BY 1, 2
+),
+occupied AS (
+    SELECT s.station_id, s.timestamp AS ts,
+           lead(s.timestamp) OVER (PARTITION BY s.station_id ORDER BY s.timestamp) AS next_ts
+    FROM station_status s
+    WHERE (ids IS NULL OR s.station_id = ANY(ids))
+      AND s.status = 'OCCUPIED'
+      AND s.timestamp >= lo - interval '1 hour'
+      AND s.timestamp < hi + interval '1 hour'
+),
+spans AS (
+    SELECT o.station_id,
+           b.bucket_start,
+           sum(extract(epoch FROM least(o.next_ts, b.bucket_start + step, hi)
+                                  - greatest(o.ts, b.bucket_start))) AS occupied_seconds
+    FROM occupied o
+    CROSS JOIN LATERAL generate_series(
+        date_bin(step, o.ts, lo), date_bin(step, o.next_ts, lo), step
+    ) AS b(bucket_start)
+    WHERE o.next_ts - o.ts <= interval '1 hour'
+      AND b.bucket_start >= lo
+      AND b.bucket_start < hi
+      AND o.next_ts > b.bucket_start
+      AND o.ts < hi
+    GROUP BY 1, 2
+)
+SELECT coalesce(c.station_id, sp.station_id)::varchar,
+       coalesce(c.bucket_start, sp.bucket_start),
+       coalesce(c.total_polls, 0)::integer,
+       coalesce(c.occupied_polls, 0)::integer,
+       coalesce(c.occupied_transitions, 0)::integer,
+       coalesce(sp.occupied_seconds, 0)::double precision
+FROM counts c
+FULL JOIN spans sp ON sp.station_id = c.station_id AND sp.bucket_start = c.bucket_start
+$$
+"""
+
+# 将 [lo, hi) 的汇总结果写回 station_status_hourly（幂等，可重复执行）
+PREVIOUS_HOURLY_UPSERT_FUNCTION = """
+CREATE OR REPLACE FUNCTION station_status_hourly_upsert(lo timestamp, hi timestamp, ids text[])
+RETURNS void
+LANGUAGE sql AS $$
+INSERT INTO station_status_hourly AS h
+    (station_id, hour_start, total_polls, occupied_polls, occupied_transitions, occupied_seconds)
+SELECT * FROM station_status_hourly_compute(lo, hi, ids)
+ON CONFLICT (station_id, hour_start) DO UPDATE SET
+    total_polls = EXCLUDED.total_polls,
+    occupied_polls = EXCLUDED.occupied_polls,
+    occupied_transitions = EXCLUDED.occupied_transitions,
+    occupied_seconds = EXCLUDED.occupied_seconds
+$$
+"""
+
+# 每次写入 station_status 后，重新计算本批数据涉及的小时及其前一个小时（跨整点的占用区间）
+PREVIOUS_HOURLY_TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION station_status_hourly_refresh()
+RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    lo timestamp;
+    hi timestamp;
+    ids text[];
+BEGIN
+    SELECT date_trunc('hour', min(n.timestamp)) - interval '1 hour',
+           date_trunc('hour', max(n.timestamp)) + interval '1 hour',
+           array_agg(DISTINCT n.station_id)::text[]
+      INTO lo, hi, ids
+      FROM new_rows n;
+    IF ids IS NOT NULL THEN
+        PERFORM station_status_hourly_upsert(lo, hi, ids);
+    END IF;
+    RETURN NULL;
+END
+$$
+"""
+
+# 返回的列变化时 CREATE OR REPLACE 不能替换已有函数，先删除再创建
+COMPUTE_FUNCTION_DROP = (
+    "DROP FUNCTION IF EXISTS station_status_hourly_compute(timestamp, timestamp, text[])",
+    "DROP FUNCTION IF EXISTS station_status_bucket_compute(timestamp, timestamp, text[], interval)",
+)
+
+
+def upgrade():
+    for statement in COMPUTE_FUNCTION_DROP + (HOURLY_COMPUTE_FUNCTION, BUCKET_COMPUTE_FUNCTION,
+                                              HOURLY_UPSERT_FUNCTION, HOURLY_TRIGGER_FUNCTION):
+        op.execute(statement)
+    op.execute("""
+        ALTER TABLE station_status_hourly
+            DROP COLUMN IF EXISTS occupied_transitions,
+            DROP COLUMN IF EXISTS occupied_seconds
+    """)
+
+
+def downgrade():
+    op.execute("""
+        ALTER TABLE station_status_hourly
+            ADD COLUMN IF NOT EXISTS occupied_transitions integer NOT NULL DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS occupied_seconds double precision NOT NULL DEFAULT 0
+    """)
+    for statement in COMPUTE_FUNCTION_DROP + (PREVIOUS_HOURLY_COMPUTE_FUNCTION, PREVIOUS_BUCKET_COMPUTE_FUNCTION,
+                                              PREVIOUS_HOURLY_UPSERT_FUNCTION, PREVIOUS_HOURLY_TRIGGER_FUNCTION):
+        op.execute(statement)
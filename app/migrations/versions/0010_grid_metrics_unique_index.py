@@ -0,0 +1,35 @@
+"""unique index on grid_metrics (timestamp, metric_type)
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18
+
+ingest_daemon.py 和 fetch_grid_data.py 按 (timestamp, metric_type) 做 ON CONFLICT 写入，依赖这个唯一索引。
+0001 建表使用 checkfirst，不会给已有的 grid_metrics 补索引；这里补上，
+建索引前先删除重复的 (timestamp, metric_type)，保留最后写入的一条（与 upsert 覆盖旧值一致）。
+"""
+from alembic import op
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        DELETE FROM grid_metrics g
+         USING grid_metrics newer
+         WHERE newer.timestamp = g.timestamp
+           AND newer.metric_type = g.metric_type
+           AND newer.id > g.id
+    """)
+    op.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_grid_metrics_timestamp_metric_type "
+        "ON grid_metrics (timestamp, metric_type)"
+    )
+
+
+def downgrade():
+    # 与 0001 新建的表上的索引同名，降级时保留
+    pass
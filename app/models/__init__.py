@@ -1,7 +1,11 @@
 from .charging_stations import ChargingStation
 from .station_status import StationStatus
+from .station_status_hourly import StationStatusHourly
+from .station_current_status import StationCurrentStatus
+from .charging_sessions import ChargingSession
 from .city import City
 from .grid_metrics import GridMetric
+from .ingest_watermark import IngestWatermark
 
-__all__ = ["City","ChargingStation","StationStatus"]
+__all__ = ["City","ChargingStation","StationStatus","StationStatusHourly","StationCurrentStatus","ChargingSession","IngestWatermark"]
 
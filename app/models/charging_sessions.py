@@ -0,0 +1,198 @@
+# app/models/charging_sessions.py
+
+from sqlalchemy import Column, String, Float, Boolean, TIMESTAMP, Index, func, literal_column
+from database import Base
+
+
+class ChargingSession(Base):
+    """由 station_status 重建的充电会话，station_status 上的触发器在写入时延长或关闭会话
+
+    同一充电桩连续的 OCCUPIED 记录为一个会话，遇到非 OCCUPIED 记录或相邻两条 OCCUPIED 记录间隔超过 1 小时时结束；
+    start_time / end_time 为会话第一条和最后一条 OCCUPIED 记录的时间
+    """
+    __tablename__ = "charging_sessions"
+
+    station_id = Column(String, primary_key=True)
+    start_time = Column(TIMESTAMP, primary_key=True)
+    end_time = Column(TIMESTAMP, nullable=False)
+    duration_seconds = Column(Float, nullable=False)
+    # 按写入时的额定功率估算，额定功率为空时为 NULL
+    energy_kwh = Column(Float, nullable=True)
+    # 之后已有该充电桩的记录，会话不会再延长
+    closed = Column(Boolean, nullable=False, default=False)
+
+    __table_args__ = (
+        # 区间重叠查询（&&）使用；查询条件中的表达式必须与这里完全一致
+        Index("ix_charging_sessions_period",
+              func.tsrange(start_time, end_time, literal_column("'[]'")), postgresql_using="gist"),
+    )
+
+
+# 从 [lo, hi] 内的记录计算会话，ids 为 NULL 时计算全部充电桩；
+# 调用方保证 lo 之前和 hi 之后的第一条记录都是会话的断点
+SESSIONS_COMPUTE_FUNCTION = """
+CREATE OR REPLACE FUNCTION charging_sessions_compute(lo timestamp, hi timestamp, ids text[])
+RETURNS TABLE (
+    station_id varchar,
+    start_time timestamp,
+    end_time timestamp,
+    duration_seconds double precision,
+    energy_kwh double precision,
+    closed boolean
+)
+LANGUAGE sql STABLE AS $$
+WITH polls AS (
+    SELECT s.station_id, s.timestamp, s.status,
+           lag(s.status) OVER w AS prev_status,
+           lag(s.timestamp) OVER w AS prev_timestamp
+    FROM station_status s
+    WHERE (ids IS NULL OR s.station_id = ANY(ids))
+      AND s.timestamp >= lo
+      AND s.timestamp <= hi
+    WINDOW w AS (PARTITION BY s.station_id ORDER BY s.timestamp)
+),
+occupied AS (
+    -- 前一条记录不是 OCCUPIED 或间隔超过 1 小时时开始新会话，累计计数即会话编号
+    SELECT p.station_id, p.timestamp,
+           count(*) FILTER (
+               WHERE p.prev_status IS DISTINCT FROM 'OCCUPIED'
+                  OR p.timestamp - p.prev_timestamp > interval '1 hour'
+           ) OVER (PARTITION BY p.station_id ORDER BY p.timestamp) AS session_no
+    FROM polls p
+    WHERE p.status = 'OCCUPIED'
+),
+sessions AS (
+    SELECT o.station_id, min(o.timestamp) AS start_time, max(o.timestamp) AS end_time
+    FROM occupied o
+    GROUP BY o.station_id, o.session_no
+)
+SELECT se.station_id::varchar,
+       se.start_time,
+       se.end_time,
+       extract(epoch FROM se.end_time - se.start_time)::double precision,
+       (extract(epoch FROM se.end_time - se.start_time) * c.rated_power_kw / 3600.0)::double precision,
+       EXISTS (SELECT 1 FROM station_status n WHERE n.station_id = se.station_id AND n.timestamp > se.end_time)
+FROM sessions se
+LEFT JOIN charging_stations c ON c.station_id = se.station_id
+$$
+"""
+
+# 每次写入 station_status 后更新受影响的会话：
+# 1. 正常轮询（该充电桩本次只有一条新记录，且晚于已有的所有记录）原地处理：OCCUPIED 且距未关闭会话的
+#    结束时间不超过 1 小时时延长该会话，否则关闭它，新记录为 OCCUPIED 时开始新会话；
+#    未关闭的会话（closed = false）的 end_time 就是该充电桩最新的一条记录，因此不需要再读轮询记录
+# 2. 其余情况（补写历史、乱序、一次多条）按充电桩确定可能受影响的会话范围，删除后重新计算：
+#    起点为包含（或 1 小时内紧接）最早新记录的会话的开始时间，终点为包含（或 1 小时内紧接）最晚新记录的会话的结束时间
+SESSIONS_TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION charging_sessions_refresh()
+RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    appended_ids text[];
+    ids text[];
+    los timestamp[];
+    his timestamp[];
+    latest timestamp[];
+BEGIN
+    WITH appended AS (
+        SELECT b.station_id, b.ts, b.status, o.start_time AS open_start,
+               coalesce(b.status = 'OCCUPIED' AND o.end_time >= b.ts - interval '1 hour', false) AS extends
+          FROM (
+              SELECT n.station_id::text AS station_id, max(n.timestamp) AS ts, max(n.status) AS status
+                FROM new_rows n
+               GROUP BY n.station_id
+              HAVING count(*) = 1
+          ) b
+          LEFT JOIN charging_sessions o ON o.station_id = b.station_id AND NOT o.closed
+         WHERE NOT EXISTS (SELECT 1 FROM station_status s WHERE s.station_id = b.station_id AND s.timestamp > b.ts)
+    ),
+    extended AS (
+        UPDATE charging_sessions c
+           SET end_time = a.ts,
+               duration_seconds = extract(epoch FROM a.ts - c.start_time)::double precision,
+               energy_kwh = (extract(epoch FROM a.ts - c.start_time) * p.rated_power_kw / 3600.0)::double precision
+          FROM appended a
+          LEFT JOIN charging_stations p ON p.station_id = a.station_id
+         WHERE a.extends AND c.station_id = a.station_id AND c.start_time = a.open_start
+    ),
+    finished AS (
+        UPDATE charging_sessions c SET closed = true
+          FROM appended a
+         WHERE NOT a.extends AND c.station_id = a.station_id AND c.start_time = a.open_start
+    ),
+    opened AS (
+        INSERT INTO charging_sessions (station_id, start_time, end_time, duration_seconds, energy_kwh, closed)
+        SELECT a.station_id, a.ts, a.ts, 0, (0 * p.rated_power_kw)::double precision, false
+          FROM appended a
+          LEFT JOIN charging_stations p ON p.station_id = a.station_id
+         WHERE a.status = 'OCCUPIED' AND NOT a.extends
+    )
+    SELECT coalesce(array_agg(a.station_id), '{}') INTO appended_ids FROM appended a;
+
+    SELECT array_agg(b.station_id),
+           array_agg(coalesce(
+               (SELECT min(c.start_time) FROM charging_sessions c
+                 WHERE c.station_id = b.station_id
+                   AND c.start_time <= b.first_ts
+                   AND c.end_time >= b.first_ts - interval '1 hour'),
+               b.first_ts)),
+           array_agg(greatest(
+               (SELECT max(c.end_time) FROM charging_sessions c
+                 WHERE c.station_id = b.station_id
+                   AND c.start_time <= b.last_ts + interval '1 hour'
+                   AND c.end_time >= b.last_ts),
+               b.last_ts)),
+           array_agg(b.last_ts)
+      INTO ids, los, his, latest
+      FROM (
+          SELECT n.station_id::text AS station_id, min(n.timestamp) AS first_ts, max(n.timestamp) AS last_ts
+            FROM new_rows n
+           WHERE n.station_id::text <> ALL(appended_ids)
+           GROUP BY n.station_id
+      ) b;
+    IF ids IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    -- 新记录之前的会话不会再延长
+    UPDATE charging_sessions c SET closed = true
+      FROM unnest(ids, latest) AS r(station_id, last_ts)
+     WHERE c.station_id = r.station_id AND NOT c.closed AND c.end_time < r.last_ts;
+
+    DELETE FROM charging_sessions c
+     USING unnest(ids, los, his) AS r(station_id, lo, hi)
+     WHERE c.station_id = r.station_id AND c.start_time >= r.lo AND c.start_time <= r.hi;
+
+    INSERT INTO charging_sessions (station_id, start_time, end_time, duration_seconds, energy_kwh, closed)
+    SELECT s.*
+      FROM unnest(ids, los, his) AS r(station_id, lo, hi)
+     CROSS JOIN LATERAL charging_sessions_compute(r.lo, r.hi, ARRAY[r.station_id]) s;
+    RETURN NULL;
+END
+$$
+"""
+
+SESSIONS_TRIGGER_DROP = "DROP TRIGGER IF EXISTS charging_sessions_refresh ON station_status"
+
+SESSIONS_TRIGGER = """
+CREATE TRIGGER charging_sessions_refresh
+AFTER INSERT ON station_status
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION charging_sessions_refresh()
+"""
+
+# 表为空时（新建表）用已有历史数据初始化一次
+SESSIONS_BACKFILL = """
+INSERT INTO charging_sessions (station_id, start_time, end_time, duration_seconds, energy_kwh, closed)
+SELECT * FROM charging_sessions_compute('-infinity', 'infinity', NULL)
+ WHERE NOT EXISTS (SELECT 1 FROM charging_sessions)
+"""
+
+# 按顺序执行（均可重复执行）；迁移脚本中各自保存编写该版本时的副本
+SESSIONS_DDL = (
+    SESSIONS_COMPUTE_FUNCTION,
+    SESSIONS_BACKFILL,
+    SESSIONS_TRIGGER_FUNCTION,
+    SESSIONS_TRIGGER_DROP,
+    SESSIONS_TRIGGER,
+)
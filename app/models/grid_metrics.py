@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime
+from sqlalchemy import Column, Integer, String, Float, DateTime, Index
 from database import Base
 
 class GridMetric(Base):
@@ -8,3 +8,8 @@ class GridMetric(Base):
     timestamp = Column(DateTime, index=True, nullable=False)
     metric_type = Column(String, index=True, nullable=False)  # "generation" or "load"
     value_mw = Column(Float, nullable=False)
+
+    __table_args__ = (
+        # 同一时刻同一指标只保留一条，写入时 ON CONFLICT DO UPDATE
+        Index("ix_grid_metrics_timestamp_metric_type", "timestamp", "metric_type", unique=True),
+    )
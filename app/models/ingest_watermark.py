@@ -0,0 +1,49 @@
+# app/models/ingest_watermark.py
+
+from sqlalchemy import Column, String, BigInteger, TIMESTAMP
+from database import Base
+
+
+class IngestWatermark(Base):
+    """每张采集表的写入水位：每条写入语句执行后 version + 1，用于生成 ETag"""
+    __tablename__ = "ingest_watermarks"
+
+    source = Column(String, primary_key=True)  # 表名：station_status / grid_metrics
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(TIMESTAMP, nullable=False)
+
+
+# 语句级触发器，一次批量写入只更新一次水位
+WATERMARK_TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION ingest_watermark_bump()
+RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO ingest_watermarks AS w (source, version, updated_at)
+    VALUES (TG_TABLE_NAME, 1, now() AT TIME ZONE 'UTC')
+    ON CONFLICT (source) DO UPDATE SET
+        version = w.version + 1,
+        updated_at = EXCLUDED.updated_at;
+    RETURN NULL;
+END
+$$
+"""
+
+WATERMARK_SOURCES = ("station_status", "grid_metrics")
+
+
+def watermark_trigger_ddl(table: str):
+    return (
+        f"DROP TRIGGER IF EXISTS ingest_watermark_bump ON {table}",
+        f"""
+        CREATE TRIGGER ingest_watermark_bump
+        AFTER INSERT OR UPDATE OR DELETE ON {table}
+        FOR EACH STATEMENT EXECUTE FUNCTION ingest_watermark_bump()
+        """,
+    )
+
+
+# 按顺序执行（均可重复执行）；迁移脚本中各自保存编写该版本时的副本
+WATERMARK_DDL = (WATERMARK_TRIGGER_FUNCTION,) + tuple(
+    statement for table in WATERMARK_SOURCES for statement in watermark_trigger_ddl(table)
+)
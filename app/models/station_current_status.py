@@ -0,0 +1,115 @@
+# app/models/station_current_status.py
+
+from sqlalchemy import Column, String, TIMESTAMP, ForeignKey
+from database import Base
+
+
+class StationCurrentStatus(Base):
+    """每个充电桩最新的一条状态，由 station_status 上的触发器在写入时更新"""
+    __tablename__ = "station_current_status"
+
+    station_id = Column(String, ForeignKey("charging_stations.station_id"), primary_key=True)
+    timestamp = Column(TIMESTAMP, nullable=False)
+    status = Column(String, nullable=True)
+    last_updated = Column(TIMESTAMP, nullable=True)
+
+
+# 只在新数据比已有记录更新时覆盖，补写历史数据不会回退当前状态
+CURRENT_STATUS_TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION station_current_status_refresh()
+RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO station_current_status AS c (station_id, timestamp, status, last_updated)
+    SELECT DISTINCT ON (n.station_id) n.station_id, n.timestamp, n.status, n.last_updated
+      FROM new_rows n
+     ORDER BY n.station_id, n.timestamp DESC
+    ON CONFLICT (station_id) DO UPDATE SET
+        timestamp = EXCLUDED.timestamp,
+        status = EXCLUDED.status,
+        last_updated = EXCLUDED.last_updated
+    WHERE c.timestamp <= EXCLUDED.timestamp;
+    RETURN NULL;
+END
+$$
+"""
+
+CURRENT_STATUS_TRIGGER_DROP = "DROP TRIGGER IF EXISTS station_current_status_refresh ON station_status"
+
+CURRENT_STATUS_TRIGGER = """
+CREATE TRIGGER station_current_status_refresh
+AFTER INSERT ON station_status
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION station_current_status_refresh()
+"""
+
+# 表为空时（新建表）用已有历史数据初始化一次
+CURRENT_STATUS_BACKFILL = """
+INSERT INTO station_current_status (station_id, timestamp, status, last_updated)
+SELECT DISTINCT ON (s.station_id) s.station_id, s.timestamp, s.status, s.last_updated
+  FROM station_status s
+ WHERE NOT EXISTS (SELECT 1 FROM station_current_status)
+ ORDER BY s.station_id, s.timestamp DESC
+ON CONFLICT (station_id) DO NOTHING
+"""
+
+# 按顺序执行（均可重复执行）；迁移脚本中各自保存编写该版本时的副本
+CURRENT_STATUS_DDL = (
+    CURRENT_STATUS_BACKFILL,
+    CURRENT_STATUS_TRIGGER_FUNCTION,
+    CURRENT_STATUS_TRIGGER_DROP,
+    CURRENT_STATUS_TRIGGER,
+)
+
+# station_current_status 中状态发生变化时，每个充电桩发一条 NOTIFY（payload 为 JSON），
+# 应用用一个 LISTEN 连接接收后推送给订阅了对应城市的客户端
+STATUS_NOTIFY_CHANNEL = "station_status_changed"
+
+STATUS_NOTIFY_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION station_status_notify()
+RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM pg_notify('{STATUS_NOTIFY_CHANNEL}', json_build_object(
+                    'station_id', n.station_id, 'city_id', s.city_id,
+                    'status', n.status, 'timestamp', n.timestamp)::text)
+           FROM new_rows n
+           LEFT JOIN charging_stations s ON s.station_id = n.station_id;
+    ELSE
+        PERFORM pg_notify('{STATUS_NOTIFY_CHANNEL}', json_build_object(
+                    'station_id', n.station_id, 'city_id', s.city_id,
+                    'status', n.status, 'timestamp', n.timestamp)::text)
+           FROM new_rows n
+           JOIN old_rows o ON o.station_id = n.station_id
+           LEFT JOIN charging_stations s ON s.station_id = n.station_id
+          WHERE n.status IS DISTINCT FROM o.status;
+    END IF;
+    RETURN NULL;
+END
+$$
+"""
+
+STATUS_NOTIFY_TRIGGER_DROP = (
+    "DROP TRIGGER IF EXISTS station_status_notify_insert ON station_current_status",
+    "DROP TRIGGER IF EXISTS station_status_notify_update ON station_current_status",
+)
+
+# 带 transition table 的触发器只能对应一种事件，INSERT 和 UPDATE 各建一个
+STATUS_NOTIFY_TRIGGERS = (
+    """
+    CREATE TRIGGER station_status_notify_insert
+    AFTER INSERT ON station_current_status
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION station_status_notify()
+    """,
+    """
+    CREATE TRIGGER station_status_notify_update
+    AFTER UPDATE ON station_current_status
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION station_status_notify()
+    """,
+)
+
+# 按顺序执行（均可重复执行）；迁移脚本中各自保存编写该版本时的副本
+STATUS_NOTIFY_DDL = (STATUS_NOTIFY_FUNCTION, *STATUS_NOTIFY_TRIGGER_DROP, *STATUS_NOTIFY_TRIGGERS)
@@ -1,13 +1,59 @@
 # app/models/station_status.py
 
-from sqlalchemy import Column, Integer, String, TIMESTAMP, ForeignKey
+from sqlalchemy import Column, Integer, String, TIMESTAMP, ForeignKey, Index
 from database import Base
 
 class StationStatus(Base):
+    """按 timestamp 按月分区的轮询记录表，分区由 station_status_ensure_partitions 创建"""
     __tablename__ = "station_status"
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     station_id = Column(String, ForeignKey("charging_stations.station_id"), nullable=False)
-    timestamp = Column(TIMESTAMP, nullable=False)
+    # 分区表的主键必须包含分区键
+    timestamp = Column(TIMESTAMP, primary_key=True, nullable=False)
     status = Column(String, nullable=True)
     last_updated = Column(TIMESTAMP, nullable=True)
+
+    __table_args__ = (
+        # 同一充电桩同一时刻只保留一条记录，写入时 ON CONFLICT DO NOTHING
+        Index("ix_station_status_station_id_timestamp", "station_id", "timestamp", unique=True),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
+
+
+# 提前创建的分区月数；应用启动和每次采集时都会检查一遍
+PARTITION_MONTHS_AHEAD = 3
+
+# 为 [lo, hi) 覆盖到的每个月创建 station_status_YYYY_MM 分区（已存在则跳过），返回新建的分区数
+PARTITION_FUNCTION = """
+CREATE OR REPLACE FUNCTION station_status_ensure_partitions(lo timestamp, hi timestamp)
+RETURNS integer
+LANGUAGE plpgsql AS $$
+DECLARE
+    month_start timestamp := date_trunc('month', lo);
+    partition_name text;
+    created integer := 0;
+BEGIN
+    WHILE month_start < hi LOOP
+        partition_name := 'station_status_' || to_char(month_start, 'YYYY_MM');
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE 'CREATE TABLE ' || quote_ident(partition_name)
+                 || ' PARTITION OF station_status FOR VALUES FROM ('
+                 || quote_literal(month_start) || ') TO ('
+                 || quote_literal(month_start + interval '1 month') || ')';
+            created := created + 1;
+        END IF;
+        month_start := month_start + interval '1 month';
+    END LOOP;
+    RETURN created;
+END
+$$
+"""
+
+# 当前月及之后 PARTITION_MONTHS_AHEAD 个月
+ENSURE_FUTURE_PARTITIONS = f"""
+SELECT station_status_ensure_partitions(
+    date_trunc('month', now() AT TIME ZONE 'UTC'),
+    date_trunc('month', now() AT TIME ZONE 'UTC') + interval '{PARTITION_MONTHS_AHEAD + 1} months'
+)
+"""
@@ -0,0 +1,115 @@
+# app/models/station_status_hourly.py
+
+from sqlalchemy import Column, Integer, String, TIMESTAMP
+from database import Base
+
+
+class StationStatusHourly(Base):
+    """station_status 按 (充电桩, 整点小时) 的汇总表，由 station_status 上的触发器增量维护"""
+    __tablename__ = "station_status_hourly"
+
+    station_id = Column(String, primary_key=True)
+    hour_start = Column(TIMESTAMP, primary_key=True, index=True)
+    total_polls = Column(Integer, nullable=False, default=0)
+    occupied_polls = Column(Integer, nullable=False, default=0)
+
+
+# 从原始数据计算 [lo, hi) 内每个充电桩每小时的汇总，ids 为 NULL 时计算全部充电桩
+HOURLY_COMPUTE_FUNCTION = """
+CREATE OR REPLACE FUNCTION station_status_hourly_compute(lo timestamp, hi timestamp, ids text[])
+RETURNS TABLE (
+    station_id varchar,
+    hour_start timestamp,
+    total_polls integer,
+    occupied_polls integer
+)
+LANGUAGE sql STABLE AS $$
+SELECT s.station_id::varchar,
+       date_trunc('hour', s.timestamp),
+       count(*)::integer,
+       (count(*) FILTER (WHERE s.status = 'OCCUPIED'))::integer
+FROM station_status s
+WHERE (ids IS NULL OR s.station_id = ANY(ids))
+  AND s.timestamp >= lo
+  AND s.timestamp < hi
+GROUP BY 1, 2
+$$
+"""
+
+# 与 station_status_hourly_compute 口径相同，但按任意步长 step 分桶（桶从 lo 开始对齐），
+# 用于比小时更细的 resolution
+BUCKET_COMPUTE_FUNCTION = """
+CREATE OR REPLACE FUNCTION station_status_bucket_compute(lo timestamp, hi timestamp, ids text[], step interval)
+RETURNS TABLE (
+    station_id varchar,
+    bucket_start timestamp,
+    total_polls integer,
+    occupied_polls integer
+)
+LANGUAGE sql STABLE AS $$
+SELECT s.station_id::varchar,
+       date_bin(step, s.timestamp, lo),
+       count(*)::integer,
+       (count(*) FILTER (WHERE s.status = 'OCCUPIED'))::integer
+FROM station_status s
+WHERE (ids IS NULL OR s.station_id = ANY(ids))
+  AND s.timestamp >= lo
+  AND s.timestamp < hi
+GROUP BY 1, 2
+$$
+"""
+
+# 将 [lo, hi) 的汇总结果写回 station_status_hourly（幂等，可重复执行）
+HOURLY_UPSERT_FUNCTION = """
+CREATE OR REPLACE FUNCTION station_status_hourly_upsert(lo timestamp, hi timestamp, ids text[])
+RETURNS void
+LANGUAGE sql AS $$
+INSERT INTO station_status_hourly AS h
+    (station_id, hour_start, total_polls, occupied_polls)
+SELECT * FROM station_status_hourly_compute(lo, hi, ids)
+ON CONFLICT (station_id, hour_start) DO UPDATE SET
+    total_polls = EXCLUDED.total_polls,
+    occupied_polls = EXCLUDED.occupied_polls
+$$
+"""
+
+# 每次写入 station_status 后，重新计算本批数据涉及的小时
+HOURLY_TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION station_status_hourly_refresh()
+RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    lo timestamp;
+    hi timestamp;
+    ids text[];
+BEGIN
+    SELECT date_trunc('hour', min(n.timestamp)),
+           date_trunc('hour', max(n.timestamp)) + interval '1 hour',
+           array_agg(DISTINCT n.station_id)::text[]
+      INTO lo, hi, ids
+      FROM new_rows n;
+    IF ids IS NOT NULL THEN
+        PERFORM station_status_hourly_upsert(lo, hi, ids);
+    END IF;
+    RETURN NULL;
+END
+$$
+"""
+
+HOURLY_TRIGGER_DROP = "DROP TRIGGER IF EXISTS station_status_hourly_refresh ON station_status"
+
+HOURLY_TRIGGER = """
+CREATE TRIGGER station_status_hourly_refresh
+AFTER INSERT ON station_status
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION station_status_hourly_refresh()
+"""
+
+# 按顺序执行（均可重复执行）；迁移脚本中各自保存编写该版本时的副本
+HOURLY_DDL = (
+    HOURLY_COMPUTE_FUNCTION,
+    HOURLY_UPSERT_FUNCTION,
+    HOURLY_TRIGGER_FUNCTION,
+    HOURLY_TRIGGER_DROP,
+    HOURLY_TRIGGER,
+)
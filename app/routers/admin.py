@@ -0,0 +1,25 @@
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException
+
+from util.response import Response
+from server.metadata_cache import invalidate_metadata_cache
+from server.result_cache import result_cache
+
+router = APIRouter()
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+
+def check_admin_token(token: Optional[str]):
+    if not ADMIN_TOKEN or token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403)
+
+
+@router.post("/invalidate_cache")
+async def invalidate_cache_api(x_admin_token: Optional[str] = Header(None)):
+    check_admin_token(x_admin_token)
+    # 补写历史 station_status 后也需要调用，清掉按小时缓存的结果
+    result_cache.clear()
+    return Response.ok({"version": invalidate_metadata_cache()})
@@ -1,16 +1,19 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from database import get_db
 from util.response import Response
-from server.charging_stations import get_by_station_id, get_by_city_id
+from util.pagination import PAGE_LIMIT_DEFAULT, PAGE_LIMIT_MAX, page_result
+from util.streaming import stream_query, stream_json_list
+from server.charging_stations import get_by_station_id, get_by_city_id, city_stations_query
 
 router = APIRouter()
 
-@router.get("/get_by_station_id")
-def get_by_id_api(station_id, db: Session = Depends(get_db)):
-    charging_station = get_by_station_id(station_id,db)
-    result = {
+
+def charging_station_to_dict(charging_station) -> dict:
+    return {
         "station_id": charging_station.station_id,
         "name": charging_station.name,
         "description": charging_station.description,
@@ -19,20 +22,33 @@ def get_by_id_api(station_id, db: Session = Depends(get_db)):
         "connector_type": charging_station.connector_type,
         "rated_power_kw": charging_station.rated_power_kw
     }
+
+
+@router.get("/get_by_station_id")
+async def get_by_id_api(station_id, db: AsyncSession = Depends(get_db)):
+    charging_station = await get_by_station_id(station_id,db)
+    result = charging_station_to_dict(charging_station)
     return Response.ok(result)
 
 @router.get("/get_by_city_id")
-def get_by_id_api(city_id, db: Session = Depends(get_db)):
-    charging_stations = get_by_city_id(city_id,db)
-    result = []
-    for charging_station in charging_stations:
-        result.append({
-            "station_id": charging_station.station_id,
-            "name": charging_station.name,
-            "description": charging_station.description,
-            "location": [charging_station.lat, charging_station.lon] if charging_station.lon is not None else None,
-            "city_id": charging_station.city_id,
-            "connector_type": charging_station.connector_type,
-            "rated_power_kw": charging_station.rated_power_kw
-        })
-    return Response.ok(result)
\ No newline at end of file
+async def get_by_id_api(city_id, after: Optional[str] = None,
+                        limit: Optional[int] = Query(None, ge=1, le=PAGE_LIMIT_MAX),
+                        format: Literal["json", "ndjson", "csv"] = "json",
+                        db: AsyncSession = Depends(get_db)):
+    """城市的全部充电桩，按 station_id 排序
+
+    不带 after / limit 时 data 与原来一样是完整的列表（逐批写出）；
+    带 after 或 limit 时分页，data 为 {"items", "next_after"}，after 为上一页的 next_after，limit 默认 PAGE_LIMIT_DEFAULT；
+    format=ndjson / csv 时从 after 开始流式导出全部充电桩，忽略 limit
+    """
+    if format != "json":
+        return stream_query(city_stations_query(city_id, after), charging_station_to_dict, format,
+                            f"charging_stations_{city_id}")
+    if after is None and limit is None:
+        return stream_json_list(city_stations_query(city_id), charging_station_to_dict)
+
+    limit = limit or PAGE_LIMIT_DEFAULT
+    charging_stations = await get_by_city_id(city_id, db, after=after, limit=limit)
+    result = page_result([charging_station_to_dict(row) for row in charging_stations], limit,
+                         lambda item: item["station_id"])
+    return Response.ok(result)
@@ -1,16 +1,16 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from database import get_db
 from util.response import Response
-from server.city import get_all_cities
+from server.metadata_cache import metadata_cache
 
 router = APIRouter()
 
 
 @router.get("/all")
-def get_all_cities_api(db: Session = Depends(get_db)):
-    cities = get_all_cities(db)
+async def get_all_cities_api(db: AsyncSession = Depends(get_db)):
+    cities = await metadata_cache.get_cities(db)
     result = []
     for city in cities:
         result.append({
@@ -1,31 +1,96 @@
-from sqlalchemy.orm import Session
+from typing import Literal
+
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import APIRouter, Depends
 
 from database import get_db
-from server.graph import charging_sessions_counts, city_energy, station_utilisation
-from util.response import Response
+from server.graph import (
+    charging_sessions_counts, city_energy, station_utilisation, city_batch_metrics, resolve_city_ids
+)
+from middleware.conditional_get import conditional_get
+from util.response import Response, negotiate_series_format
 
 
 router = APIRouter()
 
-@router.get("/charging_sessions_counts")
+# 数据没有新写入时返回 304
+STATUS_CONDITIONAL = Depends(conditional_get("station_status"))
+GRID_CONDITIONAL = Depends(conditional_get("grid_metrics"))
+
+# 分桶粒度，见 server.graph.RESOLUTIONS
+Resolution = Literal["15min", "hour", "day", "week"]
+
+# Accept 协商的返回格式：json（默认）/ columnar / msgpack
+SERIES_FORMAT = Depends(negotiate_series_format)
+
+
+def graph_response(result, response_format: str):
+    if response_format == "json":
+        return Response.ok(result)
+    return Response.columnar(result, response_format)
+
 
-def charging_sessions_counts_api(city_id, start_time, end_time, db: Session = Depends(get_db)):
-    result = charging_sessions_counts(city_id, start_time, end_time, db)
-    return Response.ok(result)
+@router.get("/charging_sessions_counts", dependencies=[STATUS_CONDITIONAL])
+async def charging_sessions_counts_api(city_id, start_time, end_time, resolution: Resolution = "hour",
+                                       response_format: str = SERIES_FORMAT, db: AsyncSession = Depends(get_db)):
+    result = await charging_sessions_counts(city_id, start_time, end_time, db, resolution=resolution)
+    return graph_response(result, response_format)
 
-@router.get("/city_energy")
-def city_energy_api(city_id, start_time, end_time, db: Session = Depends(get_db)):
-    result = city_energy(city_id, start_time, end_time, db)
-    return Response.ok(result)
+@router.get("/city_energy", dependencies=[STATUS_CONDITIONAL])
+async def city_energy_api(city_id, start_time, end_time, resolution: Resolution = "hour",
+                          response_format: str = SERIES_FORMAT, db: AsyncSession = Depends(get_db)):
+    result = await city_energy(city_id, start_time, end_time, db, resolution=resolution)
+    return graph_response(result, response_format)
 
-@router.get("/grid_energy")
-def grid_energy_api(start_time: str, end_time: str, db: Session = Depends(get_db)):
+@router.get("/grid_energy", dependencies=[GRID_CONDITIONAL])
+async def grid_energy_api(start_time: str, end_time: str, resolution: Resolution = "hour",
+                          response_format: str = SERIES_FORMAT, db: AsyncSession = Depends(get_db)):
     from server.graph import grid_generation_vs_load
-    result = grid_generation_vs_load(start_time, end_time, db)
-    return Response.ok(result)
+    result = await grid_generation_vs_load(start_time, end_time, db, resolution=resolution)
+    return graph_response(result, response_format)
+
+@router.get("/station_utilisation", dependencies=[STATUS_CONDITIONAL])
+async def station_utilisation_api(city_id: str, start_time: str, end_time: str, compact: bool = False,
+                                  resolution: Resolution = "hour", response_format: str = SERIES_FORMAT,
+                                  db: AsyncSession = Depends(get_db)):
+    # 列式格式下逐点的 stations 列表没有意义，直接返回矩阵
+    result = await station_utilisation(city_id, start_time, end_time, db, compact=compact or response_format != "json",
+                                       resolution=resolution)
+    return graph_response(result, response_format)
+
+
+# 批量接口：city_ids 为逗号分隔的城市 id 或 all，结果按 city_id 返回，内容与单城市接口相同
+@router.get("/batch/charging_sessions_counts", dependencies=[STATUS_CONDITIONAL])
+async def batch_charging_sessions_counts_api(city_ids: str, start_time: str, end_time: str,
+                                             response_format: str = SERIES_FORMAT,
+                                             db: AsyncSession = Depends(get_db)):
+    cities = await resolve_city_ids(city_ids, db)
+    result = await city_batch_metrics(cities, start_time, end_time, db, metrics=("charging_sessions_counts",))
+    result = {city_id: metrics["charging_sessions_counts"] for city_id, metrics in result.items()}
+    return graph_response(result, response_format)
+
+@router.get("/batch/city_energy", dependencies=[STATUS_CONDITIONAL])
+async def batch_city_energy_api(city_ids: str, start_time: str, end_time: str,
+                                response_format: str = SERIES_FORMAT, db: AsyncSession = Depends(get_db)):
+    cities = await resolve_city_ids(city_ids, db)
+    result = await city_batch_metrics(cities, start_time, end_time, db, metrics=("city_energy",))
+    result = {city_id: metrics["city_energy"] for city_id, metrics in result.items()}
+    return graph_response(result, response_format)
+
+@router.get("/batch/station_utilisation", dependencies=[STATUS_CONDITIONAL])
+async def batch_station_utilisation_api(city_ids: str, start_time: str, end_time: str, compact: bool = False,
+                                        response_format: str = SERIES_FORMAT, db: AsyncSession = Depends(get_db)):
+    cities = await resolve_city_ids(city_ids, db)
+    result = await city_batch_metrics(cities, start_time, end_time, db, metrics=("station_utilisation",),
+                                      compact=compact or response_format != "json")
+    result = {city_id: metrics["station_utilisation"] for city_id, metrics in result.items()}
+    return graph_response(result, response_format)
 
-@router.get("/station_utilisation")
-def station_utilisation_api(city_id: str, start_time: str, end_time: str, db: Session = Depends(get_db)):
-    result = station_utilisation(city_id, start_time, end_time, db)
-    return Response.ok(result)
\ No newline at end of file
+@router.get("/batch/overview", dependencies=[STATUS_CONDITIONAL])
+async def batch_overview_api(city_ids: str, start_time: str, end_time: str, compact: bool = False,
+                             response_format: str = SERIES_FORMAT, db: AsyncSession = Depends(get_db)):
+    # 三个指标共用一次汇总表查询
+    cities = await resolve_city_ids(city_ids, db)
+    result = await city_batch_metrics(cities, start_time, end_time, db,
+                                      compact=compact or response_format != "json")
+    return graph_response(result, response_format)
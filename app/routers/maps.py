@@ -1,23 +1,53 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Query, WebSocket
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from database import get_db
+from middleware.conditional_get import conditional_get
 from util.response import Response
-from server.maps import get_map_by_city_and_time, get_whole_country_map, get_cus_map
+from server.live_status import stream_status_changes
+from server.maps import (
+    get_map_by_city_and_time, get_whole_country_map, get_cus_map, get_map_playback, parse_playback_window,
+    PLAYBACK_MAX_FRAMES
+)
 
 router = APIRouter()
 
+# 数据没有新写入时返回 304
+STATUS_CONDITIONAL = Depends(conditional_get("station_status"))
 
-@router.get("/get_map_by_city_and_time")
-def get_map_by_city_and_time_api(city_id, datetime, db: Session = Depends(get_db)):
-    return Response.ok(get_map_by_city_and_time(city_id, datetime, db))
+
+@router.get("/get_map_by_city_and_time", dependencies=[STATUS_CONDITIONAL])
+async def get_map_by_city_and_time_api(city_id, datetime, db: AsyncSession = Depends(get_db)):
+    return Response.ok(await get_map_by_city_and_time(city_id, datetime, db))
 
 
 @router.get("/get_whole_country_map")
-def get_whole_contry_map_api(db: Session = Depends(get_db)):
-    return Response.ok(get_whole_country_map(db))
+async def get_whole_contry_map_api(db: AsyncSession = Depends(get_db)):
+    return Response.ok(await get_whole_country_map(db))
+
+
+@router.get("/cus_map", dependencies=[STATUS_CONDITIONAL])
+async def cus_map_api(city_id: str, datetime: str, location1: str, location2: str, db: AsyncSession = Depends(get_db)):
+    return Response.ok(await get_cus_map(city_id, datetime, location1, location2, db))
+
+
+@router.get("/playback", dependencies=[STATUS_CONDITIONAL])
+async def map_playback_api(city_id: str, start_time: str, end_time: str, step: int = Query(300, ge=1),
+                           every_poll: bool = False, db: AsyncSession = Depends(get_db)):
+    """回放 [start_time, end_time] 内每 step 秒一帧的地图状态，帧之间只返回状态变化
+
+    every_poll=true 时状态不变的新记录也返回 lastUpdated（数据量随充电桩数 × 帧数增长）
+    """
+    _, _, frame_count = parse_playback_window(start_time, end_time, step)
+    if frame_count > PLAYBACK_MAX_FRAMES:
+        return Response.bad_request(f"Too many frames ({frame_count}, max {PLAYBACK_MAX_FRAMES}), use a larger step")
+    return Response.ok(await get_map_playback(city_id, start_time, end_time, step, db, every_poll))
+
 
+@router.websocket("/live")
+async def map_live_ws(websocket: WebSocket, city_id: str):
+    """订阅 city_id 的状态变化：每条消息为 {"id", "status", "lastUpdated"}，与地图 popupInfo 中的字段一致
 
-@router.get("/cus_map")
-def cus_map_api(city_id: str, datetime: str, location1: str, location2: str, db: Session = Depends(get_db)):
-    return Response.ok(get_cus_map(city_id, datetime, location1, location2, db))
+    只推送变化，客户端连接后先调用一次 get_map_by_city_and_time 取得完整地图
+    """
+    await stream_status_changes(websocket, city_id)
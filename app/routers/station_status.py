@@ -1,22 +1,53 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from database import get_db
 from util.response import Response
-from server.station_status import get_by_station_id
+from util.pagination import PAGE_LIMIT_DEFAULT, PAGE_LIMIT_MAX, page_result
+from util.streaming import stream_query, stream_json_list
+from server.station_status import (
+    get_by_station_id, station_status_history_query, parse_status_cursor, format_status_cursor
+)
 
 router = APIRouter()
 
+
+def station_status_to_dict(station_status) -> dict:
+    return {
+        "id": station_status.id,
+        "station_id": station_status.station_id,
+        "timestamp": station_status.timestamp,
+        "status": station_status.status,
+        "last_updated": station_status.last_updated
+    }
+
+
 @router.get("/get_by_station_id")
-def get_by_station_id_api(station_id, db: Session = Depends(get_db)):
-    station_statuses = get_by_station_id(station_id, db)
-    result = []
-    for station_status in station_statuses:
-        result.append({
-            "id": station_status.id,
-            "station_id": station_status.station_id,
-            "timestamp": station_status.timestamp,
-            "status": station_status.status,
-            "last_updated": station_status.last_updated
-        })
-    return Response.ok(result)
\ No newline at end of file
+async def get_by_station_id_api(station_id, after: Optional[str] = None,
+                                limit: Optional[int] = Query(None, ge=1, le=PAGE_LIMIT_MAX),
+                                format: Literal["json", "ndjson", "csv"] = "json",
+                                db: AsyncSession = Depends(get_db)):
+    """充电桩的全部轮询记录，按 (timestamp, id) 排序
+
+    不带 after / limit 时 data 与原来一样是完整的列表（逐批写出）；
+    带 after 或 limit 时分页，data 为 {"items", "next_after"}，after 为上一页的 next_after，limit 默认 PAGE_LIMIT_DEFAULT；
+    format=ndjson / csv 时从 after 开始流式导出全部记录，忽略 limit
+    """
+    try:
+        cursor = parse_status_cursor(after) if after else None
+    except ValueError:
+        return Response.bad_request("Invalid after cursor")
+
+    if format != "json":
+        query = station_status_history_query(station_id, cursor)
+        return stream_query(query, station_status_to_dict, format, f"station_status_{station_id}")
+    if after is None and limit is None:
+        return stream_json_list(station_status_history_query(station_id), station_status_to_dict)
+
+    limit = limit or PAGE_LIMIT_DEFAULT
+    station_statuses = await get_by_station_id(station_id, db, after=cursor, limit=limit)
+    result = page_result([station_status_to_dict(row) for row in station_statuses], limit,
+                         lambda item: format_status_cursor(item["timestamp"], item["id"]))
+    return Response.ok(result)
@@ -0,0 +1,128 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import func, select, literal_column
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import ChargingSession
+from server import parquet_store
+from util.time_process import to_naive_utc
+
+
+def session_overlaps(start_time: datetime, end_time: datetime):
+    """会话与 [start_time, end_time) 有重叠；左侧表达式与 ix_charging_sessions_period 一致才能用上索引"""
+    period = func.tsrange(ChargingSession.start_time, ChargingSession.end_time, literal_column("'[]'"))
+    return period.op("&&")(
+        func.tsrange(to_naive_utc(start_time), to_naive_utc(end_time), literal_column("'[)'"))
+    )
+
+
+async def get_session_counts(station_ids: List[str], origin: datetime, end_time: datetime, step: timedelta,
+                             db: AsyncSession, start_time: Optional[datetime] = None) -> Dict[datetime, int]:
+    """[start_time, end_time) 内开始的会话数，按从 origin 起步长为 step 的桶计数，key 为 UTC 桶起点（只含非零的桶）
+
+    start_time 默认为 origin；晚于 origin 时第一个桶只统计 start_time 之后开始的会话
+    """
+    start_time = max(start_time or origin, origin)
+    if not station_ids or end_time <= start_time:
+        return {}
+    if parquet_store.covers(start_time, end_time, "charging_sessions"):
+        return await parquet_store.get_session_counts(station_ids, origin, end_time, step, start_time)
+
+    bucket = func.date_bin(step, ChargingSession.start_time, to_naive_utc(origin)).label("bucket")
+    rows = (await db.execute(
+        select(bucket, func.count())
+        .filter(
+            ChargingSession.station_id.in_(station_ids),
+            ChargingSession.start_time >= to_naive_utc(start_time),
+            ChargingSession.start_time < to_naive_utc(end_time)
+        )
+        .group_by(bucket)
+    )).all()
+    return {bucket_start.replace(tzinfo=timezone.utc): int(count) for bucket_start, count in rows}
+
+
+async def get_session_arrays(station_ids: List[str], start_time: datetime, end_time: datetime, db: AsyncSession):
+    """与 [start_time, end_time) 重叠的会话：station_id 数组，开始、结束时间的 UTC epoch 秒数组"""
+    if not station_ids or end_time <= start_time:
+        return np.array([], dtype=str), np.array([], dtype=float), np.array([], dtype=float)
+    if parquet_store.covers(start_time, end_time, "charging_sessions"):
+        return await parquet_store.get_session_arrays(station_ids, start_time, end_time)
+
+    records = (await db.execute(
+        select(ChargingSession.station_id, ChargingSession.start_time, ChargingSession.end_time)
+        .filter(
+            ChargingSession.station_id.in_(station_ids),
+            session_overlaps(start_time, end_time)
+        )
+    )).all()
+    if not records:
+        return np.array([], dtype=str), np.array([], dtype=float), np.array([], dtype=float)
+
+    station_col, start_col, end_col = zip(*records)
+    starts = np.array(start_col, dtype="datetime64[us]").astype(np.int64) / 1e6
+    ends = np.array(end_col, dtype="datetime64[us]").astype(np.int64) / 1e6
+    return np.array(station_col, dtype=str), starts, ends
+
+
+def bin_session_starts(starts: np.ndarray, origin: float, step: float, bucket_count: int) -> np.ndarray:
+    """按开始时间落在哪个桶计数，窗口外的会话不计入"""
+    index = np.floor((starts - origin) / step).astype(np.intp)
+    index = index[(index >= 0) & (index < bucket_count)]
+    return np.bincount(index, minlength=bucket_count)[:bucket_count]
+
+
+def bin_session_energy(starts: np.ndarray, ends: np.ndarray, power: np.ndarray, origin: float, step: float,
+                       bucket_count: int) -> np.ndarray:
+    """把会话时长 × 额定功率摊到从 origin 起步长为 step 秒的桶中，返回每桶的用电量（kWh）
+
+    会话按 [origin, origin + bucket_count * step) 截断；额定功率为 NaN 的充电桩不计入
+    """
+    window_end = origin + bucket_count * step
+    starts = np.clip(starts, origin, window_end)
+    ends = np.clip(ends, origin, window_end)
+    keep = (ends > starts) & ~np.isnan(power)
+    starts, ends, power = starts[keep], ends[keep], power[keep] / 3600.0
+
+    first = np.clip(((starts - origin) // step).astype(np.intp), 0, bucket_count - 1)
+    last = np.clip((np.ceil((ends - origin) / step) - 1).astype(np.intp), first, bucket_count - 1)
+    single = first == last
+    multi = ~single
+
+    # 首尾两个桶按实际重叠的时长计入，中间完整的桶用差分数组累加
+    first_part = np.where(single, ends, origin + (first + 1) * step) - starts
+    last_part = (ends - (origin + last * step))[multi]
+    full = np.bincount(first[multi] + 1, weights=power[multi] * step, minlength=bucket_count + 1)
+    full -= np.bincount(last[multi], weights=power[multi] * step, minlength=bucket_count + 1)
+
+    energy = np.zeros(bucket_count)
+    energy += np.cumsum(full)[:bucket_count]
+    energy += np.bincount(first, weights=first_part * power, minlength=bucket_count)
+    energy += np.bincount(last[multi], weights=last_part * power[multi], minlength=bucket_count)
+    return energy
+
+
+async def get_session_energy(station_ids: List[str], station_power_map: dict, origin: datetime, end_time: datetime,
+                             step: timedelta, db: AsyncSession, start_time: Optional[datetime] = None
+                             ) -> Dict[datetime, float]:
+    """[start_time, end_time) 内每个桶的用电量（kWh），桶从 origin 起步长为 step，key 为 UTC 桶起点（只含非零的桶）
+
+    start_time 默认为 origin；晚于 origin 时会话从 start_time 截断，第一个桶不完整
+    """
+    start_time = max(start_time or origin, origin)
+    if not station_ids or end_time <= start_time:
+        return {}
+
+    stations, starts, ends = await get_session_arrays(station_ids, start_time, end_time, db)
+    if not len(stations):
+        return {}
+
+    utc_origin = origin.astimezone(timezone.utc)
+    step_seconds = step.total_seconds()
+    bucket_count = int(np.ceil((end_time.timestamp() - utc_origin.timestamp()) / step_seconds))
+    power = np.array([station_power_map.get(station_id) for station_id in stations], dtype=float)
+    # 会话截断到 [start_time, end_time]，第一个和最后一个桶可能不完整
+    energy = bin_session_energy(np.maximum(starts, start_time.timestamp()), np.minimum(ends, end_time.timestamp()),
+                                power, utc_origin.timestamp(), step_seconds, bucket_count)
+    return {utc_origin + step * int(i): float(energy[i]) for i in np.flatnonzero(energy)}
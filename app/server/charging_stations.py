@@ -1,23 +1,27 @@
-from sqlalchemy import func
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from models import ChargingStation
 
-def get_by_station_id(station_id, db: Session):
-    charging_station = db.query(
-        ChargingStation.station_id,
-        ChargingStation.name,
-        ChargingStation.description,
-        func.ST_X(ChargingStation.location).label("lon"),
-        func.ST_Y(ChargingStation.location).label("lat"),
-        ChargingStation.city_id,
-        ChargingStation.connector_type,
-        ChargingStation.rated_power_kw
-    ).filter(ChargingStation.station_id == station_id).first()
+async def get_by_station_id(station_id, db: AsyncSession):
+    result = await db.execute(
+        select(
+            ChargingStation.station_id,
+            ChargingStation.name,
+            ChargingStation.description,
+            func.ST_X(ChargingStation.location).label("lon"),
+            func.ST_Y(ChargingStation.location).label("lat"),
+            ChargingStation.city_id,
+            ChargingStation.connector_type,
+            ChargingStation.rated_power_kw
+        ).filter(ChargingStation.station_id == station_id)
+    )
+    charging_station = result.first()
     return charging_station
 
-def get_by_city_id(city_id, db: Session):
-    charging_stations = db.query(
+def city_stations_query(city_id, after=None):
+    """按 station_id 排序的城市充电桩，after 为上一页最后一个 station_id"""
+    query = select(
         ChargingStation.station_id,
         ChargingStation.name,
         ChargingStation.description,
@@ -27,4 +31,49 @@ def get_by_city_id(city_id, db: Session):
         ChargingStation.connector_type,
         ChargingStation.rated_power_kw
     ).filter(ChargingStation.city_id == city_id)
-    return charging_stations
\ No newline at end of file
+    if after is not None:
+        query = query.filter(ChargingStation.station_id > after)
+    return query.order_by(ChargingStation.station_id)
+
+async def get_by_city_id(city_id, db: AsyncSession, after=None, limit=None):
+    query = city_stations_query(city_id, after)
+    if limit is not None:
+        query = query.limit(limit)
+    result = await db.execute(query)
+    charging_stations = result.all()
+    return charging_stations
+
+async def get_all_stations(db: AsyncSession):
+    result = await db.execute(
+        select(
+            ChargingStation.station_id,
+            ChargingStation.name,
+            ChargingStation.description,
+            func.ST_X(ChargingStation.location).label("lon"),
+            func.ST_Y(ChargingStation.location).label("lat"),
+            ChargingStation.city_id,
+            ChargingStation.connector_type,
+            ChargingStation.rated_power_kw
+        )
+    )
+    return result.all()
+
+async def get_by_city_id_in_bbox(city_id, min_lon, min_lat, max_lon, max_lat, db: AsyncSession):
+    # location && 矩形 走 location 上的 GiST 索引，只取矩形内的充电桩
+    envelope = func.ST_MakeEnvelope(min_lon, min_lat, max_lon, max_lat, 4326)
+    result = await db.execute(
+        select(
+            ChargingStation.station_id,
+            ChargingStation.name,
+            ChargingStation.description,
+            func.ST_X(ChargingStation.location).label("lon"),
+            func.ST_Y(ChargingStation.location).label("lat"),
+            ChargingStation.city_id,
+            ChargingStation.connector_type,
+            ChargingStation.rated_power_kw
+        ).filter(
+            ChargingStation.city_id == city_id,
+            ChargingStation.location.op("&&")(envelope)
+        )
+    )
+    return result.all()
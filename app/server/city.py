@@ -1,22 +1,22 @@
-from sqlalchemy import func
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from models import City, ChargingStation
 
 
-def get_all_cities(db: Session):
-    cities = (
-        db.query(
+async def get_all_cities(db: AsyncSession):
+    result = await db.execute(
+        select(
             City.city_id,
             City.label,
             func.ST_X(City.center).label("lon"),
             func.ST_Y(City.center).label("lat")
         )
         .filter(
-            db.query(ChargingStation)
+            select(ChargingStation.station_id)
             .filter(ChargingStation.city_id == City.city_id)
             .exists()
         )
-        .all()
     )
-    return cities
\ No newline at end of file
+    cities = result.all()
+    return cities
@@ -0,0 +1,15 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import IngestWatermark
+
+
+async def get_watermark(source: str, db: AsyncSession):
+    """返回 source 表的 (version, updated_at)，还没有写入过时为 (0, None)"""
+    watermark = (
+        await db.execute(
+            select(IngestWatermark.version, IngestWatermark.updated_at)
+            .filter(IngestWatermark.source == source)
+        )
+    ).first()
+    return tuple(watermark) if watermark else (0, None)
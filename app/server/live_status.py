@@ -0,0 +1,131 @@
+import asyncio
+import json
+import logging
+import os
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Optional, Set
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from models.station_current_status import STATUS_NOTIFY_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+# 应用启动时是否建立 LISTEN 连接；关闭后 /map/live 只能收到进程内 publish 的变化
+LIVE_STATUS_ENABLED = os.getenv("LIVE_STATUS_ENABLED", "true").lower() in ("1", "true", "yes")
+# 每个客户端最多积压的变化条数，超过后断开，客户端重连并重新拉取一次地图
+LIVE_QUEUE_SIZE = int(os.getenv("LIVE_QUEUE_SIZE", "1000"))
+# LISTEN 连接断开后的重连间隔（秒）
+LIVE_RECONNECT_SECONDS = float(os.getenv("LIVE_RECONNECT_SECONDS", "5"))
+
+
+class StatusBroker:
+    """进程内按城市分发状态变化；数据库的 NOTIFY 和测试都通过 publish 发布"""
+
+    def __init__(self, queue_size: int = LIVE_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.subscribers: Dict[str, Set[asyncio.Queue]] = {}
+
+    @contextmanager
+    def subscribe(self, city_id: str):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.setdefault(city_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            self.unsubscribe(city_id, queue)
+
+    def unsubscribe(self, city_id: str, queue: asyncio.Queue):
+        queues = self.subscribers.get(city_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self.subscribers[city_id]
+
+    def publish(self, city_id: str, change: dict):
+        for queue in list(self.subscribers.get(city_id, ())):
+            try:
+                queue.put_nowait(change)
+            except asyncio.QueueFull:
+                # 跟不上的客户端：清空积压，放入 None 通知其断开
+                self.unsubscribe(city_id, queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+
+    def publish_notification(self, payload: str):
+        """处理一条 station_status_notify 的 payload"""
+        data = json.loads(payload)
+        if data["city_id"] is None:
+            return
+        timestamp = datetime.fromisoformat(data["timestamp"]).replace(tzinfo=timezone.utc)
+        self.publish(data["city_id"], {
+            "id": data["station_id"],
+            "status": data["status"],
+            "lastUpdated": timestamp.isoformat(),
+        })
+
+
+status_broker = StatusBroker()
+
+
+async def listen_status_changes(engine, broker: StatusBroker = status_broker):
+    """应用运行期间保持一个 LISTEN 连接，把状态变化转给 broker；订阅者再多数据库负载也不变"""
+    loop = asyncio.get_running_loop()
+
+    def on_notify(connection, pid, channel, payload):
+        try:
+            broker.publish_notification(payload)
+        except (ValueError, KeyError) as e:
+            logger.warning(f"[Live Status] bad payload {payload!r}: {e}")
+
+    while True:
+        driver_connection = None
+        try:
+            async with engine.connect() as conn:
+                driver_connection = (await conn.get_raw_connection()).driver_connection
+                closed = loop.create_future()
+                driver_connection.add_termination_listener(
+                    lambda _: closed.done() or closed.set_result(None))
+                await driver_connection.add_listener(STATUS_NOTIFY_CHANNEL, on_notify)
+                await closed
+            logger.warning("[Live Status] LISTEN connection lost, reconnecting")
+        except asyncio.CancelledError:
+            if driver_connection is not None and not driver_connection.is_closed():
+                await driver_connection.remove_listener(STATUS_NOTIFY_CHANNEL, on_notify)
+            raise
+        except Exception as e:
+            logger.warning(f"[Live Status] LISTEN failed: {e!r}, retrying in {LIVE_RECONNECT_SECONDS}s")
+        await asyncio.sleep(LIVE_RECONNECT_SECONDS)
+
+
+async def stream_status_changes(websocket: WebSocket, city_id: str, broker: StatusBroker = status_broker):
+    """把 city_id 的状态变化逐条推给 websocket，直到客户端断开"""
+    await websocket.accept()
+    with broker.subscribe(city_id) as queue:
+
+        async def forward():
+            while True:
+                change: Optional[dict] = await queue.get()
+                if change is None:
+                    # 1013 Try Again Later：积压过多，客户端应重新拉取地图后再订阅
+                    await websocket.close(code=1013)
+                    return
+                await websocket.send_json(change)
+
+        async def receive():
+            # 客户端不需要发送消息，这里只用来发现断开
+            try:
+                while True:
+                    await websocket.receive_text()
+            except WebSocketDisconnect:
+                pass
+
+        tasks = [asyncio.create_task(forward()), asyncio.create_task(receive())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
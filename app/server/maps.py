@@ -1,15 +1,25 @@
-from datetime import datetime, timezone
+import math
+import os
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List
 
-from sqlalchemy import and_, func, select
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select, cast, true, Text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 
-from models import StationStatus, City, ChargingStation
-from server.charging_stations import get_by_city_id
-from util.time_process import parse_datetime
+from models import StationStatus, StationCurrentStatus, City, ChargingStation
+from server.charging_stations import get_by_city_id_in_bbox
+from server.metadata_cache import metadata_cache
+from util.geo import parse_ewkb_point
+from util.streaming import STREAM_BATCH_SIZE
+from util.time_process import parse_datetime, process_start_end_time, to_naive_utc
 
+# 一次回放最多的帧数（288 帧为一天 5 分钟一帧）
+PLAYBACK_MAX_FRAMES = int(os.getenv("PLAYBACK_MAX_FRAMES", "2000"))
 
-def get_map_by_city_and_time(city_id: str, datetime_str: str, db: Session) -> Dict[str, List[dict]]:
+
+async def get_map_by_city_and_time(city_id: str, datetime_str: str, db: AsyncSession) -> Dict[str, List[dict]]:
     # 保存原始输入的时间字符串（用于返回结果）
     original_datetime_str = datetime_str
     # 验证并解析时间字符串（处理各种时区格式）
@@ -18,7 +28,14 @@ def get_map_by_city_and_time(city_id: str, datetime_str: str, db: Session) -> Di
     except ValueError as e:
         raise ValueError(f"Invalid datetime format: {str(e)}")
 
-    charging_stations = get_by_city_id(city_id, db)
+    charging_stations = await metadata_cache.get_city_stations(city_id, db)
+    station_info_list = await build_station_info_list(charging_stations, parsed_datetime, db)
+
+    return {original_datetime_str: station_info_list}
+
+
+async def build_station_info_list(charging_stations, parsed_datetime: datetime, db: AsyncSession) -> List[dict]:
+    """组装地图上每个充电桩的信息，状态只查询传入的这些充电桩"""
     station_info_list = []
     station_ids = []
 
@@ -39,7 +56,7 @@ def get_map_by_city_and_time(city_id: str, datetime_str: str, db: Session) -> Di
         station_info_list.append(station_info)
         station_ids.append(station.station_id)
 
-    status_map = bulk_get_status(station_ids, parsed_datetime, db)
+    status_map = await bulk_get_status(station_ids, parsed_datetime, db)
 
     for info in station_info_list:
         station_id = info["popupInfo"]["id"]
@@ -47,15 +64,18 @@ def get_map_by_city_and_time(city_id: str, datetime_str: str, db: Session) -> Di
             status = status_map[station_id]
             info["popupInfo"]["status"] = status.status
             if status.timestamp:
-                if status.timestamp.tzinfo is None:
-                    info["popupInfo"]["lastUpdated"] = status.timestamp.replace(tzinfo=timezone.utc).isoformat()
-                else:
-                    info["popupInfo"]["lastUpdated"] = status.timestamp.astimezone(timezone.utc).isoformat()
+                info["popupInfo"]["lastUpdated"] = format_last_updated(status.timestamp)
+
+    return station_info_list
 
-    return {original_datetime_str: station_info_list}
 
+def format_last_updated(timestamp: datetime) -> str:
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=timezone.utc).isoformat()
+    return timestamp.astimezone(timezone.utc).isoformat()
 
-def bulk_get_status(station_ids: List[str], parsed_datetime: datetime, db: Session) -> Dict[str, object]:
+
+async def bulk_get_status(station_ids: List[str], parsed_datetime: datetime, db: AsyncSession) -> Dict[str, object]:
     if not station_ids:
         return {}
 
@@ -64,53 +84,52 @@ def bulk_get_status(station_ids: List[str], parsed_datetime: datetime, db: Sessi
     else:
         query_datetime = parsed_datetime.astimezone(timezone.utc)
 
-    # start_datetime = query_datetime - timedelta(minutes=15)
-    end_datetime = query_datetime
+    end_datetime = to_naive_utc(query_datetime)
 
-    # 创建子查询：获取每个充电站在时间范围内的最新时间戳
-    subquery = (
-        db.query(
-            StationStatus.station_id,
-            func.max(StationStatus.last_updated).label('latest')
+    # 常见的“当前时刻”：查询时间不早于这些充电桩最近一次写入，直接用快照表
+    current = (
+        await db.execute(
+            select(StationCurrentStatus).filter(StationCurrentStatus.station_id.in_(station_ids))
         )
+    ).scalars().all()
+    if current and end_datetime >= max(status.timestamp for status in current):
+        return {status.station_id: status for status in current}
+
+    # 历史时刻：每个充电站按 (station_id, timestamp) 索引倒序取一条
+    ids = func.unnest(cast(station_ids, ARRAY(Text))).table_valued("station_id", name="ids").render_derived()
+    latest = (
+        select(StationStatus)
         .filter(
-            StationStatus.station_id.in_(station_ids),
-            # StationStatus.timestamp >= start_datetime,
+            StationStatus.station_id == ids.c.station_id,
             StationStatus.timestamp <= end_datetime
         )
-        .group_by(StationStatus.station_id)
-        .subquery()
+        .order_by(StationStatus.timestamp.desc())
+        .limit(1)
+        .lateral("latest")
     )
-
-    # 主查询：获取最新时间戳对应的完整状态记录
     results = (
-        db.query(StationStatus)
-        .join(
-            subquery,
-            and_(
-                StationStatus.station_id == subquery.c.station_id,
-                StationStatus.last_updated == subquery.c.latest
-            )
+        await db.execute(
+            select(aliased(StationStatus, latest)).select_from(ids).join(latest, true())
         )
-        .all()
-    )
+    ).scalars().all()
 
     return {status.station_id: status for status in results}
 
 
-def get_whole_country_map(db: Session):
+async def get_whole_country_map(db: AsyncSession):
     results = (
-        db.query(
-            City.city_id,
-            City.label,
-            func.ST_X(City.center).label("lon"),
-            func.ST_Y(City.center).label("lat"),
-            func.count(ChargingStation.station_id).label("charging_station_count")
+        await db.execute(
+            select(
+                City.city_id,
+                City.label,
+                func.ST_X(City.center).label("lon"),
+                func.ST_Y(City.center).label("lat"),
+                func.count(ChargingStation.station_id).label("charging_station_count")
+            )
+            .join(ChargingStation, ChargingStation.city_id == City.city_id)
+            .group_by(City.city_id, City.label, City.center)
         )
-        .join(ChargingStation, ChargingStation.city_id == City.city_id)
-        .group_by(City.city_id, City.label, City.center)
-        .all()
-    )
+    ).all()
 
     return [
         {
@@ -123,42 +142,106 @@ def get_whole_country_map(db: Session):
         for row in results
     ]
 
-# 复用了get_map_by_city_and_time的方法，会产生额外的性能开支，但是我懒，所以复用了之前的方法
-def get_cus_map(city_id: str,datetime_str: str,location1_wkb: str,location2_wkb: str,db: Session) -> Dict[str, List[dict]]:
-    # 1. 获取该城市和日期全部数据
-    full_map = get_map_by_city_and_time(city_id, datetime_str, db)
-    station_info_list = full_map.get(datetime_str, [])
-
-    # 2. 用 EWKB 解码取坐标
-    lon1 = db.execute(
-        select(func.ST_X(
-            func.ST_GeomFromEWKB(func.decode(location1_wkb, 'hex'))
-        ))
-    ).scalar_one()
-    lat1 = db.execute(
-        select(func.ST_Y(
-            func.ST_GeomFromEWKB(func.decode(location1_wkb, 'hex'))
-        ))
-    ).scalar_one()
-    lon2 = db.execute(
-        select(func.ST_X(
-            func.ST_GeomFromEWKB(func.decode(location2_wkb, 'hex'))
-        ))
-    ).scalar_one()
-    lat2 = db.execute(
-        select(func.ST_Y(
-            func.ST_GeomFromEWKB(func.decode(location2_wkb, 'hex'))
-        ))
-    ).scalar_one()
+async def get_cus_map(city_id: str,datetime_str: str,location1_wkb: str,location2_wkb: str,db: AsyncSession) -> Dict[str, List[dict]]:
+    try:
+        parsed_datetime = parse_datetime(datetime_str)
+    except ValueError as e:
+        raise ValueError(f"Invalid datetime format: {str(e)}")
+
+    # 1. 在本进程内解码两个 EWKB 角点
+    lon1, lat1 = parse_ewkb_point(location1_wkb)
+    lon2, lat2 = parse_ewkb_point(location2_wkb)
 
     min_lon, max_lon = min(lon1, lon2), max(lon1, lon2)
     min_lat, max_lat = min(lat1, lat2), max(lat1, lat2)
 
-    # 3. 过滤出在矩形内的站点
-    filtered = [
-        info for info in station_info_list
-        if min_lon <= info["lon"] <= max_lon
-           and min_lat <= info["lat"] <= max_lat
-    ]
+    # 2. 矩形过滤放进充电桩查询（GiST 索引），只为矩形内的充电桩查状态
+    charging_stations = await get_by_city_id_in_bbox(city_id, min_lon, min_lat, max_lon, max_lat, db)
+    station_info_list = await build_station_info_list(charging_stations, parsed_datetime, db)
+
+    return {datetime_str: station_info_list}
+
+
+def parse_playback_window(start_time: str, end_time: str, step_seconds: int):
+    """返回 (开始时间, 结束时间, 帧数)"""
+    try:
+        parsed_start, parsed_end = process_start_end_time(start_time, end_time)
+    except ValueError as e:
+        raise ValueError(f"Invalid datetime format: {str(e)}")
 
-    return {datetime_str: filtered}
\ No newline at end of file
+    step = timedelta(seconds=step_seconds)
+    frame_count = int((parsed_end - parsed_start) / step) + 1 if parsed_end >= parsed_start else 0
+    return parsed_start, parsed_end, frame_count
+
+
+async def get_map_playback(city_id: str, start_time: str, end_time: str, step_seconds: int,
+                           db: AsyncSession, every_poll: bool = False) -> dict:
+    """地图回放：第 k 帧为 start_time + k * step 时刻的状态（与 get_map_by_city_and_time 相同）
+
+    充电桩列表（含第 0 帧的状态）只返回一次，之后每帧只返回状态有变化的充电桩 {"id", "status", "lastUpdated"}，
+    lastUpdated 为状态变为新值的时间；
+    every_poll 为 True 时有新记录但状态不变的充电桩也返回 {"id", "lastUpdated"}，lastUpdated 为最新一条记录的时间；
+    第 0 帧之后的所有记录由一次按时间排序的查询得到
+    """
+    parsed_start, parsed_end, frame_count = parse_playback_window(start_time, end_time, step_seconds)
+    step = timedelta(seconds=step_seconds)
+
+    charging_stations = await metadata_cache.get_city_stations(city_id, db)
+    station_info_list = await build_station_info_list(charging_stations, parsed_start, db)
+    frames = [
+        {"time": (parsed_start + step * k).astimezone(timezone.utc).isoformat(), "changes": []}
+        for k in range(frame_count)
+    ]
+    if frame_count < 2 or not station_info_list:
+        return {"start_time": start_time, "end_time": end_time, "step_seconds": step_seconds,
+                "stations": station_info_list, "frames": frames}
+
+    # emitted 为上一帧结束时每个充电桩的状态，current 为扫描到的最新状态；
+    # updated_at 为状态变化（every_poll 时为每条记录）的时间，pending 为当前帧内需要检查的充电桩（按出现顺序）
+    emitted = {info["popupInfo"]["id"]: info["popupInfo"]["status"] for info in station_info_list}
+    current = dict(emitted)
+    updated_at = {}
+    pending = {}
+    frame = 1
+
+    def flush(frame_index: int):
+        changes = frames[frame_index]["changes"]
+        for station_id in pending:
+            status = current[station_id]
+            if status != emitted[station_id]:
+                emitted[station_id] = status
+                changes.append({"id": station_id, "status": status,
+                                "lastUpdated": format_last_updated(updated_at[station_id])})
+            elif every_poll:
+                changes.append({"id": station_id, "lastUpdated": format_last_updated(updated_at[station_id])})
+        pending.clear()
+
+    utc_start = parsed_start.astimezone(timezone.utc)
+    last_frame = parsed_start + step * (frame_count - 1)
+    result = await db.stream(
+        select(StationStatus.station_id, StationStatus.timestamp, StationStatus.status)
+        .filter(
+            StationStatus.station_id.in_(list(emitted)),
+            StationStatus.timestamp > to_naive_utc(parsed_start),
+            StationStatus.timestamp <= to_naive_utc(last_frame)
+        )
+        .order_by(StationStatus.timestamp)
+        .execution_options(yield_per=STREAM_BATCH_SIZE)
+    )
+    async for rows in result.partitions():
+        for station_id, timestamp, status in rows:
+            # 记录属于时间不早于它的第一帧
+            index = math.ceil((timestamp.replace(tzinfo=timezone.utc) - utc_start) / step)
+            while frame < index:
+                flush(frame)
+                frame += 1
+            if status != current[station_id] or every_poll:
+                current[station_id] = status
+                updated_at[station_id] = timestamp
+                pending[station_id] = None
+    while frame < frame_count:
+        flush(frame)
+        frame += 1
+
+    return {"start_time": start_time, "end_time": end_time, "step_seconds": step_seconds,
+            "stations": station_info_list, "frames": frames}
@@ -0,0 +1,108 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections import defaultdict
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from server.charging_stations import get_all_stations
+from server.city import get_all_cities
+
+METADATA_CACHE_TTL = int(os.getenv("METADATA_CACHE_TTL", "300"))
+
+
+class MetadataCache:
+    """充电桩 / 城市元数据的进程内缓存
+
+    只有充电桩目录更新时数据才会变化，因此整张表一次性加载，按 TTL 过期；
+    目录更新后调用 invalidate()（或 /admin/invalidate_cache）提升版本号，下次访问时重新加载。
+    TTL 过期后重新加载时如果内容有变化，同样提升版本号（结果缓存和 ETag 都以版本号区分）。
+    缓存中的对象是共享的，调用方不要修改。
+    """
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self.version = 0
+        self._loaded_version: Optional[int] = None
+        self._loaded_at = 0.0
+        self._digest: Optional[str] = None
+        self._lock = asyncio.Lock()
+        self._stations_by_city: Dict[str, Tuple] = {}
+        self._station_power: Dict[str, Optional[float]] = {}
+        self._station_name: Dict[str, Optional[str]] = {}
+        self._cities: Tuple = ()
+
+    def invalidate(self) -> int:
+        self.version += 1
+        return self.version
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._loaded_version == self.version
+            and time.monotonic() - self._loaded_at < self.ttl_seconds
+        )
+
+    async def _ensure_loaded(self, db: AsyncSession):
+        if self._is_fresh():
+            return
+        async with self._lock:
+            # 等锁期间可能已经被其他请求加载
+            if self._is_fresh():
+                return
+            version = self.version
+            stations = await get_all_stations(db)
+            cities = await get_all_cities(db)
+
+            stations_by_city = defaultdict(list)
+            for station in stations:
+                stations_by_city[station.city_id].append(station)
+
+            self._stations_by_city = {city_id: tuple(rows) for city_id, rows in stations_by_city.items()}
+            self._station_power = {station.station_id: station.rated_power_kw for station in stations}
+            self._station_name = {station.station_id: station.name for station in stations}
+            self._cities = tuple(cities)
+
+            digest = catalogue_digest(stations, cities)
+            # 版本号未变说明是 TTL 过期后的重新加载
+            if version == self._loaded_version and digest != self._digest:
+                version = self.invalidate()
+            self._digest = digest
+            self._loaded_version = version
+            self._loaded_at = time.monotonic()
+
+    async def get_version(self, db: AsyncSession) -> int:
+        """加载（或按 TTL 重新加载）后的版本号"""
+        await self._ensure_loaded(db)
+        return self.version
+
+    async def get_city_stations(self, city_id: str, db: AsyncSession) -> Tuple:
+        await self._ensure_loaded(db)
+        return self._stations_by_city.get(city_id, ())
+
+    async def get_station_power_map(self, db: AsyncSession) -> Dict[str, Optional[float]]:
+        await self._ensure_loaded(db)
+        return self._station_power
+
+    async def get_station_name_map(self, db: AsyncSession) -> Dict[str, Optional[str]]:
+        await self._ensure_loaded(db)
+        return self._station_name
+
+    async def get_cities(self, db: AsyncSession) -> Tuple:
+        await self._ensure_loaded(db)
+        return self._cities
+
+
+def catalogue_digest(stations, cities) -> str:
+    # 查询没有排序，按主键排序后再比较
+    rows = (sorted(map(tuple, stations), key=lambda row: row[0]), sorted(map(tuple, cities), key=lambda row: row[0]))
+    return hashlib.sha1(repr(rows).encode()).hexdigest()
+
+
+metadata_cache = MetadataCache(METADATA_CACHE_TTL)
+
+
+def invalidate_metadata_cache() -> int:
+    """充电桩目录或城市表更新后调用"""
+    return metadata_cache.invalidate()
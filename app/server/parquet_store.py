@@ -0,0 +1,120 @@
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+import duckdb
+import numpy as np
+
+from util.time_process import to_naive_utc
+
+# DataScripts/export_parquet.py 的输出目录；未配置时所有查询都走 PostgreSQL
+PARQUET_ROOT = os.getenv("PARQUET_ROOT")
+# 结束时间早于当前时间这么多天的窗口改用 DuckDB 读 Parquet
+PARQUET_HORIZON_DAYS = int(os.getenv("PARQUET_HORIZON_DAYS", "30"))
+
+
+def day_files(dataset: str, start_time: datetime, end_time: datetime) -> Optional[List[str]]:
+    """[start_time, end_time) 覆盖到的每一天的 Parquet 文件，有任何一天未导出时返回 None"""
+    day = to_naive_utc(start_time).replace(hour=0, minute=0, second=0, microsecond=0)
+    end = to_naive_utc(end_time)
+    files = []
+    while day < end:
+        path = os.path.join(PARQUET_ROOT, dataset, f"date={day:%Y-%m-%d}", "data.parquet")
+        if not os.path.exists(path):
+            return None
+        files.append(path)
+        day += timedelta(days=1)
+    return files
+
+
+def covers(start_time: datetime, end_time: datetime, dataset: str) -> bool:
+    """窗口足够旧且涉及的每一天都已导出时返回 True，此时改用 DuckDB 查询 Parquet"""
+    if not PARQUET_ROOT or end_time <= start_time:
+        return False
+    if end_time > datetime.now(timezone.utc) - timedelta(days=PARQUET_HORIZON_DAYS):
+        return False
+    return day_files(dataset, start_time, end_time) is not None
+
+
+def query_numpy(sql: str, params: list) -> Dict[str, np.ndarray]:
+    # 每次查询使用独立的内存连接，可以在线程池中并发执行
+    with duckdb.connect() as conn:
+        return conn.execute(sql, params).fetchnumpy()
+
+
+async def get_hourly_matrices(station_ids: List[str], start_hour: datetime, hour_count: int, columns) -> tuple:
+    """与 server.graph.get_hourly_matrices 相同，数据来自 station_status_hourly 的 Parquet"""
+    matrices = tuple(np.zeros((len(station_ids), hour_count)) for _ in columns)
+    if not station_ids or not hour_count:
+        return matrices
+
+    end_hour = start_hour + timedelta(hours=hour_count)
+    result = await asyncio.to_thread(query_numpy, f"""
+        SELECT station_id, date_diff('hour', ?::TIMESTAMP, hour_start) AS hour_index, {", ".join(columns)}
+          FROM read_parquet(?)
+         WHERE hour_start >= ? AND hour_start < ? AND list_contains(?, station_id)
+    """, [to_naive_utc(start_hour), day_files("station_status_hourly", start_hour, end_hour),
+          to_naive_utc(start_hour), to_naive_utc(end_hour), station_ids])
+    if not len(result["station_id"]):
+        return matrices
+
+    station_index = {station_id: i for i, station_id in enumerate(station_ids)}
+    index = (
+        np.fromiter((station_index[station_id] for station_id in result["station_id"]), dtype=np.intp,
+                    count=len(result["station_id"])),
+        result["hour_index"].astype(np.intp)
+    )
+    for matrix, column in zip(matrices, columns):
+        np.add.at(matrix, index, result[column])
+    return matrices
+
+
+async def get_grid_rows(start_time: datetime, end_time: datetime) -> list:
+    """每小时 generation / load 的平均值 [(hour, metric_type, avg_mw)]，与 get_grid_hourly 的查询相同"""
+    result = await asyncio.to_thread(query_numpy, """
+        SELECT date_trunc('hour', timestamp) AS hour, metric_type, avg(value_mw) AS avg_mw
+          FROM read_parquet(?)
+         WHERE timestamp >= ? AND timestamp < ? AND metric_type IN ('generation', 'load')
+         GROUP BY ALL
+         ORDER BY hour
+    """, [day_files("grid_metrics", start_time, end_time), to_naive_utc(start_time), to_naive_utc(end_time)])
+    hours = result["hour"].astype("datetime64[us]").tolist()
+    return list(zip(hours, result["metric_type"].tolist(), result["avg_mw"].tolist()))
+
+
+# charging_sessions 的每个日文件包含与该天重叠的所有会话，跨天的会话出现在多个文件中，按主键去重
+# （导出时间不同的文件中同一会话的结束时间可能不同，取最晚的一个）
+SESSIONS_SQL = """
+    SELECT station_id, start_time, max(end_time) AS end_time
+      FROM read_parquet(?)
+     WHERE list_contains(?, station_id)
+     GROUP BY station_id, start_time
+"""
+
+
+async def get_session_counts(station_ids: List[str], origin: datetime, end_time: datetime,
+                             step: timedelta, start_time: datetime) -> Dict[datetime, int]:
+    """与 server.charging_sessions.get_session_counts 相同，数据来自 charging_sessions 的 Parquet"""
+    result = await asyncio.to_thread(query_numpy, f"""
+        SELECT time_bucket(?::INTERVAL, start_time, ?::TIMESTAMP) AS bucket, count(*) AS sessions
+          FROM ({SESSIONS_SQL})
+         WHERE start_time >= ? AND start_time < ?
+         GROUP BY bucket
+    """, [step, to_naive_utc(origin), day_files("charging_sessions", start_time, end_time), station_ids,
+          to_naive_utc(start_time), to_naive_utc(end_time)])
+    buckets = result["bucket"].astype("datetime64[us]").tolist()
+    return {bucket.replace(tzinfo=timezone.utc): int(count) for bucket, count in zip(buckets, result["sessions"])}
+
+
+async def get_session_arrays(station_ids: List[str], start_time: datetime, end_time: datetime):
+    """与 server.charging_sessions.get_session_arrays 相同：与 [start_time, end_time) 重叠的会话"""
+    result = await asyncio.to_thread(query_numpy, f"""
+        SELECT station_id, start_time, end_time
+          FROM ({SESSIONS_SQL})
+         WHERE start_time < ? AND end_time >= ?
+    """, [day_files("charging_sessions", start_time, end_time), station_ids,
+          to_naive_utc(end_time), to_naive_utc(start_time)])
+    starts = result["start_time"].astype("datetime64[us]").astype(np.int64) / 1e6
+    ends = result["end_time"].astype("datetime64[us]").astype(np.int64) / 1e6
+    return np.asarray(result["station_id"], dtype=str), starts, ends
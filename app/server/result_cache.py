@@ -0,0 +1,62 @@
+import os
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Hashable
+
+from util.time_process import floor_hour
+
+RESULT_CACHE_MAX_HOURS = int(os.getenv("RESULT_CACHE_MAX_HOURS", "200000"))
+
+
+class HourlyResultCache:
+    """按 (namespace, 整点小时) 缓存的 LRU：只存放不会再变化的小时结果
+
+    namespace 由调用方组成，例如 ("city_energy", city_id, 元数据版本, station_status 水位)，版本或水位变化后旧条目不再命中，随 LRU 淘汰。
+    总条目数（小时数）超过 max_hours 时淘汰最久未使用的小时。
+    """
+
+    def __init__(self, max_hours: int):
+        self.max_hours = max_hours
+        self._entries: "OrderedDict[tuple, object]" = OrderedDict()
+
+    def get_range(self, namespace: Hashable, start_hour: datetime, end_hour: datetime) -> Dict[datetime, object]:
+        """返回 [start_hour, end_hour) 中已缓存的小时，key 为 UTC 整点"""
+        found = {}
+        hour = start_hour.astimezone(timezone.utc)
+        end_hour = end_hour.astimezone(timezone.utc)
+        while hour < end_hour:
+            key = (namespace, hour)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                found[hour] = self._entries[key]
+            hour += timedelta(hours=1)
+        return found
+
+    def first_missing(self, namespace: Hashable, start_hour: datetime, end_hour: datetime) -> datetime:
+        """[start_hour, end_hour) 中第一个未缓存的小时，全部命中时返回 end_hour"""
+        hour = start_hour
+        while hour < end_hour and (namespace, hour.astimezone(timezone.utc)) in self._entries:
+            hour += timedelta(hours=1)
+        return hour
+
+    def put_many(self, namespace: Hashable, values: Dict[datetime, object]):
+        for hour, value in values.items():
+            key = (namespace, hour.astimezone(timezone.utc))
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+        while len(self._entries) > self.max_hours:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+result_cache = HourlyResultCache(RESULT_CACHE_MAX_HOURS)
+
+
+def get_settled_hour(lag_hours: int = 0) -> datetime:
+    """早于返回值的整点小时已结束（再往前 lag_hours 小时），其结果可以缓存"""
+    return floor_hour(datetime.now(timezone.utc)) - timedelta(hours=lag_hours)
@@ -1,27 +1,57 @@
 from datetime import datetime
 
-from sqlalchemy import func, cast, Date
-from sqlalchemy.orm import Session
+from sqlalchemy import func, cast, Date, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from models import StationStatus
+from util.time_process import parse_datetime, to_naive_utc
 
 
-def get_by_station_id(station_id, db: Session):
-    station_statuses = db.query(
+def parse_status_cursor(after: str):
+    """解析分页游标 "<timestamp>,<id>"，返回 (UTC naive 时间, id)"""
+    timestamp, _, status_id = after.rpartition(",")
+    if not timestamp:
+        raise ValueError(f"Invalid cursor: {after}")
+    return to_naive_utc(parse_datetime(timestamp)), int(status_id)
+
+
+def format_status_cursor(timestamp, status_id) -> str:
+    return f"{timestamp.isoformat()},{status_id}"
+
+
+def station_status_history_query(station_id, after=None):
+    """按 (timestamp, id) 排序的轮询记录，after 为上一页最后一条的 (timestamp, id)"""
+    query = select(
         StationStatus.id,
         StationStatus.station_id,
         StationStatus.timestamp,
         StationStatus.status,
         StationStatus.last_updated,
     ).filter(StationStatus.station_id == station_id)
+    if after is not None:
+        after_timestamp, after_id = after
+        query = query.filter(
+            # 单独的范围条件让 (station_id, timestamp) 索引和分区裁剪生效
+            StationStatus.timestamp >= after_timestamp,
+            tuple_(StationStatus.timestamp, StationStatus.id) > tuple_(after_timestamp, after_id)
+        )
+    return query.order_by(StationStatus.timestamp, StationStatus.id)
+
+
+async def get_by_station_id(station_id, db: AsyncSession, after=None, limit=None):
+    query = station_status_history_query(station_id, after)
+    if limit is not None:
+        query = query.limit(limit)
+    result = await db.execute(query)
+    station_statuses = result.all()
     return station_statuses
 
-def get_by_station_id_and_date(station_id, date, db: Session):
+async def get_by_station_id_and_date(station_id, date, db: AsyncSession):
     if isinstance(date, str):
         date = datetime.strptime(date, "%Y-%m-%d").date()
 
     subquery = (
-        db.query(
+        select(
             StationStatus,
             func.rank().over(
                 partition_by=StationStatus.station_id,
@@ -36,7 +66,7 @@ def get_by_station_id_and_date(station_id, date, db: Session):
     )
 
     station_statuses = (
-        db.query(
+        select(
             subquery.c.id,
             subquery.c.station_id,
             subquery.c.timestamp,
@@ -46,4 +76,5 @@ def get_by_station_id_and_date(station_id, date, db: Session):
         .filter(subquery.c.rnk == 1)
     )
 
-    return station_statuses.first()
\ No newline at end of file
+    result = await db.execute(station_statuses)
+    return result.first()
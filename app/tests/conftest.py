@@ -0,0 +1,5 @@
+# app 内的模块以 app 为根导入（与 uvicorn main:app 一致）
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,325 @@
+"""charging_sessions_counts / city_energy 与原实现逐条记录循环的一致性
+
+原实现直接查询窗口内的 station_status：会话数为前一条记录不是 OCCUPIED 的 OCCUPIED 记录数，
+用电量按 (station_id, timestamp) 顺序遍历 OCCUPIED 记录重建会话（更换充电桩或间隔超过 3600 秒断开），
+再用 while 循环把每个会话按小时拆分；这里保留一份该循环作为基准。
+被测的一侧走生产代码：charging_sessions_compute 的 SQL（在 DuckDB 中执行）生成会话并按日导出为 Parquet，
+再由 graph.charging_sessions_counts / city_energy 经 parquet_store 查询，只替换了元数据和水位的读取。
+"""
+import asyncio
+import random
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+import duckdb
+import numpy as np
+import pytest
+
+from models.charging_sessions import SESSIONS_COMPUTE_FUNCTION
+from server import graph, parquet_store
+from server.charging_sessions import get_session_energy
+from server.metadata_cache import metadata_cache
+from server.result_cache import result_cache
+from util.time_process import floor_hour
+
+Poll = namedtuple("Poll", ["station_id", "timestamp", "status"])
+Station = namedtuple("Station", ["station_id"])
+
+CITY_ID = "dublin"
+STATUS_VERSION = 1
+
+
+def baseline_session_counts(polls, parsed_start, parsed_end):
+    """原 charging_sessions_counts：窗口内 prev_status != 'OCCUPIED' 且 status = 'OCCUPIED' 的记录按小时计数"""
+    window = sorted((p for p in polls if parsed_start <= p.timestamp.replace(tzinfo=timezone.utc) < parsed_end),
+                    key=lambda p: (p.station_id, p.timestamp))
+    hourly_counts = {}
+    for prev, poll in zip(window, window[1:]):
+        # 窗口内的第一条记录 prev_status 为 NULL，不计入
+        if prev.station_id == poll.station_id and prev.status != "OCCUPIED" and poll.status == "OCCUPIED":
+            hour = floor_hour(poll.timestamp.replace(tzinfo=timezone.utc))
+            hourly_counts[hour] = hourly_counts.get(hour, 0) + 1
+
+    sessions_list = []
+    current_hour = floor_hour(parsed_start)
+    end_hour = floor_hour(parsed_end)
+    while current_hour < end_hour:
+        sessions_list.append({"time": current_hour.isoformat(), "sessioncounts": hourly_counts.get(current_hour, 0)})
+        current_hour += timedelta(hours=1)
+    return sessions_list
+
+
+def baseline_hourly_energy(polls, station_power_map, parsed_start, parsed_end):
+    """原 city_energy 的会话重建与按小时拆分（只去掉了查询和结果格式化）"""
+    occupied_records = sorted(
+        (p for p in polls
+         if p.status == "OCCUPIED" and parsed_start <= p.timestamp.replace(tzinfo=timezone.utc) < parsed_end),
+        key=lambda p: (p.station_id, p.timestamp))
+    hourly_energy = {}
+
+    current_hour = parsed_start.replace(minute=0, second=0, microsecond=0)
+    end_hour = parsed_end.replace(minute=0, second=0, microsecond=0)
+    while current_hour <= end_hour:
+        hourly_energy[current_hour] = 0.0
+        current_hour += timedelta(hours=1)
+
+    session_start = None
+    for i in range(len(occupied_records)):
+        record = occupied_records[i]
+        station_id = record.station_id
+        timestamp = record.timestamp.replace(tzinfo=timezone.utc)
+        power = station_power_map.get(station_id, 0)
+        if power is None:
+            continue
+        if session_start is None:
+            session_start = timestamp
+        end_session = False
+        if i == len(occupied_records) - 1:
+            end_session = True
+        else:
+            next_record = occupied_records[i + 1]
+            time_diff = (next_record.timestamp - record.timestamp).total_seconds()
+            if next_record.station_id != station_id or time_diff > 3600:
+                end_session = True
+        if end_session:
+            session_end = timestamp
+            session_start = max(session_start, parsed_start)
+            session_end = min(session_end, parsed_end)
+            if session_start < session_end:
+                current_hour = session_start.replace(minute=0, second=0, microsecond=0)
+                end_hour = session_end.replace(minute=0, second=0, microsecond=0)
+                while current_hour <= end_hour:
+                    hour_start = max(session_start, current_hour)
+                    hour_end = min(session_end, current_hour + timedelta(hours=1))
+                    duration = (hour_end - hour_start).total_seconds() / 3600.0
+                    energy = duration * power
+                    if current_hour in hourly_energy:
+                        hourly_energy[current_hour] += energy
+                    else:
+                        hourly_energy[current_hour] = energy
+                    current_hour += timedelta(hours=1)
+            session_start = None
+
+    return hourly_energy
+
+
+def export_sessions(root, polls, station_power_map):
+    """用 charging_sessions_compute 的 SQL 从记录生成会话，按 export_parquet 的格式每天导出一个文件"""
+    body = SESSIONS_COMPUTE_FUNCTION.split("$$")[1]
+    first_day = min(p.timestamp for p in polls).replace(hour=0, minute=0, second=0, microsecond=0)
+    last_day = max(p.timestamp for p in polls) + timedelta(days=2)
+    with duckdb.connect() as conn:
+        conn.execute("CREATE TABLE station_status (station_id VARCHAR, timestamp TIMESTAMP, status VARCHAR)")
+        conn.execute("CREATE TABLE charging_stations (station_id VARCHAR, rated_power_kw DOUBLE)")
+        conn.executemany("INSERT INTO station_status VALUES (?, ?, ?)", [tuple(p) for p in polls])
+        conn.executemany("INSERT INTO charging_stations VALUES (?, ?)", list(station_power_map.items()))
+        conn.execute(f"CREATE MACRO charging_sessions_compute(lo, hi, ids) AS TABLE {body}")
+        conn.execute("""
+            CREATE TABLE charging_sessions AS
+            SELECT station_id, start_time, end_time
+              FROM charging_sessions_compute(?, ?, NULL)
+                   AS c(station_id, start_time, end_time, duration_seconds, energy_kwh, closed)
+        """, [first_day, last_day])
+        day = first_day
+        while day < last_day:
+            path = root / "charging_sessions" / f"date={day:%Y-%m-%d}"
+            path.mkdir(parents=True)
+            conn.execute(f"""
+                COPY (SELECT * FROM charging_sessions WHERE end_time >= ? AND start_time < ?
+                      ORDER BY station_id, start_time)
+                TO '{path / "data.parquet"}' (FORMAT parquet)
+            """, [day, day + timedelta(days=1)])
+            day += timedelta(days=1)
+
+
+@pytest.fixture
+def load_polls(tmp_path, monkeypatch):
+    """把记录导出为会话 Parquet，并让 graph 读取对应的充电桩和额定功率"""
+    def load(polls, station_power_map):
+        station_ids = sorted({p.station_id for p in polls})
+        export_sessions(tmp_path, polls, {station_id: station_power_map.get(station_id) for station_id in station_ids})
+
+        async def get_city_stations(city_id, db):
+            return tuple(Station(station_id) for station_id in station_ids)
+
+        async def get_station_power_map(db):
+            return station_power_map
+
+        async def get_watermark(source, db):
+            return STATUS_VERSION, None
+
+        monkeypatch.setattr(parquet_store, "PARQUET_ROOT", str(tmp_path))
+        monkeypatch.setattr(metadata_cache, "get_city_stations", get_city_stations)
+        monkeypatch.setattr(metadata_cache, "get_station_power_map", get_station_power_map)
+        monkeypatch.setattr(graph, "get_watermark", get_watermark)
+
+    result_cache.clear()
+    yield load
+    result_cache.clear()
+
+
+def fetch_counts(parsed_start, parsed_end):
+    result = asyncio.run(graph.charging_sessions_counts(
+        CITY_ID, parsed_start.isoformat(), parsed_end.isoformat(), None))
+    return result["charging_sessions"]["data"]
+
+
+def fetch_energy(parsed_start, parsed_end):
+    result = asyncio.run(graph.city_energy(CITY_ID, parsed_start.isoformat(), parsed_end.isoformat(), None))
+    return {datetime.fromisoformat(item["time"]): item["energy_kwh"] for item in result["energy_delivered"]["data"]}
+
+
+def assert_same_energy(expected: dict, actual: dict):
+    # 结果保留两位小数
+    assert sorted(actual) == sorted(expected)
+    hours = sorted(actual)
+    np.testing.assert_allclose([actual[h] for h in hours], [expected[h] for h in hours], rtol=0, atol=0.0051)
+
+
+def random_polls(rng: random.Random, parsed_start, parsed_end, station_ids):
+    """每个充电桩交替的空闲段和占用段，占用段内间隔混合 5 分钟、接近 1 小时和恰好 1 小时
+
+    空闲段超过 1 小时，窗口内的第一条记录为 AVAILABLE，此时原实现与会话表的断开规则一致；
+    start_time 所在整点小时内、start_time 之前还有一段以 AVAILABLE 结束的记录，只有生产代码能看到
+    """
+    polls = []
+    for station_id in station_ids:
+        for t, end in ((floor_hour(parsed_start) - timedelta(hours=2), parsed_start - timedelta(seconds=60)),
+                       (parsed_start + timedelta(seconds=rng.uniform(0, 600)), parsed_end)):
+            occupied = False
+            while t < end:
+                if occupied:
+                    for _ in range(rng.randint(1, 12)):
+                        polls.append(Poll(station_id, t.replace(tzinfo=None), "OCCUPIED"))
+                        t += timedelta(seconds=rng.choice([300, 300, 600, 1800, 3599, 3600]))
+                        if t >= end:
+                            break
+                else:
+                    idle_end = t + timedelta(seconds=rng.uniform(3601, 3 * 3600))
+                    while t < min(idle_end, end):
+                        polls.append(Poll(station_id, t.replace(tzinfo=None), "AVAILABLE"))
+                        t += timedelta(seconds=rng.choice([300, 600, 1800]))
+                occupied = not occupied
+        polls.append(Poll(station_id, (parsed_start - timedelta(seconds=60)).replace(tzinfo=None), "AVAILABLE"))
+    return polls
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_matches_baseline_loop(seed, load_polls):
+    rng = random.Random(seed)
+    parsed_start = datetime(2025, 3, 1, tzinfo=timezone.utc) + timedelta(seconds=rng.randrange(0, 86400))
+    if seed % 5 == 0:
+        parsed_start = floor_hour(parsed_start)
+    parsed_end = parsed_start + timedelta(seconds=rng.randrange(3600, 3 * 86400))
+    station_ids = [f"s{i}" for i in range(rng.randint(1, 8))]
+    # 额定功率为空的充电桩不计入；未登记功率的充电桩（map 中没有）同样为 0
+    station_power_map = {station_id: rng.choice([None, 3.7, 7.0, 22.0, 50.0]) for station_id in station_ids[1:]}
+    polls = random_polls(rng, parsed_start, parsed_end, station_ids)
+    load_polls(polls, station_power_map)
+
+    # 第二次调用读取缓存
+    for _ in range(2):
+        assert fetch_counts(parsed_start, parsed_end) == baseline_session_counts(polls, parsed_start, parsed_end)
+        assert_same_energy(baseline_hourly_energy(polls, station_power_map, parsed_start, parsed_end),
+                           fetch_energy(parsed_start, parsed_end))
+
+    # 再从整点开始查询：开头不完整的小时不能来自缓存，结果与清空缓存后相同
+    start_hour = floor_hour(parsed_start)
+    counts, energy = fetch_counts(start_hour, parsed_end), fetch_energy(start_hour, parsed_end)
+    result_cache.clear()
+    assert counts == fetch_counts(start_hour, parsed_end)
+    assert energy == fetch_energy(start_hour, parsed_end)
+
+
+def test_edge_cases(load_polls):
+    parsed_start = datetime(2025, 3, 1, 10, 20, tzinfo=timezone.utc)
+    parsed_end = datetime(2025, 3, 1, 18, 40, tzinfo=timezone.utc)
+    base = parsed_start.replace(tzinfo=None)
+    polls = [
+        # start_time 之前已结束的会话：不计入会话数和用电量
+        Poll("d", base - timedelta(minutes=20), "OCCUPIED"),
+        Poll("d", base - timedelta(minutes=5), "OCCUPIED"),
+        Poll("d", base - timedelta(minutes=2), "AVAILABLE"),
+        Poll("d", base + timedelta(minutes=10), "AVAILABLE"),
+        Poll("d", base + timedelta(minutes=20), "OCCUPIED"),
+        Poll("d", base + timedelta(minutes=30), "OCCUPIED"),
+        Poll("d", base + timedelta(minutes=31), "AVAILABLE"),
+        # 跨 4 个整点小时，间隔恰好 3600 秒：同一会话
+        Poll("a", base, "AVAILABLE"),
+        Poll("a", base + timedelta(minutes=5), "OCCUPIED"),
+        Poll("a", base + timedelta(minutes=65), "OCCUPIED"),
+        Poll("a", base + timedelta(minutes=125), "OCCUPIED"),
+        Poll("a", base + timedelta(minutes=185), "OCCUPIED"),
+        # 间隔超过 3600 秒：新会话，只有一条记录，时长为 0（原实现的会话数不计入，前一条记录也是 OCCUPIED）
+        Poll("a", base + timedelta(minutes=185, seconds=3601), "OCCUPIED"),
+        Poll("a", base + timedelta(minutes=300), "AVAILABLE"),
+        Poll("a", base + timedelta(minutes=310), "OCCUPIED"),
+        Poll("a", base + timedelta(minutes=370), "OCCUPIED"),
+        # 更换充电桩：即使时间连续也断开
+        Poll("b", base + timedelta(minutes=1), "AVAILABLE"),
+        Poll("b", base + timedelta(minutes=371), "OCCUPIED"),
+        Poll("b", base + timedelta(minutes=400), "OCCUPIED"),
+        # 额定功率为空；间隔超过 3600 秒的第二个会话同样不计入原实现的会话数
+        Poll("c", base + timedelta(minutes=1), "AVAILABLE"),
+        Poll("c", base + timedelta(minutes=10), "OCCUPIED"),
+        Poll("c", base + timedelta(minutes=200), "OCCUPIED"),
+        Poll("c", base + timedelta(minutes=230), "OCCUPIED"),
+    ]
+    station_power_map = {"a": 7.0, "b": 22.0, "c": None, "d": 11.0}
+    load_polls(polls, station_power_map)
+
+    counts = {item["time"][11:13]: item["sessioncounts"] for item in fetch_counts(parsed_start, parsed_end)}
+    baseline = {item["time"][11:13]: item["sessioncounts"]
+                for item in baseline_session_counts(polls, parsed_start, parsed_end)}
+    assert {hour: count for hour, count in counts.items() if count} == {"10": 3, "13": 1, "14": 1, "15": 1, "16": 1}
+    assert {hour: count for hour, count in baseline.items() if count} == {"10": 3, "15": 1, "16": 1}
+
+    actual = fetch_energy(parsed_start, parsed_end)
+    assert_same_energy(baseline_hourly_energy(polls, station_power_map, parsed_start, parsed_end), actual)
+    assert sum(actual.values()) == pytest.approx(7.0 * (180 + 60) / 60 + 22.0 * 29 / 60 + 11.0 * 10 / 60, abs=0.05)
+
+
+def test_session_crossing_start_time(load_polls):
+    """start_time 之前开始的会话：会话数不计入，用电量从 start_time 算起，开头不完整的小时不缓存"""
+    parsed_start = datetime(2025, 3, 1, 10, 20, tzinfo=timezone.utc)
+    parsed_end = datetime(2025, 3, 1, 13, 0, tzinfo=timezone.utc)
+    base = parsed_start.replace(tzinfo=None)
+    polls = [
+        Poll("a", base - timedelta(minutes=15), "AVAILABLE"),
+        Poll("a", base - timedelta(minutes=10), "OCCUPIED"),
+        Poll("a", base + timedelta(minutes=30), "OCCUPIED"),
+        Poll("a", base + timedelta(minutes=70), "OCCUPIED"),
+        Poll("a", base + timedelta(minutes=80), "AVAILABLE"),
+    ]
+    load_polls(polls, {"a": 6.0})
+    hour = floor_hour(parsed_start)
+
+    for _ in range(2):
+        assert [item["sessioncounts"] for item in fetch_counts(parsed_start, parsed_end)] == [0, 0, 0]
+        assert fetch_energy(parsed_start, parsed_end) == {
+            hour: 4.0, hour + timedelta(hours=1): 3.0, hour + timedelta(hours=2): 0.0, parsed_end: 0.0
+        }
+    for name in ("charging_sessions_counts", "city_energy"):
+        namespace = (name, CITY_ID, metadata_cache.version, STATUS_VERSION)
+        assert result_cache.get_range(namespace, hour, hour + timedelta(hours=1)) == {}
+
+    assert [item["sessioncounts"] for item in fetch_counts(hour, parsed_end)] == [1, 0, 0]
+    assert fetch_energy(hour, parsed_end)[hour] == 5.0
+
+
+def test_finer_buckets_sum_to_hours(load_polls):
+    rng = random.Random(7)
+    parsed_start = datetime(2025, 3, 1, tzinfo=timezone.utc)
+    parsed_end = parsed_start + timedelta(days=2)
+    station_ids = ["a", "b", "c"]
+    station_power_map = {"a": 7.0, "b": None, "c": 50.0}
+    load_polls(random_polls(rng, parsed_start, parsed_end, station_ids), station_power_map)
+
+    def bucket_energy(step, bucket_count):
+        energy = asyncio.run(get_session_energy(station_ids, station_power_map, parsed_start, parsed_end, step, None))
+        return np.array([energy.get(parsed_start + i * step, 0.0) for i in range(bucket_count)])
+
+    hourly = bucket_energy(timedelta(hours=1), 48)
+    quarter = bucket_energy(timedelta(minutes=15), 48 * 4)
+    assert hourly.sum() > 0
+    np.testing.assert_allclose(quarter.reshape(48, 4).sum(axis=1), hourly, rtol=1e-9, atol=1e-9)
@@ -0,0 +1,43 @@
+from datetime import datetime
+from typing import List, Optional
+
+# 时间序列中每个点的时间字段名
+SERIES_TIME_KEYS = ("time", "timestamp")
+
+
+def to_columnar(value):
+    """把结果中所有时间序列（带 time / timestamp 字段的 dict 列表）转换为列式
+
+    等间隔的序列写成 {"start", "step_seconds", 各值数组}，否则保留时间数组 {"time": [...], 各值数组}
+    """
+    if isinstance(value, dict):
+        return {key: to_columnar(item) for key, item in value.items()}
+    if isinstance(value, list) and value and all(isinstance(item, dict) for item in value):
+        time_key = next((key for key in SERIES_TIME_KEYS if key in value[0]), None)
+        if time_key is not None:
+            return columnar_series(value, time_key)
+        return [to_columnar(item) for item in value]
+    return value
+
+
+def columnar_series(points: List[dict], time_key: str) -> dict:
+    times = [point[time_key] for point in points]
+    columns = {
+        key: [point.get(key) for point in points]
+        for key in points[0] if key != time_key
+    }
+    step = get_regular_step(times)
+    if step is None:
+        return {time_key: times, **columns}
+    return {"start": times[0], "step_seconds": step, **columns}
+
+
+def get_regular_step(times: List[str]) -> Optional[int]:
+    """时间点等间隔时返回间隔秒数，否则返回 None（少于两个点也返回 None）"""
+    if len(times) < 2:
+        return None
+    parsed = [datetime.fromisoformat(time) for time in times]
+    step = parsed[1] - parsed[0]
+    if step.total_seconds() <= 0 or any(b - a != step for a, b in zip(parsed, parsed[1:])):
+        return None
+    return int(step.total_seconds())
@@ -0,0 +1,15 @@
+from typing import Tuple
+
+from shapely import wkb
+from shapely.errors import ShapelyError
+
+
+def parse_ewkb_point(ewkb_hex: str) -> Tuple[float, float]:
+    """解析十六进制 (E)WKB 点，返回 (lon, lat)，不需要访问数据库"""
+    try:
+        point = wkb.loads(ewkb_hex, hex=True)
+    except (ShapelyError, ValueError, TypeError) as e:
+        raise ValueError(f"Invalid EWKB point: {ewkb_hex}") from e
+    if point.geom_type != "Point" or point.is_empty:
+        raise ValueError(f"EWKB geometry is not a point: {ewkb_hex}")
+    return point.x, point.y
@@ -0,0 +1,11 @@
+import os
+
+# 分页接口默认每页条数和上限
+PAGE_LIMIT_DEFAULT = int(os.getenv("PAGE_LIMIT_DEFAULT", "1000"))
+PAGE_LIMIT_MAX = int(os.getenv("PAGE_LIMIT_MAX", "10000"))
+
+
+def page_result(items: list, limit: int, cursor_of) -> dict:
+    """一页结果：取满 limit 条时 next_after 为最后一条的游标，否则为 None（已到末尾）"""
+    next_after = cursor_of(items[-1]) if items and len(items) >= limit else None
+    return {"items": items, "next_after": next_after}
@@ -1,31 +1,108 @@
+import os
+from contextvars import ContextVar
 from typing import Generic, TypeVar, Optional
 
+import msgpack
+import orjson
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
 from pydantic.generics import GenericModel
+from starlette.responses import JSONResponse, Response as StarletteResponse
+
+from util.columnar import to_columnar
 
 T = TypeVar("T")
 
+# 开启后 Response.* 直接用 orjson 写出 {code, message, data}，不经过 StandardResponse 的校验和重新编码
+FAST_JSON_RESPONSE = os.getenv("FAST_JSON_RESPONSE", "false").lower() in ("1", "true", "yes")
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+# 时间序列接口可通过 Accept 协商的列式格式
+COLUMNAR_JSON_MEDIA_TYPE = "application/vnd.columnar+json"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+# 当前请求要加的 ETag / Cache-Control（由 conditional_get 设置，与 request.state.cache_headers 是同一个 dict）；
+# 接口返回错误信封时清空，HTTP 状态码仍为 200 的错误也不会被缓存
+cache_headers: ContextVar[Optional[dict]] = ContextVar("cache_headers", default=None)
+
+
 class StandardResponse(GenericModel, Generic[T]):
     code: int
     message: str
     data: Optional[T] = None
 
+
+class FastJSONResponse(JSONResponse):
+    """用 orjson 编码的 JSONResponse：datetime / numpy 原生编码，其余类型（如 Row）交给 jsonable_encoder"""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=jsonable_encoder, option=ORJSON_OPTIONS)
+
+
+class MsgpackResponse(StarletteResponse):
+    media_type = MSGPACK_MEDIA_TYPES[0]
+
+    def render(self, content) -> bytes:
+        return msgpack.packb(content, default=jsonable_encoder)
+
+
+def negotiate_series_format(request: Request) -> str:
+    """按 Accept 中媒体类型的先后顺序选择 json / columnar / msgpack（不处理 q 值），默认 json"""
+    for media_type in request.headers.get("accept", "").split(","):
+        media_type = media_type.split(";")[0].strip().lower()
+        if media_type in MSGPACK_MEDIA_TYPES:
+            return "msgpack"
+        if media_type == COLUMNAR_JSON_MEDIA_TYPE:
+            return "columnar"
+        if media_type in ("application/json", "application/*", "*/*"):
+            return "json"
+    return "json"
+
+
+def build_response(code: int, message: str, data=None):
+    if code != 200:
+        headers = cache_headers.get()
+        if headers:
+            headers.clear()
+    if FAST_JSON_RESPONSE:
+        return FastJSONResponse({"code": code, "message": message, "data": data})
+    return StandardResponse(code=code, message=message, data=data)
+
+
+def to_json_response(response, status_code: int = 200):
+    """错误处理中使用：把 Response.* 的返回值转换为 starlette Response"""
+    if isinstance(response, JSONResponse):
+        response.status_code = status_code
+        return response
+    return JSONResponse(status_code=status_code, content=response.dict())
+
+
 class Response:
     @staticmethod
     def ok(data=None, message: str = "OK"):
-        return StandardResponse(code=200, message=message, data=data)
+        return build_response(200, message, data)
+
+    @staticmethod
+    def columnar(data, response_format: str = "columnar", message: str = "OK"):
+        """时间序列转换为列式后返回，response_format 为 columnar（JSON）或 msgpack"""
+        content = {"code": 200, "message": message, "data": to_columnar(data)}
+        if response_format == "msgpack":
+            return MsgpackResponse(content)
+        return FastJSONResponse(content, media_type=COLUMNAR_JSON_MEDIA_TYPE)
 
     @staticmethod
     def not_found(message: str = "Not Found"):
-        return StandardResponse(code=404, message=message, data=None)
+        return build_response(404, message)
 
     @staticmethod
     def forbidden(message: str = "Forbidden"):
-        return StandardResponse(code=403, message=message, data=None)
+        return build_response(403, message)
 
     @staticmethod
     def bad_request(message: str = "Bad Request"):
-        return StandardResponse(code=400, message=message, data=None)
+        return build_response(400, message)
 
     @staticmethod
     def server_error(message: str = "Internal Server Error"):
-        return StandardResponse(code=500, message=message, data=None)
+        return build_response(500, message)
@@ -0,0 +1,87 @@
+import csv
+import io
+import os
+from datetime import datetime
+from typing import Callable
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import StreamingResponse
+
+from database import SessionLocal
+
+# 服务端游标每批读取的行数
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "2000"))
+
+STREAM_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (list, tuple)):
+        return " ".join(str(item) for item in value)
+    return value
+
+
+def encode_ndjson(records) -> bytes:
+    return b"".join(orjson.dumps(record, default=jsonable_encoder) + b"\n" for record in records)
+
+
+def encode_csv(records, header: bool) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header and records:
+        writer.writerow(records[0].keys())
+    writer.writerows([csv_value(value) for value in record.values()] for record in records)
+    return buffer.getvalue().encode()
+
+
+async def iter_batches(query, serialize: Callable):
+    """通过服务端游标（yield_per）逐批读取 query，每批为 serialize 后的记录列表
+
+    FastAPI 在响应体发送前就会关闭 get_db 的会话，因此这里单独开一个会话
+    """
+    async with SessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=STREAM_BATCH_SIZE))
+        async for rows in result.partitions():
+            yield [serialize(row) for row in rows]
+
+
+def stream_query(query, serialize: Callable, fmt: str, filename: str) -> StreamingResponse:
+    """逐批读取 query，按 NDJSON / CSV 写出，内存占用与结果行数无关"""
+    async def body():
+        first = True
+        async for records in iter_batches(query, serialize):
+            if fmt == "csv":
+                yield encode_csv(records, header=first)
+            else:
+                yield encode_ndjson(records)
+            first = False
+
+    return StreamingResponse(
+        body(),
+        media_type=STREAM_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'},
+    )
+
+
+def stream_json_list(query, serialize: Callable) -> StreamingResponse:
+    """与 Response.ok(list) 相同的 {code, message, data: [...]}，data 逐批写出，内存占用与结果行数无关"""
+    async def body():
+        yield b'{"code":200,"message":"OK","data":['
+        first = True
+        async for records in iter_batches(query, serialize):
+            if not records:
+                continue
+            chunk = b",".join(orjson.dumps(record, default=jsonable_encoder) for record in records)
+            yield chunk if first else b"," + chunk
+            first = False
+        yield b"]}"
+
+    return StreamingResponse(body(), media_type="application/json")
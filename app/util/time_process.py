@@ -45,4 +45,14 @@ def process_start_end_time(start_time, end_time):
         parsed_start = parsed_start.replace(tzinfo=timezone.utc)
     if parsed_end.tzinfo is None:
         parsed_end = parsed_end.replace(tzinfo=timezone.utc)
-    return parsed_start, parsed_end
\ No newline at end of file
+    return parsed_start, parsed_end
+
+def to_naive_utc(dt: datetime) -> datetime:
+    # 数据库中的 TIMESTAMP 字段存储的是 UTC naive 时间
+    if dt.tzinfo is None:
+        return dt
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def floor_hour(dt: datetime) -> datetime:
+    return dt.replace(minute=0, second=0, microsecond=0)
@@ -0,0 +1,224 @@
+"""对 app/routers 下的接口压测：窗口大小 × 并发数矩阵，输出 p50/p95/p99 延迟、吞吐量和扫描行数
+
+usage: python benchmarks/bench_endpoints.py [--base-url http://localhost:8000] [--windows 1d,7d,30d]
+                                            [--concurrency 1,8,32] [--requests 50] [--only graph]
+                                            [--save-baseline NAME] [--compare NAME] [--threshold 0.2]
+
+数据由 benchmarks/synthetic_data.py 生成，连接配置同应用（DB_NAME 默认 ev_bench）。
+不给 --base-url 时在进程内通过 ASGI 调用应用，此时每个场景结束后关闭连接池，
+从 pg_stat_user_tables 读出该场景扫描的行数（seq_tup_read + idx_tup_fetch）。
+基线保存在 benchmarks/baselines/NAME.json；--compare 时 p95 比基线慢 threshold 以上记为回退，退出码为 1。
+"""
+import argparse
+import asyncio
+import json
+import os
+import struct
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), "app"))
+for key, value in (("DB_HOST", "localhost"), ("DB_PORT", "5432"), ("DB_USER", "postgres"), ("DB_PASS", ""),
+                   ("DB_NAME", "ev_bench")):
+    os.environ.setdefault(key, value)
+
+import httpx
+import numpy as np
+from sqlalchemy import text
+
+import database
+
+BASELINE_DIR = os.path.join(BENCH_DIR, "baselines")
+
+WINDOWS = {"1h": timedelta(hours=1), "1d": timedelta(days=1), "7d": timedelta(days=7),
+           "30d": timedelta(days=30), "365d": timedelta(days=365)}
+
+ROWS_SCANNED_SQL = "SELECT coalesce(sum(seq_tup_read), 0) + coalesce(sum(idx_tup_fetch), 0) FROM pg_stat_user_tables"
+
+
+def ewkb_point(lon: float, lat: float) -> str:
+    # cus_map 的角点参数：SRID=4326 的 EWKB 点（小端）
+    return "0101000020E6100000" + struct.pack("<dd", lon, lat).hex()
+
+
+def fmt_time(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%MZ")
+
+
+# (名称, 路径, 参数函数)；参数函数为 fn(ctx) 的接口与窗口无关，fn(ctx, start, end) 的接口按窗口测
+ENDPOINTS = [
+    ("cities_all", "/cities/all", lambda ctx: {}),
+    ("charging_station", "/charging_stations/get_by_station_id", lambda ctx: {"station_id": ctx["station_id"]}),
+    ("city_stations", "/charging_stations/get_by_city_id", lambda ctx: {"city_id": ctx["city_id"]}),
+    ("station_status_page", "/station_status/get_by_station_id", lambda ctx: {"station_id": ctx["station_id"]}),
+    ("whole_country_map", "/map/get_whole_country_map", lambda ctx: {}),
+    ("city_map", "/map/get_map_by_city_and_time",
+     lambda ctx: {"city_id": ctx["city_id"], "datetime": fmt_time(ctx["end"])}),
+    ("cus_map", "/map/cus_map", lambda ctx: {
+        "city_id": ctx["city_id"], "datetime": fmt_time(ctx["end"]),
+        "location1": ewkb_point(ctx["lon"] - 0.05, ctx["lat"] - 0.05),
+        "location2": ewkb_point(ctx["lon"] + 0.05, ctx["lat"] + 0.05),
+    }),
+    ("charging_sessions_counts", "/graph/charging_sessions_counts",
+     lambda ctx, start, end: {"city_id": ctx["city_id"], "start_time": fmt_time(start), "end_time": fmt_time(end)}),
+    ("city_energy", "/graph/city_energy",
+     lambda ctx, start, end: {"city_id": ctx["city_id"], "start_time": fmt_time(start), "end_time": fmt_time(end)}),
+    ("grid_energy", "/graph/grid_energy",
+     lambda ctx, start, end: {"start_time": fmt_time(start), "end_time": fmt_time(end)}),
+    ("station_utilisation", "/graph/station_utilisation",
+     lambda ctx, start, end: {"city_id": ctx["city_id"], "start_time": fmt_time(start), "end_time": fmt_time(end),
+                              "compact": "true"}),
+    ("batch_overview", "/graph/batch/overview",
+     lambda ctx, start, end: {"city_ids": "all", "start_time": fmt_time(start), "end_time": fmt_time(end),
+                              "compact": "true"}),
+]
+
+
+async def load_context() -> dict:
+    """选一个充电桩最多的合成城市，窗口以最新一条轮询记录为终点"""
+    async with database.engine.connect() as conn:
+        city_id, lon, lat = (await conn.execute(text("""
+            SELECT c.city_id, ST_X(c.center), ST_Y(c.center)
+              FROM cities c JOIN charging_stations s ON s.city_id = c.city_id
+             WHERE c.city_id LIKE 'bench-%'
+             GROUP BY c.city_id ORDER BY count(*) DESC, c.city_id LIMIT 1
+        """))).one()
+        station_id = (await conn.execute(
+            text("SELECT min(station_id) FROM charging_stations WHERE city_id = :city_id"), {"city_id": city_id}
+        )).scalar()
+        end = (await conn.execute(text("SELECT max(timestamp) FROM station_status"))).scalar()
+    await database.engine.dispose()
+    if end is None:
+        raise SystemExit("no station_status rows, run benchmarks/synthetic_data.py first")
+    return {"city_id": city_id, "station_id": station_id, "lon": lon, "lat": lat, "end": end}
+
+
+async def rows_scanned():
+    # 关闭连接池，让服务端连接退出时把统计写入共享内存
+    await database.engine.dispose()
+    async with database.engine.connect() as conn:
+        value = (await conn.execute(text(ROWS_SCANNED_SQL))).scalar()
+    await database.engine.dispose()
+    return int(value)
+
+
+async def run_scenario(client: httpx.AsyncClient, path: str, params: dict, concurrency: int, requests: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.get(path, params=params)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200 or response.json().get("code", 200) != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+    return {"p50_ms": round(p50, 2), "p95_ms": round(p95, 2), "p99_ms": round(p99, 2),
+            "rps": round(requests / elapsed, 2), "errors": errors}
+
+
+def scenario_key(result: dict) -> tuple:
+    return result["endpoint"], result["window"], result["concurrency"]
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: list, baseline: dict, threshold: float) -> int:
+    base = {scenario_key(result): result for result in baseline["results"]}
+    regressions = 0
+    print(f"\ncompared with baseline {baseline['meta'].get('name')} ({baseline['meta'].get('revision')})")
+    for result in results:
+        old = base.get(scenario_key(result))
+        if old is None:
+            continue
+        change = result["p95_ms"] / old["p95_ms"] - 1 if old["p95_ms"] else 0.0
+        regressed = change > threshold
+        regressions += regressed
+        print(f"  {'REGRESSION' if regressed else 'ok':<10} {result['endpoint']:<26} {result['window']:>5} "
+              f"c={result['concurrency']:<3} p95 {old['p95_ms']:9.1f} -> {result['p95_ms']:9.1f} ms ({change:+.0%})")
+    return regressions
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="endpoint latency benchmark")
+    parser.add_argument("--base-url", default=None, help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--windows", default="1d,7d,30d")
+    parser.add_argument("--concurrency", default="1,8,32")
+    parser.add_argument("--requests", type=int, default=50, help="requests per scenario")
+    parser.add_argument("--warmup", type=int, default=2, help="untimed requests before each scenario")
+    parser.add_argument("--only", default=None, help="only endpoints whose name or path contains this string")
+    parser.add_argument("--save-baseline", default=None)
+    parser.add_argument("--compare", default=None)
+    parser.add_argument("--threshold", type=float, default=0.2, help="p95 slowdown counted as a regression")
+    args = parser.parse_args()
+
+    windows = [window for window in args.windows.split(",") if window]
+    concurrency_levels = [int(level) for level in args.concurrency.split(",") if level]
+    ctx = await load_context()
+
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=300)
+    else:
+        import main as app_main
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app_main.app), base_url="http://bench",
+                                   timeout=300)
+
+    results = []
+    print(f"{'endpoint':<26} {'window':>6} {'conc':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'req/s':>8} {'rows/req':>10}")
+    async with client:
+        for name, path, build_params in ENDPOINTS:
+            if args.only and args.only not in name and args.only not in path:
+                continue
+            windowed = build_params.__code__.co_argcount == 3
+            for window in (windows if windowed else ["-"]):
+                params = (build_params(ctx, ctx["end"] - WINDOWS[window], ctx["end"]) if windowed
+                          else build_params(ctx))
+                for concurrency in concurrency_levels:
+                    for _ in range(args.warmup):
+                        await client.get(path, params=params)
+                    before = None if args.base_url else await rows_scanned()
+                    result = await run_scenario(client, path, params, concurrency, args.requests)
+                    after = None if args.base_url else await rows_scanned()
+                    rows = None if before is None else round((after - before) / args.requests)
+                    result = {"endpoint": name, "window": window, "concurrency": concurrency, **result,
+                              "rows_per_request": rows}
+                    results.append(result)
+                    print(f"{name:<26} {window:>6} {concurrency:>4} {result['p50_ms']:9.1f} {result['p95_ms']:9.1f} "
+                          f"{result['p99_ms']:9.1f} {result['rps']:8.1f} {rows if rows is not None else '-':>10}"
+                          + (f"  ({result['errors']} errors)" if result["errors"] else ""))
+
+    meta = {"name": args.save_baseline, "revision": git_revision(), "created_at": datetime.now().isoformat(),
+            "requests": args.requests, "in_process": args.base_url is None}
+
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, f"{args.save_baseline}.json")
+        with open(path, "w") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+        print(f"\nbaseline saved to {path}")
+
+    if args.compare:
+        with open(os.path.join(BASELINE_DIR, f"{args.compare}.json")) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
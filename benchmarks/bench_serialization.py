@@ -0,0 +1,74 @@
+"""比较 StandardResponse 与 FAST_JSON_RESPONSE（orjson）两种响应路径的序列化耗时
+
+usage: python benchmarks/bench_serialization.py [--stations 300] [--days 31] [--repeat 5]
+
+用 station_utilisation 的结构构造一个月的合成数据，经过完整的 FastAPI 请求流程计时，不需要数据库。
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+# database.py 导入时会创建引擎（不会连接），给出占位配置
+for key, value in (("DB_HOST", "localhost"), ("DB_PORT", "5432"), ("DB_USER", "bench"), ("DB_PASS", ""), ("DB_NAME", "bench")):
+    os.environ.setdefault(key, value)
+
+import numpy as np
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import util.response as response
+from server.graph import format_utilisation_result
+
+
+def build_payload(station_count: int, days: int, compact: bool) -> dict:
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    hours = [start + timedelta(hours=i) for i in range(days * 24)]
+    station_ids = [f"station-{i}" for i in range(station_count)]
+    names = {station_id: f"Station {station_id}" for station_id in station_ids}
+    utilisation = np.random.default_rng(0).random((station_count, len(hours))).round(4)
+    return format_utilisation_result(start.isoformat(), start, hours, station_ids, names, utilisation, compact)
+
+
+def measure(client: TestClient, fast: bool, repeat: int):
+    response.FAST_JSON_RESPONSE = fast
+    timings = []
+    size = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        r = client.get("/payload")
+        timings.append(time.perf_counter() - started)
+        size = len(r.content)
+    return statistics.median(timings), min(timings), size, r.json()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="StandardResponse vs orjson serialization benchmark")
+    parser.add_argument("--stations", type=int, default=300)
+    parser.add_argument("--days", type=int, default=31)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for compact in (False, True):
+        payload = build_payload(args.stations, args.days, compact)
+        app = FastAPI()
+        app.get("/payload")(lambda: response.Response.ok(payload))
+        client = TestClient(app)
+
+        standard = measure(client, False, args.repeat)
+        fast = measure(client, True, args.repeat)
+        assert standard[3] == fast[3], "fast path output differs from StandardResponse"
+
+        label = "compact" if compact else "default"
+        print(f"station_utilisation {label}: {args.stations} stations x {args.days * 24} hours, "
+              f"{standard[2] / 1e6:.1f} MB")
+        for name, (median, best, _, _) in (("StandardResponse", standard), ("orjson", fast)):
+            print(f"  {name:<17} median {median * 1000:8.1f} ms   min {best * 1000:8.1f} ms")
+        print(f"  speedup           {standard[0] / fast[0]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""生成压测用的合成数据：城市、充电桩、station_status 轮询记录和 grid_metrics
+
+usage: python benchmarks/synthetic_data.py [--create-db] [--cities 10] [--stations 5000] [--days 365]
+                                           [--poll-minutes 5] [--end 2025-07-01] [--seed 0] [--reset]
+
+连接配置与应用相同（DB_HOST / DB_PORT / DB_USER / DB_PASS / DB_NAME，DB_NAME 默认 ev_bench），
+建议使用单独的库。表结构由 alembic 迁移创建；合成数据的 id 都以 bench- 开头。
+轮询状态由 (充电桩, 30 分钟时段, seed) 的哈希决定，相同参数生成的数据完全相同。
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+for key, value in (("DB_HOST", "localhost"), ("DB_PORT", "5432"), ("DB_USER", "postgres"), ("DB_PASS", ""),
+                   ("DB_NAME", "ev_bench")):
+    os.environ.setdefault(key, value)
+
+import psycopg2
+from sqlalchemy import create_engine, text
+
+from database import DB_HOST, DB_PORT, DB_USER, DB_PASS, DB_NAME, upgrade_database
+from models.station_status import ENSURE_FUTURE_PARTITIONS
+
+# 合成城市的中心点散布在爱尔兰范围内，充电桩距中心不超过 CITY_RADIUS_DEG
+IRELAND_BBOX = (-10.0, 51.5, -6.0, 55.3)
+CITY_RADIUS_DEG = 0.15
+
+# 每个 30 分钟时段的状态：哈希值 mod 10，0-3 占用，4-8 空闲，9 离线
+STATUS_SQL = """
+INSERT INTO station_status (station_id, timestamp, status, last_updated)
+SELECT s.station_id,
+       t.ts,
+       CASE
+           WHEN mod(abs(hashtext(s.station_id || ':' || floor(extract(epoch FROM t.ts) / 1800)::bigint || ':' || %(seed)s)), 10) < 4
+               THEN 'OCCUPIED'
+           WHEN mod(abs(hashtext(s.station_id || ':' || floor(extract(epoch FROM t.ts) / 1800)::bigint || ':' || %(seed)s)), 10) < 9
+               THEN 'AVAILABLE'
+           ELSE 'OFFLINE'
+       END,
+       t.ts
+  FROM charging_stations s
+ CROSS JOIN generate_series(%(lo)s::timestamp, %(hi)s::timestamp - interval '1 second', %(step)s::interval) AS t(ts)
+ WHERE s.station_id LIKE 'bench-%%'
+ON CONFLICT DO NOTHING
+"""
+
+# generation / load 带日周期的正弦曲线
+GRID_SQL = """
+INSERT INTO grid_metrics (timestamp, metric_type, value_mw)
+SELECT t.ts, m.metric_type,
+       m.base + m.amplitude * sin(2 * pi() * extract(epoch FROM t.ts) / 86400)
+  FROM generate_series(%(lo)s::timestamp, %(hi)s::timestamp - interval '1 second', %(step)s::interval) AS t(ts)
+ CROSS JOIN (VALUES ('generation', 4200.0, 900.0), ('load', 3900.0, 1100.0)) AS m(metric_type, base, amplitude)
+ON CONFLICT (timestamp, metric_type) DO NOTHING
+"""
+
+# 不带参数执行，% 不需要转义
+RESET_SQL = (
+    "DELETE FROM station_status WHERE station_id LIKE 'bench-%'",
+    "DELETE FROM station_status_hourly WHERE station_id LIKE 'bench-%'",
+    "DELETE FROM station_current_status WHERE station_id LIKE 'bench-%'",
+    "DELETE FROM charging_sessions WHERE station_id LIKE 'bench-%'",
+    "DELETE FROM charging_stations WHERE station_id LIKE 'bench-%'",
+    "DELETE FROM cities WHERE city_id LIKE 'bench-%'",
+)
+
+
+def connect(dbname: str = DB_NAME):
+    return psycopg2.connect(host=DB_HOST, port=DB_PORT, user=DB_USER, password=DB_PASS, dbname=dbname)
+
+
+def create_database():
+    conn = connect("postgres")
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (DB_NAME,))
+    if cur.fetchone() is None:
+        cur.execute(f'CREATE DATABASE "{DB_NAME}"')
+        print(f"created database {DB_NAME}")
+    conn.close()
+
+    conn = connect()
+    conn.autocommit = True
+    conn.cursor().execute("CREATE EXTENSION IF NOT EXISTS postgis")
+    conn.close()
+
+
+def migrate():
+    engine = create_engine(f"postgresql+psycopg2://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
+    with engine.begin() as conn:
+        upgrade_database(conn)
+        conn.execute(text(ENSURE_FUTURE_PARTITIONS))
+    engine.dispose()
+
+
+def insert_catalog(cur, city_count: int, station_count: int, rng: random.Random):
+    min_lon, min_lat, max_lon, max_lat = IRELAND_BBOX
+    cities = []
+    for i in range(city_count):
+        city = (f"bench-city-{i}", f"Bench City {i}", rng.uniform(min_lon, max_lon), rng.uniform(min_lat, max_lat))
+        cities.append(city)
+    cur.executemany(
+        "INSERT INTO cities (city_id, label, center) VALUES (%s, %s, ST_SetSRID(ST_MakePoint(%s, %s), 4326)) "
+        "ON CONFLICT DO NOTHING",
+        cities
+    )
+
+    stations = []
+    for i in range(station_count):
+        city_id, _, lon, lat = cities[i % city_count]
+        stations.append((
+            f"bench-{i:06d}", f"Bench Station {i}", "synthetic",
+            lon + rng.uniform(-CITY_RADIUS_DEG, CITY_RADIUS_DEG), lat + rng.uniform(-CITY_RADIUS_DEG, CITY_RADIUS_DEG),
+            city_id, rng.choice(["CCS", "CHAdeMO", "Type 2"]),
+            # 约 5% 的充电桩没有额定功率，与真实数据一致
+            None if rng.random() < 0.05 else rng.choice([7.0, 11.0, 22.0, 50.0, 150.0])
+        ))
+    cur.executemany(
+        "INSERT INTO charging_stations (station_id, name, description, location, city_id, connector_type, rated_power_kw) "
+        "VALUES (%s, %s, %s, ST_SetSRID(ST_MakePoint(%s, %s), 4326), %s, %s, %s) ON CONFLICT DO NOTHING",
+        stations
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="generate a synthetic dataset for the endpoint benchmarks")
+    parser.add_argument("--create-db", action="store_true", help="create DB_NAME and the postgis extension")
+    parser.add_argument("--cities", type=int, default=10)
+    parser.add_argument("--stations", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--poll-minutes", type=int, default=5)
+    parser.add_argument("--end", default=None, help="end date (UTC, YYYY-MM-DD), default today")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--reset", action="store_true", help="delete existing bench-* rows first")
+    args = parser.parse_args()
+
+    if args.create_db:
+        create_database()
+    migrate()
+
+    end = (datetime.strptime(args.end, "%Y-%m-%d") if args.end
+           else datetime.now(timezone.utc).replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0))
+    start = end - timedelta(days=args.days)
+    step = f"{args.poll_minutes} minutes"
+
+    conn = connect()
+    cur = conn.cursor()
+    if args.reset:
+        for statement in RESET_SQL:
+            cur.execute(statement)
+        conn.commit()
+
+    insert_catalog(cur, args.cities, args.stations, random.Random(args.seed))
+    cur.execute("SELECT station_status_ensure_partitions(%s, %s)", (start, end))
+    conn.commit()
+
+    # 按天写入：每条 INSERT 触发一次汇总表维护，单个事务的规模保持在一天的数据量
+    started = time.perf_counter()
+    day = start
+    while day < end:
+        params = {"lo": day, "hi": min(day + timedelta(days=1), end), "step": step, "seed": args.seed}
+        cur.execute(STATUS_SQL, params)
+        cur.execute(GRID_SQL, params)
+        conn.commit()
+        day += timedelta(days=1)
+        done = (day - start) / (end - start)
+        print(f"\r{day:%Y-%m-%d}  {done:6.1%}  {time.perf_counter() - started:7.0f} s", end="", flush=True)
+    print()
+
+    conn.autocommit = True
+    cur.execute("ANALYZE")
+    cur.execute("SELECT count(*) FROM station_status WHERE station_id LIKE 'bench-%'")
+    print(f"station_status rows: {cur.fetchone()[0]}")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()